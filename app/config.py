@@ -0,0 +1,244 @@
+"""
+Application configuration.
+
+All settings are resolved once into an immutable AppConfig snapshot, read
+from the environment and the .env file. Consumers call get_config() and use
+the snapshot they get for the whole request, so values stay consistent even
+if a reload happens mid-request. reload_config() builds a new snapshot and
+swaps it in atomically; it is triggered by SIGHUP or by a change to the .env
+file (see app/services/config_reloader.py).
+"""
+import logging
+import threading
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+# At the project root, not the working directory, so workers started elsewhere read and watch the same file
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+
+# Routes accepted by Termii's POST /api/sms/send
+TERMII_CHANNELS = ("dnd", "generic", "whatsapp", "voice")
+
+
+def parse_shop_weights(value: str) -> Dict[str, float]:
+    """Parse "shop=weight,shop=weight" into a dict (shops lower-cased)."""
+    weights: Dict[str, float] = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        shop, sep, weight = entry.partition("=")
+        if not sep or not shop.strip():
+            raise ValueError(f"expected shop=weight, got {entry.strip()!r}")
+        shop = shop.strip().lower()
+        weights[shop] = float(weight)
+        if weights[shop] <= 0:
+            raise ValueError(f"weight for {shop} must be positive")
+    return weights
+
+
+def parse_channels(value: str) -> List[str]:
+    """Parse a comma-separated list of Termii channels."""
+    channels = [channel.strip().lower() for channel in value.split(",") if channel.strip()]
+    for channel in channels:
+        if channel not in TERMII_CHANNELS:
+            raise ValueError(f"unknown channel {channel!r}; expected one of {', '.join(TERMII_CHANNELS)}")
+    return channels
+
+
+class AppConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_file=ENV_FILE, extra="ignore", frozen=True)
+
+    # Shopify app credentials (Partner Dashboard)
+    shopify_api_key: str = ""
+    shopify_api_secret: str = ""
+    shopify_scopes: str = "read_orders,read_customers"
+    app_url: str = "http://localhost:8000"
+    # Webhook signing secret from Shopify Admin → Settings → Notifications → Webhooks
+    shopify_webhook_secret: str = ""
+
+    # Termii account used for shops that haven't saved their own key and sender ID
+    termii_api_key: str = ""
+    termii_sender_id: str = ""
+    termii_base_url: str = "https://v3.api.termii.com"
+    # Adaptive limit on concurrent sends per Termii account and process: starts
+    # at the initial value, grows while latency stays within tolerance x
+    # baseline, halves on timeouts, 429s and "temporarily unavailable"
+    termii_concurrency_initial: int = 8
+    termii_concurrency_min: int = 1
+    termii_concurrency_max: int = 64
+    termii_latency_tolerance: float = 2.0
+    # Consecutive overload/account failures (e.g. no balance) that pause an
+    # account's sends, and for how many seconds (0 failures disables)
+    termii_breaker_failures: int = 5
+    termii_breaker_reset: float = 60.0
+    # Termii accounts whose clients are kept per process (least recently used evicted)
+    termii_client_pool_size: int = 256
+    # Termii channels per lane: transactional SMS (order notifications) use the
+    # DND route, which needs activating on the Termii account; promotional
+    # SMS use generic, which DND-registered numbers filter
+    termii_transactional_channel: str = "dnd"
+    termii_promotional_channel: str = "generic"
+    # Secret key that signs Termii delivery reports (X-Termii-Signature);
+    # unset: reports for the global account are rejected
+    termii_webhook_secret: str = ""
+
+    # Comma-separated shop whitelist for the admin UI; empty allows all shops
+    allowed_shops: str = ""
+
+    port: int = 5000
+    profiler_secret: str = ""
+    loop_lag_interval_ms: float = 250.0
+    loop_lag_threshold_ms: float = 250.0
+    webhook_capture_path: str = "captures/webhooks.jsonl.gz"
+    webhook_capture_sample_rate: float = 0.0
+    webhook_capture_salt: Optional[str] = None
+    # Seconds between .env modification checks; 0 disables file watching
+    config_watch_interval: float = 5.0
+
+    # Shared state (OAuth states, shop tokens, settings): memory | sqlite | redis
+    state_backend: str = "sqlite"
+    # Defaults to app/state.db when empty
+    state_sqlite_path: str = ""
+    state_redis_url: str = "redis://localhost:6379/0"
+
+    # SMS dispatch. inline: the web process runs a dispatcher; external: only
+    # `python -m app.worker` sends (the web tier just enqueues)
+    dispatch_mode: str = "inline"
+    # Queue between webhooks and dispatchers: memory | sqlite | redis
+    dispatch_backend: str = "sqlite"
+    # Defaults to app/dispatch.db when empty
+    dispatch_sqlite_path: str = ""
+    dispatch_redis_url: str = "redis://localhost:6379/0"
+    # Upper bound on parallel transactional sends per dispatcher; the Termii limiter adapts below it
+    dispatch_concurrency: int = 32
+    # Parallel promotional sends per dispatcher; promotional sends wait while
+    # transactional SMS are queued
+    dispatch_promotional_concurrency: int = 4
+    # SMS per second per dispatcher and lane (0 = unlimited)
+    dispatch_transactional_rate: float = 0.0
+    dispatch_promotional_rate: float = 5.0
+    dispatch_max_attempts: int = 5
+    # Claimed jobs not acknowledged within this many seconds are redelivered
+    dispatch_visibility_timeout: float = 120.0
+    # Fair-share weights for shops with a backlog, e.g. "big.myshopify.com=0.5,vip.myshopify.com=2";
+    # unlisted shops weigh 1
+    dispatch_shop_weights: str = ""
+    # Seconds a fulfillment SMS waits for the same order's unsent confirmation
+    # before it is sent anyway
+    dispatch_order_wait: float = 60.0
+    # Channels tried after the lane's own when an SMS fails or no delivery
+    # report arrives in time, e.g. "whatsapp,voice" (empty: no fallback).
+    # Shops can save their own policy through /api/settings
+    dispatch_fallback_channels: str = ""
+    # Seconds to wait for a delivery report before trying the next channel
+    # (0: fall back only when sending fails)
+    dispatch_receipt_timeout: float = 120.0
+
+    # Seconds a webhook ID is remembered so Shopify redeliveries don't send twice (0 disables)
+    webhook_dedup_ttl: float = 86400.0
+
+    # Seconds shutdown waits for in-flight and queued SMS before handing them back to the queue
+    shutdown_drain_timeout: float = 20.0
+    # Retry-After (seconds) on webhooks rejected while draining
+    shutdown_retry_after: int = 5
+
+    # Admission control per worker: requests handled at once (0 = unlimited)
+    # and requests allowed to wait for a slot, per route class
+    admission_webhook_concurrency: int = 64
+    admission_webhook_queue: int = 256
+    admission_admin_concurrency: int = 16
+    admission_admin_queue: int = 32
+    admission_landing_concurrency: int = 32
+    admission_landing_queue: int = 64
+    # Seconds a queued request waits before it is shed with 503
+    admission_queue_timeout: float = 5.0
+    admission_retry_after: int = 2
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _strip(cls, value):
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    @field_validator("dispatch_shop_weights")
+    @classmethod
+    def _check_shop_weights(cls, value: str) -> str:
+        parse_shop_weights(value)
+        return value
+
+    @field_validator("dispatch_fallback_channels")
+    @classmethod
+    def _check_fallback_channels(cls, value: str) -> str:
+        parse_channels(value)
+        return value
+
+    @property
+    def webhook_secret(self) -> str:
+        """Webhook signing secret, falling back to SHOPIFY_API_SECRET for backward compatibility."""
+        return self.shopify_webhook_secret or self.shopify_api_secret
+
+    @cached_property
+    def allowed_shops_set(self) -> FrozenSet[str]:
+        return frozenset(s.strip().lower() for s in self.allowed_shops.split(",") if s.strip())
+
+    @cached_property
+    def shop_weights(self) -> Dict[str, float]:
+        return parse_shop_weights(self.dispatch_shop_weights)
+
+    @cached_property
+    def fallback_channels(self) -> List[str]:
+        return parse_channels(self.dispatch_fallback_channels)
+
+    def changed_fields(self, other: "AppConfig") -> List[str]:
+        return [name for name in type(self).model_fields if getattr(self, name) != getattr(other, name)]
+
+
+_config: Optional[AppConfig] = None
+_reload_lock = threading.Lock()
+
+
+def get_config() -> AppConfig:
+    """Return the current configuration snapshot (resolved on first use)."""
+    global _config
+    config = _config
+    if config is None:
+        with _reload_lock:
+            if _config is None:
+                _config = AppConfig()
+            config = _config
+    return config
+
+
+def reload_config() -> AppConfig:
+    """
+    Re-read the environment and .env and swap in the new snapshot.
+
+    If the new configuration fails validation the current snapshot is kept.
+    Only field names are logged, never values.
+    """
+    global _config
+    with _reload_lock:
+        previous = _config
+        try:
+            config = AppConfig()
+        except Exception as e:
+            if previous is None:
+                raise
+            logger.error(f"Configuration reload failed, keeping current settings: {e}")
+            return previous
+        _config = config
+
+    if previous is not None:
+        changed = config.changed_fields(previous)
+        if changed:
+            logger.info(f"Configuration reloaded; changed: {', '.join(changed)}")
+        else:
+            logger.info("Configuration reloaded; no changes")
+    return config
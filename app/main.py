@@ -1,26 +1,80 @@
-import os
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
-from dotenv import load_dotenv
-from app.routes import auth, webhooks, admin, admin_ui, home, test_simple
+from app.config import get_config
+from app.routes import auth, delivery_reports, webhooks, admin, diagnostics
+from app.routes.lazy import include_lazy_router
+from app.middleware.admission import AdmissionMiddleware
+from app.models.templates import store_status
+from app.services import readiness, shutdown, termii
+from app.services.config_reloader import ConfigReloader
+from app.services.dispatch_queue import close_dispatch_queue, get_dispatch_queue
+from app.services.dispatcher import Dispatcher
+from app.services.http_client import close_shared_clients
+from app.services.loop_monitor import LoopMonitor
+from app.services.state_store import close_state_store, get_state_store
+from app.services.webhook_capture import capture
+from app.utils.request_context import (
+    CORRELATION_ID_HEADER,
+    configure_logging,
+    new_correlation_id,
+    start_request_context,
+)
 
-load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+configure_logging()
 
 logger = logging.getLogger(__name__)
 
+loop_monitor = LoopMonitor(
+    interval=get_config().loop_lag_interval_ms / 1000,
+    threshold=get_config().loop_lag_threshold_ms / 1000
+)
+config_reloader = ConfigReloader(interval=get_config().config_watch_interval)
+# With DISPATCH_MODE=external, SMS are sent by `python -m app.worker` instead
+dispatcher = Dispatcher() if get_config().dispatch_mode.lower() == "inline" else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start background monitors on startup. On shutdown, stop taking webhooks,
+    let the dispatcher finish or hand back queued SMS (SHUTDOWN_DRAIN_TIMEOUT),
+    then close shared clients and stores.
+    """
+    shutdown.reset()
+    loop_monitor.start()
+    config_reloader.start()
+    readiness.register_check("event_loop", loop_monitor.readiness)
+    readiness.register_check("template_store", store_status)
+    readiness.register_check("state_store", get_state_store().readiness)
+    readiness.register_check("dispatch_queue", get_dispatch_queue().readiness)
+    readiness.register_check("shutdown", shutdown.readiness)
+    readiness.register_check("termii", termii.readiness)
+    capture.start()
+    if dispatcher is not None:
+        await dispatcher.start()
+    yield
+    shutdown.begin_drain()
+    if dispatcher is not None:
+        await dispatcher.stop()
+    capture.stop()
+    await config_reloader.stop()
+    await close_shared_clients()
+    await close_dispatch_queue()
+    await close_state_store()
+    await loop_monitor.stop()
+
+
 app = FastAPI(
     title="Shopify Termii SMS Notifications",
     description="Send SMS notifications to customers via Termii when orders are created or fulfilled",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Mount static files directory for images
@@ -82,13 +136,52 @@ async def add_embed_headers(request, call_next):
     
     return response
 
+
+# Admission control: per-route-class concurrency limits that shed load with
+# 503 + Retry-After (inside the request context so shed requests are logged)
+app.add_middleware(AdmissionMiddleware)
+
+
+# Middleware to assign a correlation ID and report per-phase timings
+# (registered last so it wraps every other middleware)
+@app.middleware("http")
+async def add_request_context(request, call_next):
+    correlation_id = (
+        request.headers.get("X-Shopify-Webhook-Id")
+        or request.headers.get(CORRELATION_ID_HEADER)
+        or new_correlation_id()
+    )
+    timer = start_request_context(correlation_id)
+
+    response = await call_next(request)
+
+    response.headers[CORRELATION_ID_HEADER] = correlation_id
+    response.headers["Server-Timing"] = timer.server_timing_header()
+
+    phase_fields = {f"{name}_ms": round(duration, 1) for name, duration in timer.phases.items()}
+    total_ms = round(timer.total_ms(), 1)
+    logger.info(
+        "request_timing method=%s path=%s status=%s total_ms=%s %s",
+        request.method,
+        request.url.path,
+        response.status_code,
+        total_ms,
+        " ".join(f"{key}={value}" for key, value in phase_fields.items()),
+        extra={"total_ms": total_ms, "status_code": response.status_code, **phase_fields},
+    )
+    return response
+
 # Include routers
-app.include_router(home.router)
-app.include_router(admin_ui.router)
-app.include_router(test_simple.router)
+# HTML page modules are imported on their first request to keep startup fast
+include_lazy_router(app, "app.routes.home", ["/"])
+include_lazy_router(app, "app.routes.admin_ui", ["/admin/settings"])
+include_lazy_router(app, "app.routes.test_simple", ["/test-simple/sms", "/test-simple/sms/batch"])
 app.include_router(auth.router)
+# Before webhooks: its catch-all /webhooks/{topic} route would shadow the Termii reports route
+app.include_router(delivery_reports.router)
 app.include_router(webhooks.router)
 app.include_router(admin.router)
+app.include_router(diagnostics.router)
 
 
 @app.get("/api", response_model=dict)
@@ -107,8 +200,27 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness check endpoint.
+    Returns 503 when the event loop is lagging or a dependency is unavailable,
+    so load balancers stop routing to this worker. Status is "degraded" (still
+    200) while a check reports trouble that another worker can't avoid, such
+    as Termii's circuit breaker being open.
+    """
+    is_ready, checks = await readiness.run_checks()
+    if not is_ready:
+        status = "unavailable"
+    elif any(check.get("degraded") for check in checks.values()):
+        status = "degraded"
+    else:
+        status = "ready"
+    return JSONResponse(status_code=200 if is_ready else 503, content={"status": status, "checks": checks})
+
+
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv("PORT", 5000))
+    port = get_config().port
     uvicorn.run(app, host="0.0.0.0", port=port)
 
@@ -0,0 +1,188 @@
+"""
+Admission control: per-route-class concurrency limits with bounded queues.
+
+Each request is classified by path into a class with its own budget:
+
+    webhooks  /webhooks/*
+    admin     embedded admin UI and its APIs (/admin/*, /api/settings,
+              /api/templates/*, /api/auth/*, /test-simple/*)
+    landing   everything else (landing page, static assets, /api)
+
+Health, readiness and diagnostics endpoints are never limited. A class
+admits up to its concurrency limit; further requests wait in a FIFO queue
+of bounded size for at most ADMISSION_QUEUE_TIMEOUT seconds. When the
+queue is full or the wait times out the request gets 503 with Retry-After,
+so Shopify retries the webhook later instead of timing out. Separate
+budgets keep the embedded UI responsive during a webhook burst.
+
+Limits are per worker process and follow configuration reloads.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.config import AppConfig, get_config
+from app.utils.metrics import registry
+from app.utils.request_context import timed_phase
+
+logger = logging.getLogger(__name__)
+
+EXEMPT_PATHS = ("/health", "/ready", "/api/health")
+EXEMPT_PREFIXES = ("/api/diagnostics",)
+ADMIN_PREFIXES = ("/admin", "/api/settings", "/api/templates", "/api/auth", "/test-simple")
+
+
+def classify(path: str) -> Optional[str]:
+    """Return the admission class for a path, or None if it is never limited."""
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/webhooks/"):
+        return "webhooks"
+    if path.startswith(ADMIN_PREFIXES):
+        return "admin"
+    return "landing"
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded FIFO wait queue for one route class."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        """
+        Args:
+            name: Route class, used as the metrics label
+            concurrency: Requests handled at once; 0 disables the limit
+            queue_size: Requests allowed to wait for a slot
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._in_flight = registry.gauge("admission_in_flight", {"class": name})
+        self._queued = registry.gauge("admission_queued", {"class": name})
+
+    def configure(self, concurrency: int, queue_size: int) -> None:
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self._wake()
+
+    def _has_slot(self) -> bool:
+        return self.concurrency <= 0 or self.active < self.concurrency
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_slot():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+        self._queued.set(len(self._waiters))
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        """Take a slot. Returns None on success, or the reason for rejecting."""
+        if self._has_slot() and not self._waiters:
+            self.active += 1
+            self._in_flight.set(self.active)
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued.set(len(self._waiters))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            # Client disconnected while queued
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            registry.histogram("admission_wait_ms", {"class": self.name}).observe(
+                (time.perf_counter() - started) * 1000
+            )
+        self._in_flight.set(self.active)
+        return None
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._queued.set(len(self._waiters))
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+        self._in_flight.set(self.active)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionLimiter per route class."""
+
+    def __init__(self, app):
+        self.app = app
+        self._config: Optional[AppConfig] = None
+        self.limiters: Dict[str, AdmissionLimiter] = {}
+
+    def _budgets(self, config: AppConfig) -> Dict[str, tuple]:
+        return {
+            "webhooks": (config.admission_webhook_concurrency, config.admission_webhook_queue),
+            "admin": (config.admission_admin_concurrency, config.admission_admin_queue),
+            "landing": (config.admission_landing_concurrency, config.admission_landing_queue),
+        }
+
+    def _limiter(self, name: str) -> AdmissionLimiter:
+        config = get_config()
+        if config is not self._config:
+            # First request, or the configuration was reloaded
+            self._config = config
+            for budget_name, (concurrency, queue_size) in self._budgets(config).items():
+                limiter = self.limiters.get(budget_name)
+                if limiter is None:
+                    self.limiters[budget_name] = AdmissionLimiter(budget_name, concurrency, queue_size)
+                else:
+                    limiter.configure(concurrency, queue_size)
+        return self.limiters[name]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self._limiter(name)
+        with timed_phase("admission"):
+            rejected = await limiter.acquire(self._config.admission_queue_timeout)
+        if rejected:
+            registry.counter("admission_rejected_total", {"class": name, "reason": rejected}).inc()
+            logger.warning(f"Shedding {scope['method']} {scope['path']}: {name} {rejected.replace('_', ' ')}")
+            await self._reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    async def _reject(self, send) -> None:
+        body = b'{"detail":"Server busy, retry later"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self._config.admission_retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
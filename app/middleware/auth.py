@@ -1,8 +1,6 @@
-import os
 from fastapi import Request, HTTPException
 from typing import Optional
-
-ALLOWED_SHOPS = os.getenv("ALLOWED_SHOPS", "")
+from app.config import get_config
 
 
 def get_shop_from_request(request: Request) -> str:
@@ -15,7 +13,8 @@ def verify_shop_access(request: Request) -> bool:
     Check if the requesting shop is in the allowed shops list.
     Shop is extracted from the 'shop' query parameter sent by Shopify.
     """
-    if not ALLOWED_SHOPS:
+    allowed_shops = get_config().allowed_shops_set
+    if not allowed_shops:
         # If no whitelist is configured, allow all shops (for initial setup)
         return True
     
@@ -25,11 +24,8 @@ def verify_shop_access(request: Request) -> bool:
         # No shop parameter provided
         return False
     
-    # Parse allowed shops (comma-separated list)
-    allowed_shops_list = [s.strip().lower() for s in ALLOWED_SHOPS.split(",") if s.strip()]
-    
-    # Check if shop is in whitelist
-    return shop.lower() in allowed_shops_list
+    # Check if shop is in whitelist (parsed once per config snapshot)
+    return shop.lower() in allowed_shops
 
 
 def require_admin_access(request: Request):
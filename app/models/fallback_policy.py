@@ -0,0 +1,47 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from app.config import TERMII_CHANNELS
+from app.services.state_store import get_state_store
+
+
+class FallbackPolicy(BaseModel):
+    channels: List[str] = Field(
+        default_factory=list,
+        description="Channels tried in order after the lane's own (e.g. whatsapp, voice)"
+    )
+    receipt_timeout: float = Field(
+        default=120.0,
+        ge=0,
+        description="Seconds to wait for a delivery receipt before trying the next channel (0: only on send failures)"
+    )
+    whatsapp_sender: str = Field(default="", description="WhatsApp device name; defaults to the SMS sender ID")
+
+    @field_validator('channels')
+    @classmethod
+    def validate_channels(cls, v: List[str]) -> List[str]:
+        channels = [channel.strip().lower() for channel in v if channel.strip()]
+        unknown = [channel for channel in channels if channel not in TERMII_CHANNELS]
+        if unknown:
+            raise ValueError(f"Unknown channel(s): {', '.join(unknown)}. Must be among: {', '.join(TERMII_CHANNELS)}")
+        return channels
+
+
+# Per-shop channel fallback policies, stored as JSON in the shared state store
+# Format: {shop_domain: FallbackPolicy}
+FALLBACK_NAMESPACE = "shop_fallback"
+
+
+async def get_fallback_policy(shop_domain: str) -> Optional[FallbackPolicy]:
+    """Get the fallback policy saved for a shop, if any."""
+    raw = await get_state_store().get(FALLBACK_NAMESPACE, shop_domain)
+    return FallbackPolicy.model_validate_json(raw) if raw else None
+
+
+async def save_fallback_policy(shop_domain: str, policy: FallbackPolicy) -> None:
+    """Save a shop's fallback policy."""
+    await get_state_store().set(FALLBACK_NAMESPACE, shop_domain, policy.model_dump_json())
+
+
+async def delete_fallback_policy(shop_domain: str) -> None:
+    """Delete a shop's fallback policy (it then uses DISPATCH_FALLBACK_CHANNELS)."""
+    await get_state_store().delete(FALLBACK_NAMESPACE, shop_domain)
@@ -1,10 +1,12 @@
-from typing import Dict, Optional
+from typing import Optional
 from pydantic import BaseModel, Field, field_validator
+from app.services.state_store import get_state_store
 
 
 class Settings(BaseModel):
     termii_api_key: str = Field(..., min_length=1, description="Termii API key")
     termii_sender_id: str = Field(..., min_length=3, max_length=11, description="Termii sender ID (alphanumeric)")
+    termii_secret_key: str = Field(default="", description="Termii secret key, verifies this account's delivery reports")
     order_confirmation_template: str = Field(
         default="Hi {{customer_name}}, your order #{{order_number}} has been confirmed. Thank you for your purchase!",
         description="SMS template for order confirmation"
@@ -22,22 +24,23 @@ class Settings(BaseModel):
         return v
 
 
-# In-memory storage for per-shop settings
+# Per-shop settings, stored as JSON in the shared state store
 # Format: {shop_domain: Settings}
-_shop_settings: Dict[str, Settings] = {}
+SETTINGS_NAMESPACE = "shop_settings"
 
 
-def get_settings(shop_domain: str) -> Optional[Settings]:
+async def get_settings(shop_domain: str) -> Optional[Settings]:
     """Get settings for a specific shop."""
-    return _shop_settings.get(shop_domain)
+    raw = await get_state_store().get(SETTINGS_NAMESPACE, shop_domain)
+    return Settings.model_validate_json(raw) if raw else None
 
 
-def save_settings(shop_domain: str, settings: Settings) -> None:
+async def save_settings(shop_domain: str, settings: Settings) -> None:
     """Save settings for a specific shop."""
-    _shop_settings[shop_domain] = settings
+    await get_state_store().set(SETTINGS_NAMESPACE, shop_domain, settings.model_dump_json())
 
 
-def delete_settings(shop_domain: str) -> None:
+async def delete_settings(shop_domain: str) -> None:
     """Delete settings for a specific shop."""
-    _shop_settings.pop(shop_domain, None)
+    await get_state_store().delete(SETTINGS_NAMESPACE, shop_domain)
 
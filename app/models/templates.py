@@ -2,10 +2,16 @@
 Template storage for SMS messages.
 Templates are stored per-shop in a JSON file for persistence.
 """
+import asyncio
 import json
 import logging
+import os
+import re
+import shutil
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
@@ -40,13 +46,29 @@ def _load_templates_file() -> Dict[str, dict]:
 
 
 def _save_templates_file(data: Dict[str, dict]) -> None:
-    """Save templates to JSON file."""
+    """
+    Save templates to JSON file. Written to a temporary file next to it and
+    renamed into place, so a crash mid-write or a concurrent reader (another
+    worker's mtime check) never sees a truncated file.
+    """
+    tmp_path = None
     try:
-        with open(TEMPLATES_FILE, 'w', encoding='utf-8') as f:
+        with tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=TEMPLATES_FILE.parent, prefix=f".{TEMPLATES_FILE.name}.", delete=False
+        ) as f:
+            tmp_path = f.name
             json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if TEMPLATES_FILE.exists():
+            # Temporary files are private (0600); keep the permissions the file had
+            shutil.copymode(TEMPLATES_FILE, tmp_path)
+        os.replace(tmp_path, TEMPLATES_FILE)
         logger.info(f"Templates saved to {TEMPLATES_FILE}")
     except Exception as e:
         logger.error(f"Error saving templates file: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
         raise
 
 
@@ -64,6 +86,47 @@ def get_templates(shop_domain: str) -> ShopTemplates:
     )
 
 
+_VARIABLE = re.compile(r"\{\{([^{}]+)\}\}")
+
+
+class CompiledTemplate:
+    """
+    A template split once into literal text and variable slots, so rendering
+    is a single join. Variables missing from the context are left as written.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        # Alternating literal, variable, literal, ..., literal
+        self._parts: List[str] = _VARIABLE.split(template)
+        self.variables: Tuple[str, ...] = tuple(dict.fromkeys(self._parts[1::2]))
+
+    def render(self, context: dict) -> str:
+        parts = self._parts[:]
+        for index in range(1, len(parts), 2):
+            name = parts[index]
+            parts[index] = str(context[name]) if name in context else f"{{{{{name}}}}}"
+        return "".join(parts)
+
+    def missing(self, context: dict) -> List[str]:
+        """Variables the template uses that the context doesn't provide."""
+        return [name for name in self.variables if name not in context]
+
+
+@lru_cache(maxsize=256)
+def compile_template(template: str) -> CompiledTemplate:
+    """Compiled form of a template, cached by its text."""
+    return CompiledTemplate(template)
+
+
+def render_template(template: str, context: dict) -> str:
+    """
+    Simple template rendering for SMS messages.
+    Replaces {{variable_name}} with values from context.
+    """
+    return compile_template(template).render(context)
+
+
 def save_templates(shop_domain: str, templates: ShopTemplates) -> None:
     """Save templates for a specific shop."""
     all_templates = _load_templates_file()
@@ -86,3 +149,23 @@ def delete_templates(shop_domain: str) -> None:
         _save_templates_file(all_templates)
         logger.info(f"Templates deleted for shop: {shop_domain}")
 
+
+async def store_status() -> dict:
+    """
+    Readiness check: the templates file must be readable and its directory
+    writable. The file is parsed in a thread, since load balancers poll this.
+    """
+    return await asyncio.to_thread(_check_store)
+
+
+def _check_store() -> dict:
+    directory = TEMPLATES_FILE.parent
+    writable = os.access(directory, os.W_OK)
+    if TEMPLATES_FILE.exists():
+        try:
+            with open(TEMPLATES_FILE, 'r', encoding='utf-8') as f:
+                json.load(f)
+        except Exception as e:
+            return {"ok": False, "path": str(TEMPLATES_FILE), "error": f"Unreadable templates file: {e}"}
+        writable = writable and os.access(TEMPLATES_FILE, os.W_OK)
+    return {"ok": writable, "path": str(TEMPLATES_FILE), "writable": writable}
@@ -1,13 +1,16 @@
-import os
 import logging
-from typing import Optional
+import time
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Request, HTTPException, Depends
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from app.models.fallback_policy import FallbackPolicy, delete_fallback_policy, get_fallback_policy, save_fallback_policy
+from app.models.settings import Settings, delete_settings, get_settings, save_settings
 from app.models.templates import ShopTemplates, get_templates, save_templates
+from app.services.channel_fallback import default_policy, forget_shop_policy, get_shop_policy
+from app.services.template_preview import MAX_PREVIEW_SAMPLES, preview, recent_orders, synthetic_orders
+from app.services.termii import forget_shop_credentials, get_shop_credentials
 from app.middleware.auth import require_admin_access
 
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
@@ -27,17 +30,47 @@ def get_shop_domain_from_request(request: Request) -> Optional[str]:
 
 
 class SettingsResponse(BaseModel):
-    """Response model for settings - includes Termii status from env and templates."""
+    """Response model for settings - includes Termii status and templates."""
     termii_configured: bool
     termii_sender_id: str  # Show sender ID (not secret)
+    # "shop" when the shop sends with its own Termii account, "global" for the .env account
+    termii_account: str
     order_confirmation_template: str
     fulfillment_template: str
+    # Channels tried after SMS, and seconds to wait for a delivery report before each
+    fallback_channels: List[str]
+    fallback_receipt_timeout: float
 
 
 class SettingsUpdateRequest(BaseModel):
-    """Request model for updating settings - only templates."""
+    """
+    Request model for updating settings. Termii fields are optional: omit them
+    to keep the current account, send an empty API key to fall back to the
+    global account from .env. The secret key verifies the account's delivery
+    reports (needed for channel fallback on delivery failures). Fallback fields work the same way: omit them to
+    keep the current policy, send an empty channel list to use the default
+    (DISPATCH_FALLBACK_CHANNELS).
+    """
     order_confirmation_template: str
     fulfillment_template: str
+    termii_api_key: Optional[str] = None
+    termii_sender_id: Optional[str] = None
+    termii_secret_key: Optional[str] = None
+    fallback_channels: Optional[List[str]] = None
+    fallback_receipt_timeout: Optional[float] = None
+    fallback_whatsapp_sender: Optional[str] = None
+
+
+class TemplatePreviewRequest(BaseModel):
+    """
+    Template to preview. Samples come from `orders` when given, else from the
+    shop's recent orders (source "recent") or built-in edge cases ("synthetic").
+    """
+    template: str
+    kind: str = "order_confirmation"
+    source: str = "synthetic"
+    samples: int = Field(default=8, ge=1, le=MAX_PREVIEW_SAMPLES)
+    orders: Optional[List[Dict[str, Any]]] = Field(default=None, max_length=MAX_PREVIEW_SAMPLES)
 
 
 @router.get("/health")
@@ -50,40 +83,46 @@ async def health_check():
 async def get_settings_endpoint(request: Request, _auth: bool = Depends(require_admin_access)):
     """
     Get current settings for the authenticated shop.
-    Returns Termii configuration status from environment and templates for the shop.
+    Returns Termii configuration status (the shop's own account or the global one) and templates for the shop.
     """
     shop_domain = get_shop_domain_from_request(request)
     
     if not shop_domain:
         raise HTTPException(status_code=400, detail="Shop domain is required")
     
-    # Check Termii configuration from environment
-    termii_api_key = os.getenv("TERMII_API_KEY", "").strip()
-    termii_sender_id = os.getenv("TERMII_SENDER_ID", "").strip()
-    termii_configured = bool(termii_api_key and termii_sender_id)
+    try:
+        credentials = await get_shop_credentials(shop_domain)
+    except ValueError:
+        credentials = None
     
     # Get templates for this shop (returns defaults if not found)
     templates = get_templates(shop_domain)
+    policy = await get_shop_policy(shop_domain)
     
     return SettingsResponse(
-        termii_configured=termii_configured,
-        termii_sender_id=termii_sender_id if termii_configured else "",
+        termii_configured=credentials is not None,
+        termii_sender_id=credentials.sender_id if credentials else "",
+        termii_account=credentials.source if credentials else "",
         order_confirmation_template=templates.order_confirmation,
-        fulfillment_template=templates.fulfillment
+        fulfillment_template=templates.fulfillment,
+        fallback_channels=policy.channels,
+        fallback_receipt_timeout=policy.receipt_timeout
     )
 
 
 @router.post("/settings")
 async def update_settings_endpoint(request: Request, settings_data: SettingsUpdateRequest, _auth: bool = Depends(require_admin_access)):
     """
-    Update SMS templates for the authenticated shop.
-    Termii credentials are configured globally in .env file.
+    Update SMS templates, and optionally the shop's own Termii account and
+    fallback policy, for the authenticated shop. Shops without their own
+    account use the one in .env. Everything is validated before anything is
+    saved, and the templates file (the likeliest write to fail) goes first.
     """
     logger.info("=" * 80)
     logger.info("POST /api/settings - REQUEST RECEIVED")
     logger.info(f"Headers: {dict(request.headers)}")
     logger.info(f"Query params: {dict(request.query_params)}")
-    logger.info(f"Body data: {settings_data.dict()}")
+    logger.info(f"Body data: {settings_data.dict(exclude={'termii_api_key', 'termii_secret_key'})}")
     
     shop_domain = get_shop_domain_from_request(request)
     logger.info(f"Shop domain extracted: {shop_domain}")
@@ -92,6 +131,19 @@ async def update_settings_endpoint(request: Request, settings_data: SettingsUpda
         logger.error("Shop domain is missing - returning 400")
         raise HTTPException(status_code=400, detail="Shop domain is required")
     
+    update_account = (
+        settings_data.termii_api_key is not None
+        or settings_data.termii_sender_id is not None
+        or settings_data.termii_secret_key is not None
+    )
+    update_fallback = (
+        settings_data.fallback_channels is not None
+        or settings_data.fallback_receipt_timeout is not None
+        or settings_data.fallback_whatsapp_sender is not None
+    )
+    account = await build_termii_account(shop_domain, settings_data) if update_account else None
+    policy = await build_fallback(shop_domain, settings_data) if update_fallback else None
+
     try:
         logger.info(f"Creating ShopTemplates object...")
         templates = ShopTemplates(
@@ -103,11 +155,123 @@ async def update_settings_endpoint(request: Request, settings_data: SettingsUpda
         save_templates(shop_domain, templates)
         
         logger.info(f"✓ Templates successfully saved for shop: {shop_domain}")
-        logger.info("=" * 80)
-        
-        return {"message": "Templates saved successfully", "shop": shop_domain}
-        
     except Exception as e:
         logger.error(f"ERROR updating templates: {e}", exc_info=True)
         logger.error("=" * 80)
         raise HTTPException(status_code=400, detail=f"Invalid templates: {str(e)}")
+
+    try:
+        if update_account:
+            await save_termii_account(shop_domain, account)
+        if update_fallback:
+            await save_fallback(shop_domain, policy)
+    except Exception as e:
+        logger.error(f"Templates saved for {shop_domain}, but saving its other settings failed: {e}", exc_info=True)
+        logger.error("=" * 80)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Templates were saved, but the Termii account and fallback settings could not be: {e}"
+        )
+    logger.info("=" * 80)
+    
+    return {"message": "Templates saved successfully", "shop": shop_domain}
+
+
+@router.post("/templates/preview")
+async def preview_template_endpoint(
+    request: Request,
+    preview_data: TemplatePreviewRequest,
+    _auth: bool = Depends(require_admin_access)
+):
+    """
+    Render a template against many sample orders in one call, with each
+    message's encoding and SMS segment count (for live previews while editing).
+    """
+    started = time.perf_counter()
+    if preview_data.orders is not None:
+        source = "request"
+        samples = [(f"order {index + 1}", order) for index, order in enumerate(preview_data.orders)]
+    elif preview_data.source == "recent":
+        shop_domain = get_shop_domain_from_request(request)
+        if not shop_domain:
+            raise HTTPException(status_code=400, detail="Shop domain is required")
+        source = "recent"
+        try:
+            samples = await recent_orders(shop_domain, preview_data.samples)
+        except Exception as e:
+            logger.error(f"Failed to fetch recent orders for template preview on {shop_domain}: {e}")
+            raise HTTPException(status_code=502, detail="Could not fetch recent orders from Shopify")
+    elif preview_data.source == "synthetic":
+        source = "synthetic"
+        samples = synthetic_orders(preview_data.samples)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown sample source: {preview_data.source}")
+
+    try:
+        result = preview(preview_data.template, preview_data.kind, samples)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "source": source, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+async def build_termii_account(shop_domain: str, settings_data: SettingsUpdateRequest) -> Optional[Settings]:
+    """
+    The shop's Termii account after this update (unsaved), or None to fall
+    back to the global account. Raises 400 for invalid settings.
+    """
+    if settings_data.termii_api_key == "":
+        return None
+    current = await get_settings(shop_domain)
+    api_key = settings_data.termii_api_key or (current.termii_api_key if current else "")
+    sender_id = settings_data.termii_sender_id or (current.termii_sender_id if current else "")
+    secret_key = settings_data.termii_secret_key
+    if secret_key is None:
+        secret_key = current.termii_secret_key if current else ""
+    try:
+        return Settings(termii_api_key=api_key, termii_sender_id=sender_id, termii_secret_key=secret_key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid Termii settings: {e}")
+
+
+async def save_termii_account(shop_domain: str, settings: Optional[Settings]) -> None:
+    """Save the shop's own Termii account, or clear it (None) to use the global one."""
+    if settings is None:
+        await delete_settings(shop_domain)
+        logger.info(f"Shop {shop_domain} now sends with the global Termii account")
+    else:
+        await save_settings(shop_domain, settings)
+        logger.info(f"Shop {shop_domain} now sends with its own Termii account (sender ID {settings.termii_sender_id})")
+    forget_shop_credentials(shop_domain)
+
+
+async def build_fallback(shop_domain: str, settings_data: SettingsUpdateRequest) -> Optional[FallbackPolicy]:
+    """
+    The shop's fallback policy after this update (unsaved), or None to use
+    the default. Raises 400 for invalid settings.
+    """
+    if settings_data.fallback_channels == []:
+        return None
+    current = await get_fallback_policy(shop_domain) or default_policy()
+    update = {
+        "channels": settings_data.fallback_channels,
+        "receipt_timeout": settings_data.fallback_receipt_timeout,
+        "whatsapp_sender": settings_data.fallback_whatsapp_sender,
+    }
+    try:
+        return FallbackPolicy(**{
+            **current.model_dump(),
+            **{name: value for name, value in update.items() if value is not None},
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid fallback settings: {e}")
+
+
+async def save_fallback(shop_domain: str, policy: Optional[FallbackPolicy]) -> None:
+    """Save the shop's channel fallback policy, or clear it (None) to use the default."""
+    if policy is None:
+        await delete_fallback_policy(shop_domain)
+        logger.info(f"Shop {shop_domain} now uses the default channel fallback")
+    else:
+        await save_fallback_policy(shop_domain, policy)
+        logger.info(f"Shop {shop_domain} falls back to {', '.join(policy.channels) or 'no other channel'}")
+    forget_shop_policy(shop_domain)
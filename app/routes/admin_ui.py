@@ -1,15 +1,11 @@
-import os
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from dotenv import load_dotenv
+from app.config import get_config
 from app.middleware.auth import require_admin_access
 
-load_dotenv()
 
 router = APIRouter(prefix="/admin", tags=["admin-ui"])
 
-SHOPIFY_API_KEY = os.getenv("SHOPIFY_API_KEY", "")
-
 
 @router.get("/settings", response_class=HTMLResponse)
 async def settings_page(request: Request, _auth: bool = Depends(require_admin_access)):
@@ -62,12 +58,13 @@ async def settings_page(request: Request, _auth: bool = Depends(require_admin_ac
     logger.info(f"Final shop domain determined: '{shop}'")
 
     # Check Termii configuration from environment
-    termii_api_key = os.getenv("TERMII_API_KEY", "").strip()
-    termii_sender_id = os.getenv("TERMII_SENDER_ID", "").strip()
+    config = get_config()
+    termii_api_key = config.termii_api_key
+    termii_sender_id = config.termii_sender_id
     termii_configured = bool(termii_api_key and termii_sender_id)
 
     # Log for debugging
-    logger.info(f"SHOPIFY_API_KEY loaded: {bool(SHOPIFY_API_KEY)}, length: {len(SHOPIFY_API_KEY) if SHOPIFY_API_KEY else 0}")
+    logger.info(f"SHOPIFY_API_KEY loaded: {bool(config.shopify_api_key)}, length: {len(config.shopify_api_key)}")
 
     # Create status banner
     if termii_configured:
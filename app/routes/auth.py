@@ -1,28 +1,25 @@
-import os
 import logging
 import secrets
 from typing import Optional
 from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import RedirectResponse
 import httpx
-from dotenv import load_dotenv
+from app.config import get_config
+from app.services.http_client import create_client
 from app.services.shopify import save_shop_token
+from app.services.state_store import get_state_store
 
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-SHOPIFY_API_KEY = os.getenv("SHOPIFY_API_KEY")
-SHOPIFY_API_SECRET = os.getenv("SHOPIFY_API_SECRET")
-SHOPIFY_SCOPES = os.getenv("SHOPIFY_SCOPES", "read_orders,read_customers")
-APP_URL = os.getenv("APP_URL", "http://localhost:8000")
 
-
-# In-memory storage for OAuth state (for CSRF protection)
-# Format: {state: shop_domain}
-_oauth_states: dict[str, str] = {}
+# OAuth state (for CSRF protection) lives in the shared state store so the
+# callback can land on any worker. Format: {state: shop_domain}
+OAUTH_STATE_NAMESPACE = "oauth_state"
+# Abandoned installs expire instead of accumulating
+OAUTH_STATE_TTL = 600
 
 
 @router.get("")
@@ -33,19 +30,20 @@ async def initiate_oauth(request: Request, shop: str = Query(...)):
     Args:
         shop: Shop domain (e.g., "myshop.myshopify.com")
     """
-    if not SHOPIFY_API_KEY or not SHOPIFY_API_SECRET:
+    config = get_config()
+    if not config.shopify_api_key or not config.shopify_api_secret:
         raise HTTPException(status_code=500, detail="Shopify API credentials not configured")
     
     # Generate state for CSRF protection
     state = secrets.token_urlsafe(32)
-    _oauth_states[state] = shop
+    await get_state_store().set(OAUTH_STATE_NAMESPACE, state, shop, ttl=OAUTH_STATE_TTL)
     
     # Build OAuth URL
-    redirect_uri = f"{APP_URL}/api/auth/callback"
+    redirect_uri = f"{config.app_url}/api/auth/callback"
     auth_url = (
         f"https://{shop}/admin/oauth/authorize"
-        f"?client_id={SHOPIFY_API_KEY}"
-        f"&scope={SHOPIFY_SCOPES}"
+        f"?client_id={config.shopify_api_key}"
+        f"&scope={config.shopify_scopes}"
         f"&redirect_uri={redirect_uri}"
         f"&state={state}"
     )
@@ -68,25 +66,23 @@ async def oauth_callback(
     if not code or not state or not shop or not hmac:
         raise HTTPException(status_code=400, detail="Missing required OAuth parameters")
     
-    # Verify state (CSRF protection)
-    if state not in _oauth_states or _oauth_states[state] != shop:
+    # Verify state (CSRF protection); pop makes each state single-use
+    expected_shop = await get_state_store().pop(OAUTH_STATE_NAMESPACE, state)
+    if expected_shop is None or expected_shop != shop:
         raise HTTPException(status_code=400, detail="Invalid OAuth state")
     
-    # Clean up state
-    _oauth_states.pop(state, None)
-    
     # Exchange code for access token
-    redirect_uri = f"{APP_URL}/api/auth/callback"
+    config = get_config()
     token_url = f"https://{shop}/admin/oauth/access_token"
     
     payload = {
-        "client_id": SHOPIFY_API_KEY,
-        "client_secret": SHOPIFY_API_SECRET,
+        "client_id": config.shopify_api_key,
+        "client_secret": config.shopify_api_secret,
         "code": code
     }
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with create_client(timeout=10.0) as client:
             response = await client.post(token_url, json=payload)
             response.raise_for_status()
             
@@ -97,12 +93,12 @@ async def oauth_callback(
                 raise HTTPException(status_code=500, detail="Failed to obtain access token")
             
             # Save access token for this shop
-            save_shop_token(shop, access_token)
+            await save_shop_token(shop, access_token)
             
             logger.info(f"OAuth completed successfully for shop: {shop}")
             
             # Redirect to admin settings page
-            admin_url = f"https://{shop}/admin/apps/{SHOPIFY_API_KEY}/settings"
+            admin_url = f"https://{shop}/admin/apps/{config.shopify_api_key}/settings"
             return RedirectResponse(url=admin_url)
             
     except httpx.HTTPStatusError as e:
@@ -0,0 +1,80 @@
+"""
+Termii delivery reports.
+
+Set POST /webhooks/termii/delivery-reports as the delivery report URL on
+the Termii dashboard. Reports for messages the dispatcher is waiting on
+(those with a fallback channel left) decide whether the next channel is
+tried, so they must be signed with the secret key of the Termii account
+that sent the message (the shop's termii_secret_key, or
+TERMII_WEBHOOK_SECRET for the global account); unsigned or unverifiable
+ones are rejected. All other reports are acknowledged and dropped.
+"""
+import json
+import logging
+from fastapi import APIRouter, Request, HTTPException, Header
+from fastapi.responses import Response
+from app.services.channel_fallback import get_tracked_receipt, record_receipt
+from app.services.termii import get_shop_credentials
+from app.services.webhook_verifier import verify_termii_signature
+from app.utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+# Included before the Shopify webhooks router, whose /webhooks/{topic} route would match this path too
+router = APIRouter(prefix="/webhooks/termii", tags=["webhooks"])
+
+
+async def report_secret(shop_domain: str) -> str:
+    """Secret key of the Termii account a shop sends with ("" if it has none)."""
+    try:
+        return (await get_shop_credentials(shop_domain)).secret_key
+    except ValueError:
+        return ""
+
+
+@router.post("/delivery-reports")
+async def handle_delivery_report(
+    request: Request,
+    x_termii_signature: str = Header(None, alias="X-Termii-Signature")
+):
+    """Record the delivery status of a tracked message."""
+    raw_body = await request.body()
+    try:
+        report = json.loads(raw_body.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON payload: {str(e)}")
+    if not isinstance(report, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload: expected an object")
+
+    message_id = report.get("message_id") or report.get("id")
+    status = report.get("status")
+    if not message_id or not status:
+        return Response(status_code=200)
+
+    try:
+        receipt = await get_tracked_receipt(str(message_id))
+        if receipt is None:
+            return Response(status_code=200)
+        secret = await report_secret(receipt.shop_domain)
+    except Exception as e:
+        logger.error(f"Failed to look up delivery report for message {message_id}: {e}")
+        raise HTTPException(status_code=503, detail="Receipt store unavailable")
+    if not secret:
+        logger.warning(
+            f"Rejected delivery report for message {message_id} (shop {receipt.shop_domain}): "
+            f"its Termii account has no secret key"
+        )
+        raise HTTPException(status_code=401, detail="Delivery reports can't be verified for this account")
+    if not verify_termii_signature(secret, raw_body, x_termii_signature):
+        logger.warning(f"Termii delivery report signature verification failed for message {message_id}")
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    try:
+        recorded = await record_receipt(str(message_id), receipt, str(status))
+    except Exception as e:
+        logger.error(f"Failed to record delivery report for message {message_id}: {e}")
+        raise HTTPException(status_code=503, detail="Receipt store unavailable")
+    logger.info(f"Delivery report for message {message_id}: {status}")
+    registry.counter("delivery_reports_total", {"status": recorded}).inc()
+    return Response(status_code=200)
@@ -0,0 +1,150 @@
+import asyncio
+import hmac
+import logging
+import threading
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.config import get_config
+from app.middleware.auth import require_admin_access
+from app.models.settings import SETTINGS_NAMESPACE
+from app.routes.auth import OAUTH_STATE_NAMESPACE
+from app.services import memory_diagnostics
+from app.services.profiler import SamplingProfiler
+from app.services.shopify import SHOP_TOKEN_NAMESPACE
+from app.services.state_store import get_state_store
+from app.utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+MAX_PROFILE_SECONDS = 60
+
+_profile_lock = asyncio.Lock()
+
+
+def require_profiler_secret(
+    x_profiler_secret: Optional[str] = Header(None, alias="X-Profiler-Secret")
+):
+    """Dependency that requires the X-Profiler-Secret header to match PROFILER_SECRET"""
+    # Separate secret for expensive or revealing diagnostics (profiling, metrics,
+    # which list shops and accounts); the endpoints are disabled entirely when
+    # it is not set, since admin access alone is open while ALLOWED_SHOPS is empty
+    profiler_secret = get_config().profiler_secret
+    if not profiler_secret:
+        raise HTTPException(status_code=404, detail="Diagnostics are disabled. Set PROFILER_SECRET to enable them.")
+    if not x_profiler_secret or not hmac.compare_digest(x_profiler_secret, profiler_secret):
+        raise HTTPException(status_code=403, detail="Invalid profiler secret")
+    return True
+
+
+@router.get("/metrics")
+async def get_metrics(
+    _auth: bool = Depends(require_admin_access),
+    _secret: bool = Depends(require_profiler_secret)
+):
+    """
+    Snapshot of in-process metrics (counters, gauges and histograms).
+    Includes outbound HTTP phase timings labelled by host and phase.
+    """
+    return registry.snapshot()
+
+
+@router.post("/profile")
+async def profile_event_loop(
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+    _auth: bool = Depends(require_admin_access),
+    _secret: bool = Depends(require_profiler_secret)
+):
+    """
+    Sample the live event loop for N seconds and return the profile.
+    Returns a speedscope JSON file or collapsed stacks. Only one profile
+    can run at a time.
+    """
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    async with _profile_lock:
+        # This handler runs on the event loop thread, which is the one to sample
+        profiler = SamplingProfiler(threading.get_ident(), interval=interval_ms / 1000)
+        logger.info(f"Starting event loop profile: {seconds}s at {interval_ms}ms interval")
+        await asyncio.to_thread(profiler.run, seconds)
+
+    if format == "collapsed":
+        return PlainTextResponse(
+            profiler.to_collapsed(),
+            headers={"Content-Disposition": 'attachment; filename="profile.collapsed.txt"'}
+        )
+    return JSONResponse(
+        profiler.to_speedscope(),
+        headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'}
+    )
+
+
+async def registry_sizes() -> dict:
+    """Entry counts of the app's shared-state registries."""
+    store = get_state_store()
+    return {
+        "backend": store.name,
+        "oauth_states": await store.count(OAUTH_STATE_NAMESPACE),
+        "shop_tokens": await store.count(SHOP_TOKEN_NAMESPACE),
+        "shop_settings": await store.count(SETTINGS_NAMESPACE),
+    }
+
+
+@router.post("/memory/baseline")
+async def take_memory_baseline(
+    _auth: bool = Depends(require_admin_access),
+    _secret: bool = Depends(require_profiler_secret)
+):
+    """
+    Start tracemalloc (if needed) and record the current heap as the baseline
+    for later growth diffs.
+    """
+    await asyncio.to_thread(memory_diagnostics.take_baseline)
+    return {
+        "message": "Baseline snapshot taken",
+        "traced_memory": memory_diagnostics.traced_memory(),
+        "process": memory_diagnostics.process_rss_kb(),
+        "registries": await registry_sizes(),
+    }
+
+
+@router.get("/memory")
+async def get_memory_report(
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    _auth: bool = Depends(require_admin_access),
+    _secret: bool = Depends(require_profiler_secret)
+):
+    """
+    Diff the current heap against the baseline and report the top allocation
+    sites by growth, plus process RSS and registry sizes.
+    """
+    report = {
+        "tracing": memory_diagnostics.is_tracing(),
+        "process": memory_diagnostics.process_rss_kb(),
+        "registries": await registry_sizes(),
+    }
+    if not memory_diagnostics.has_baseline():
+        return report
+
+    report["traced_memory"] = memory_diagnostics.traced_memory()
+    report["top_growth"] = await asyncio.to_thread(
+        memory_diagnostics.diff_against_baseline, limit, group_by
+    )
+    return report
+
+
+@router.delete("/memory")
+async def stop_memory_tracing(
+    _auth: bool = Depends(require_admin_access),
+    _secret: bool = Depends(require_profiler_secret)
+):
+    """Stop tracemalloc and discard the baseline."""
+    memory_diagnostics.stop_tracing()
+    return {"message": "Memory tracing stopped"}
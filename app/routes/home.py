@@ -1,14 +1,10 @@
-import os
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from dotenv import load_dotenv
+from app.config import get_config
 
-load_dotenv()
 
 router = APIRouter(tags=["home"])
 
-SHOPIFY_API_KEY = os.getenv("SHOPIFY_API_KEY")
-
 
 @router.get("/", response_class=HTMLResponse)
 async def app_home(request: Request):
@@ -21,7 +17,7 @@ async def app_home(request: Request):
     host = request.headers.get("host", "localhost:8000")
 
     # Extract host for App Bridge
-    api_key = SHOPIFY_API_KEY or ""
+    api_key = get_config().shopify_api_key
 
     # Conditional content for authenticated shop users vs landing page
     status_banner_html = ""
@@ -0,0 +1,68 @@
+"""
+Lazily imported route modules.
+
+The HTML page modules (home, admin_ui, test_simple) are mostly large string
+constants that only the embedded UI needs. Registering them through
+include_lazy_router() keeps them out of process startup: the module is
+imported on the first request to one of its paths and its router handles
+that request and every later one.
+"""
+import importlib
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from fastapi import APIRouter, FastAPI
+from starlette.routing import Route
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class LazyRouter:
+    """ASGI app that imports a route module on first use and delegates to its `router`."""
+
+    def __init__(self, module_name: str):
+        self.module_name = module_name
+        self._router: Optional[APIRouter] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._router is not None
+
+    def load(self) -> APIRouter:
+        if self._router is None:
+            with self._lock:
+                if self._router is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.module_name)
+                    self._router = module.router
+                    logger.info(
+                        f"Lazily imported {self.module_name} in {(time.perf_counter() - started) * 1000:.1f}ms"
+                    )
+        return self._router
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.load()(scope, receive, send)
+
+
+def include_lazy_router(app: FastAPI, module_name: str, paths: Iterable[str]) -> LazyRouter:
+    """
+    Route the given full paths to a module's router, importing it on first hit.
+
+    The paths must list every path the module's router serves (with its prefix);
+    method matching and 405s are left to the module's own router.
+    """
+    lazy = LazyRouter(module_name)
+    for path in paths:
+        app.router.routes.append(Route(path, lazy, include_in_schema=False))
+    return lazy
+
+
+def preload_lazy_routers(app: FastAPI) -> None:
+    """Import every lazily registered module now (e.g. in a preforking master before fork)."""
+    for route in app.router.routes:
+        if isinstance(route, Route) and isinstance(route.app, LazyRouter):
+            route.app.load()
@@ -1,23 +1,122 @@
 """
 Simple SMS test endpoint without complex JavaScript to verify backend works.
+
+A test send can go to several numbers at once (e.g. one per network: MTN,
+Glo, Airtel, 9mobile), with a typed message or one of the shop's templates
+rendered against a sample order. Recipients are sent in parallel, at most
+TEST_SEND_CONCURRENCY at a time, over the shared Termii client, and the
+response reports each recipient's latency and Termii result.
 """
 
-import os
+import asyncio
+import html
+import json
 import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Request, Form, HTTPException, Depends
 from fastapi.responses import HTMLResponse
-from dotenv import load_dotenv
-from app.services.termii import TermiiService
+from pydantic import BaseModel
+from app.config import TERMII_CHANNELS, get_config
+from app.models.templates import get_templates, render_template
+from app.services.termii import TermiiCredentials, get_shop_credentials, get_termii_service
+from app.services.webhook_topics import SAMPLE_ORDER, topic_for_kind
 from app.utils.phone_formatter import format_phone_for_termii
 from app.middleware.auth import require_admin_access
-# Settings are now in .env, not per-shop
 
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/test-simple", tags=["test-simple"])
 
+# Recipients accepted per test send, and how many are sent at once
+MAX_TEST_RECIPIENTS = 20
+TEST_SEND_CONCURRENCY = 5
+
+
+class TestSendRequest(BaseModel):
+    """
+    JSON test send. Either `message` or `template` ("order_confirmation" or
+    "fulfillment", rendered from the shop's templates against `sample_order`,
+    or a built-in sample order) is required. `channel` defaults to the
+    transactional route (TERMII_TRANSACTIONAL_CHANNEL) order SMS go out on.
+    """
+    phones: List[str]
+    message: str = ""
+    template: str = ""
+    sample_order: Optional[Dict[str, Any]] = None
+    channel: str = ""
+
+
+def parse_recipients(phones: List[str]) -> List[str]:
+    """Split entries on commas and whitespace, drop duplicates, enforce MAX_TEST_RECIPIENTS."""
+    recipients: List[str] = []
+    for entry in phones:
+        for phone in re.split(r"[\s,;]+", entry):
+            if phone and phone not in recipients:
+                recipients.append(phone)
+    if not recipients:
+        raise ValueError("At least one phone number is required")
+    if len(recipients) > MAX_TEST_RECIPIENTS:
+        raise ValueError(f"At most {MAX_TEST_RECIPIENTS} phone numbers per test send")
+    return recipients
+
+
+def build_test_message(shop_domain: str, message: str, template: str, sample_order: Optional[dict]) -> str:
+    """The typed message, or the shop's template for `template` rendered against the sample order."""
+    if not template:
+        if not message.strip():
+            raise ValueError("Enter a message or choose a template")
+        return message
+    templates = get_templates(shop_domain)
+    topic = topic_for_kind(template)
+    if topic is None or not hasattr(templates, template):
+        raise ValueError(f"Unknown template: {template}")
+    try:
+        context = topic.build_context(sample_order or SAMPLE_ORDER)
+    except (AttributeError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid sample order: {e}")
+    return render_template(getattr(templates, template), context)
+
+
+def resolve_test_channel(channel: str) -> str:
+    """The requested Termii channel, or the transactional one order SMS use."""
+    channel = channel.strip().lower() or get_config().termii_transactional_channel
+    if channel not in TERMII_CHANNELS:
+        raise ValueError(f"Unknown channel: {channel}. Must be among: {', '.join(TERMII_CHANNELS)}")
+    return channel
+
+
+async def send_test_batch(credentials: TermiiCredentials, phones: List[str], message: str, channel: str) -> List[dict]:
+    """Send `message` to every phone on `channel`, TEST_SEND_CONCURRENCY at a time; one result per phone, in order."""
+    termii_service = get_termii_service(credentials.api_key)
+    semaphore = asyncio.Semaphore(TEST_SEND_CONCURRENCY)
+
+    async def send_one(phone: str) -> dict:
+        entry: Dict[str, Any] = {"phone": phone, "ok": False}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                entry["to"] = format_phone_for_termii(phone)
+                result = await termii_service.send_sms(
+                    to=entry["to"],
+                    message=message,
+                    sender_id=credentials.sender_id,
+                    channel=channel,
+                    message_type="voice" if channel == "voice" else "plain"
+                )
+                entry.update(ok=True, message_id=result.get('message_id') or result.get('messageId'), result=result)
+            except Exception as e:
+                entry["error"] = str(e)
+            entry["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return entry
+
+    results = await asyncio.gather(*(send_one(phone) for phone in phones))
+    sent = sum(1 for entry in results if entry["ok"])
+    logger.info(f"Test SMS sent to {sent}/{len(results)} recipients")
+    return list(results)
+
 
 def get_shop_domain_from_request(request: Request) -> str:
     """Extract shop domain from request for settings lookup."""
@@ -31,7 +130,6 @@ def get_shop_domain_from_request(request: Request) -> str:
 
     referer = request.headers.get("referer", "")
     if referer:
-        import re
         from urllib.parse import unquote
         match = re.search(r'[?&]shop=([^&]+)', referer)
         if match:
@@ -52,10 +150,13 @@ async def simple_test_sms_page(request: Request, _auth: bool = Depends(require_a
     shop_domain = get_shop_domain_from_request(request)
     logger.info(f"Simple test SMS page - Shop domain: '{shop_domain}'")
 
-    # Check Termii configuration from environment
-    termii_api_key = os.getenv("TERMII_API_KEY", "").strip()
-    termii_sender_id = os.getenv("TERMII_SENDER_ID", "").strip()
-    termii_configured = bool(termii_api_key and termii_sender_id)
+    # The shop's own Termii account, or the global one from .env
+    try:
+        termii_sender_id = (await get_shop_credentials(shop_domain)).sender_id
+        termii_configured = True
+    except ValueError:
+        termii_sender_id = ""
+        termii_configured = False
 
     settings_status = ""
     if termii_configured:
@@ -190,6 +291,7 @@ async def simple_test_sms_page(request: Request, _auth: bool = Depends(require_a
                 letter-spacing: -0.01em;
             }}
             .form-group input,
+            .form-group select,
             .form-group textarea {{
                 width: 100%;
                 padding: 12px 14px;
@@ -289,15 +391,24 @@ async def simple_test_sms_page(request: Request, _auth: bool = Depends(require_a
                 <div class="form-section">
                     <form method="POST" action="/test-simple/sms?shop={shop_domain}" id="smsForm">
                         <div class="form-group">
-                            <label for="phone">Phone Number</label>
-                            <input 
-                                type="text" 
+                            <label for="phone">Phone Numbers</label>
+                            <textarea 
                                 id="phone" 
                                 name="phone" 
                                 placeholder="2349118462627"
                                 required
-                            >
-                            <div class="help-text">International format without + (e.g., 2349118462627)</div>
+                            ></textarea>
+                            <div class="help-text">International format without + (e.g., 2349118462627); up to {MAX_TEST_RECIPIENTS}, one per line or comma-separated, e.g. one per network</div>
+                        </div>
+
+                        <div class="form-group">
+                            <label for="template">Template</label>
+                            <select id="template" name="template">
+                                <option value="">Custom message (below)</option>
+                                <option value="order_confirmation">Order confirmation</option>
+                                <option value="fulfillment">Fulfillment</option>
+                            </select>
+                            <div class="help-text">Send one of your saved templates, rendered with a sample order</div>
                         </div>
 
                         <div class="form-group">
@@ -306,9 +417,18 @@ async def simple_test_sms_page(request: Request, _auth: bool = Depends(require_a
                                 id="message" 
                                 name="message" 
                                 placeholder="Enter your test message..."
-                                required
                             >Hi, this is a test message from your Shopify store!</textarea>
-                            <div class="help-text">Maximum 160 characters for standard SMS</div>
+                            <div class="help-text">Maximum 160 characters for standard SMS; ignored when a template is chosen</div>
+                        </div>
+
+                        <div class="form-group">
+                            <label for="sample_order">Sample Order (optional)</label>
+                            <textarea 
+                                id="sample_order" 
+                                name="sample_order" 
+                                placeholder='{{"order_number": 1001, "total_price": "25000.00", "currency": "NGN", "customer": {{"first_name": "Ada"}}}}'
+                            ></textarea>
+                            <div class="help-text">Shopify order JSON used to fill the template; a built-in sample is used when empty</div>
                         </div>
 
                         <button type="submit" class="btn">Send Test SMS</button>
@@ -343,55 +463,70 @@ async def simple_test_sms_page(request: Request, _auth: bool = Depends(require_a
 async def send_simple_test_sms(
     request: Request,
     phone: str = Form(...),
-    message: str = Form(...),
+    message: str = Form(""),
+    template: str = Form(""),
+    sample_order: str = Form(""),
     _auth: bool = Depends(require_admin_access)
 ):
-    """Send test SMS and return HTML response."""
+    """Send test SMS to one or more numbers and return HTML response."""
     shop_domain = ""
 
     try:
-        logger.info(f"Simple test SMS - Phone: {phone}, Message length: {len(message)}")
+        logger.info(f"Simple test SMS - Phones: {phone}, Template: {template or '(none)'}, Message length: {len(message)}")
 
         # Get shop domain
         shop_domain = get_shop_domain_from_request(request)
         logger.info(f"Shop domain: '{shop_domain}'")
 
-        # Get Termii credentials from environment
-        termii_api_key = os.getenv("TERMII_API_KEY", "").strip()
-        termii_sender_id = os.getenv("TERMII_SENDER_ID", "").strip()
-
-        if not termii_api_key or not termii_sender_id:
+        # The shop's own Termii account, or the global one from .env
+        try:
+            credentials = await get_shop_credentials(shop_domain)
+        except ValueError:
             raise HTTPException(
                 status_code=400,
                 detail="TERMII_API_KEY or TERMII_SENDER_ID not configured in .env file"
             )
 
-        # Format phone and send SMS
-        formatted_phone = format_phone_for_termii(phone)
-        logger.info(f"Formatted phone: {formatted_phone}")
+        recipients = parse_recipients([phone])
+        try:
+            order = json.loads(sample_order) if sample_order.strip() else None
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Sample order is not valid JSON: {e}")
+        if order is not None and not isinstance(order, dict):
+            raise ValueError("Sample order must be a JSON object")
+        message = build_test_message(shop_domain, message, template, order)
 
-        termii_base_url = os.getenv("TERMII_BASE_URL", "https://v3.api.termii.com")
-        termii_service = TermiiService(api_key=termii_api_key, base_url=termii_base_url)
+        # Fan out over the shared Termii client
+        started = time.perf_counter()
+        results = await send_test_batch(credentials, recipients, message, resolve_test_channel(""))
+        total_ms = (time.perf_counter() - started) * 1000
+        sent = sum(1 for entry in results if entry["ok"])
 
-        result = await termii_service.send_sms(
-            to=formatted_phone,
-            message=message,
-            sender_id=termii_sender_id,
-            channel="generic"
+        result_rows = "".join(
+            f"""
+                            <tr>
+                                <td>{html.escape(entry.get("to", entry["phone"]))}</td>
+                                <td class="{'ok' if entry['ok'] else 'failed'}">{'Sent' if entry['ok'] else 'Failed'}</td>
+                                <td>{entry["latency_ms"]:.0f} ms</td>
+                                <td>{html.escape(str(entry.get("message_id") or entry.get("error", "")))}</td>
+                            </tr>"""
+            for entry in results
         )
 
-        logger.info(f"SMS sent successfully: {result}")
+        responses = html.escape(json.dumps(
+            {entry.get("to", entry["phone"]): entry.get("result") or entry.get("error") for entry in results},
+            indent=2,
+            ensure_ascii=False
+        ))
 
-        message_id = result.get('message_id') or result.get('messageId')
-
-        # Return success page
+        # Return results page
         html_content = f"""
         <!DOCTYPE html>
         <html lang="en">
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>SMS Sent Successfully</title>
+            <title>Test SMS Results</title>
             <style>
                 * {{
                     margin: 0;
@@ -494,6 +629,27 @@ async def send_simple_test_sms(
                     color: #555;
                     word-break: break-all;
                 }}
+                .results-table {{
+                    width: 100%;
+                    border-collapse: collapse;
+                    margin-top: 12px;
+                    font-size: 0.85rem;
+                }}
+                .results-table th,
+                .results-table td {{
+                    text-align: left;
+                    padding: 6px 8px;
+                    border-bottom: 1px solid rgba(0,0,0,0.06);
+                    word-break: break-all;
+                }}
+                .results-table .ok {{
+                    color: #15803d;
+                    font-weight: 600;
+                }}
+                .results-table .failed {{
+                    color: #b91c1c;
+                    font-weight: 600;
+                }}
                 .response-box {{
                     background: rgba(240,240,240,0.8);
                     border: 1px solid rgba(0,0,0,0.06);
@@ -551,7 +707,7 @@ async def send_simple_test_sms(
         <body>
             <div class="app-container">
                 <div class="header">
-                    <h1>SMS Sent Successfully</h1>
+                    <h1>Test SMS Results</h1>
                 </div>
                 
                 <div class="content">
@@ -560,29 +716,29 @@ async def send_simple_test_sms(
                             <path d="M9 16.17L4.83 12l-1.42 1.41L9 19 21 7l-1.41-1.41z"/>
                         </svg>
                         <div>
-                            <h2>✓ SMS Sent Successfully!</h2>
-                            <p>Your test SMS has been sent via Termii.</p>
+                            <h2>✓ Sent to {sent} of {len(results)} recipients</h2>
+                            <p>Your test SMS was sent via Termii in {total_ms:.0f} ms.</p>
                         </div>
                     </div>
 
                     <div class="details-section">
                         <h3>Details</h3>
                         <div class="detail-row">
-                            <span class="detail-label">Phone:</span>
-                            <span class="detail-value">{formatted_phone}</span>
-                        </div>
-                        <div class="detail-row">
-                            <span class="detail-label">Message ID:</span>
-                            <span class="detail-value">{message_id}</span>
+                            <span class="detail-label">Sender ID:</span>
+                            <span class="detail-value">{credentials.sender_id}</span>
                         </div>
                         <div class="detail-row">
-                            <span class="detail-label">Sender ID:</span>
-                            <span class="detail-value">{termii_sender_id}</span>
+                            <span class="detail-label">Message:</span>
+                            <span class="detail-value">{html.escape(message)}</span>
                         </div>
+
+                        <table class="results-table">
+                            <tr><th>Phone</th><th>Status</th><th>Latency</th><th>Message ID / Error</th></tr>{result_rows}
+                        </table>
                         
                         <div class="response-box">
-                            <strong style="font-size: 0.8rem; color: #1a1a1a;">Full Response:</strong>
-                            <pre>{result}</pre>
+                            <strong style="font-size: 0.8rem; color: #1a1a1a;">Full Responses:</strong>
+                            <pre>{responses}</pre>
                         </div>
                     </div>
 
@@ -844,4 +1000,35 @@ async def send_simple_test_sms(
         </body>
         </html>
         """
-        return HTMLResponse(content=error_html, status_code=500)
\ No newline at end of file
+        return HTMLResponse(content=error_html, status_code=500)
+
+
+@router.post("/sms/batch")
+async def send_test_sms_batch(request: Request, body: TestSendRequest, _auth: bool = Depends(require_admin_access)):
+    """
+    Send a test SMS to several numbers (JSON, for QA scripts). Returns each
+    recipient's latency and Termii result; one failed recipient doesn't fail the request.
+    """
+    shop_domain = get_shop_domain_from_request(request)
+    try:
+        credentials = await get_shop_credentials(shop_domain)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="TERMII_API_KEY or TERMII_SENDER_ID not configured in .env file")
+    try:
+        recipients = parse_recipients(body.phones)
+        message = build_test_message(shop_domain, body.message, body.template, body.sample_order)
+        channel = resolve_test_channel(body.channel)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    started = time.perf_counter()
+    results = await send_test_batch(credentials, recipients, message, channel)
+    return {
+        "shop": shop_domain,
+        "sender_id": credentials.sender_id,
+        "channel": channel,
+        "message": message,
+        "sent": sum(1 for entry in results if entry["ok"]),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results,
+    }
@@ -1,252 +1,178 @@
-import os
+"""
+Shopify webhook ingress.
+
+One route serves every topic in the registry (app/services/webhook_topics.py):
+POST /webhooks/{topic}, e.g. /webhooks/orders/create. Each delivery goes
+through the same pipeline: verify the HMAC, parse the body, drop duplicate
+deliveries (by X-Shopify-Webhook-Id), then enqueue a NotificationJob built
+from the topic's phone, order ID and context extractors.
+"""
 import json
 import logging
-from fastapi import APIRouter, Request, HTTPException, Header
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException, Header, Depends
 from fastapi.responses import Response
-from dotenv import load_dotenv
+from app.config import get_config
 from app.services.webhook_verifier import verify_shopify_webhook
-from app.services.termii import TermiiService
-from app.models.templates import get_templates
-from app.utils.phone_formatter import format_phone_for_termii
+from app.services import shutdown
+from app.services.dispatch_queue import NotificationJob, get_dispatch_queue
+from app.services.state_store import get_state_store
+from app.services.webhook_capture import capture
+from app.services.webhook_topics import get_topic
+from app.utils.metrics import registry
+from app.utils.request_context import get_correlation_id, timed_phase
 
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+# State store namespace of webhook IDs already accepted
+WEBHOOK_DEDUP_NAMESPACE = "webhook_seen"
+
+
+async def reject_while_draining() -> None:
+    """Answer 503 with Retry-After during shutdown so Shopify redelivers the webhook."""
+    if shutdown.is_draining():
+        raise HTTPException(
+            status_code=503,
+            detail="Shutting down",
+            headers={"Retry-After": str(get_config().shutdown_retry_after)}
+        )
 
-# Webhook signing secret from Shopify Admin → Settings → Notifications → Webhooks
-# This is the 64-character secret shown at the bottom of the webhooks page
-# Different from the app's API secret (client secret) in Partner Dashboard
-SHOPIFY_WEBHOOK_SECRET = os.getenv("SHOPIFY_WEBHOOK_SECRET", "").strip()
-# Fallback to SHOPIFY_API_SECRET for backward compatibility
-if not SHOPIFY_WEBHOOK_SECRET:
-    SHOPIFY_WEBHOOK_SECRET = os.getenv("SHOPIFY_API_SECRET", "").strip()
 
-# Termii configuration from environment variables (global, not per-shop)
-TERMII_API_KEY = os.getenv("TERMII_API_KEY", "").strip()
-TERMII_SENDER_ID = os.getenv("TERMII_SENDER_ID", "").strip()
-TERMII_BASE_URL = os.getenv("TERMII_BASE_URL", "https://v3.api.termii.com").strip()
+router = APIRouter(prefix="/webhooks", tags=["webhooks"], dependencies=[Depends(reject_while_draining)])
 
 
-def render_template(template: str, context: dict) -> str:
+async def enqueue_notification(job: NotificationJob) -> None:
     """
-    Simple template rendering for SMS messages.
-    Replaces {{variable_name}} with values from context.
+    Hand a notification to the dispatch queue. Rendering and sending happen
+    in a dispatcher, so a slow SMS provider never holds up the webhook.
+    Raises 503 if the queue is unavailable so Shopify retries the delivery.
     """
-    result = template
-    for key, value in context.items():
-        result = result.replace(f"{{{{{key}}}}}", str(value))
-    return result
+    try:
+        with timed_phase("enqueue"):
+            await get_dispatch_queue().put(job)
+    except Exception as e:
+        logger.error(f"Failed to enqueue {job.kind} SMS for order {job.order_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="Notification queue unavailable")
+    logger.info(f"Queued {job.kind} SMS for order {job.order_id} on shop {job.shop_domain} (job {job.id})")
 
 
-@router.post("/orders/create")
-async def handle_order_create(
-    request: Request, 
-    x_shopify_hmac_sha256: str = Header(..., alias="X-Shopify-Hmac-Sha256"),
-    x_shopify_shop_domain: str = Header(None, alias="X-Shopify-Shop-Domain")
-):
+async def claim_delivery(webhook_id: Optional[str], topic: str) -> bool:
     """
-    Handle order creation webhook.
-    Sends order confirmation SMS to customer.
+    Record a webhook delivery as accepted. Returns False if the same
+    X-Shopify-Webhook-Id was already accepted (Shopify redelivers on timeouts
+    and errors). Deliveries without an ID, or with WEBHOOK_DEDUP_TTL=0, are
+    always accepted; a store outage fails open rather than losing the SMS.
     """
-    if not SHOPIFY_WEBHOOK_SECRET:
-        logger.error("Shopify webhook secret not configured")
-        raise HTTPException(status_code=500, detail="Server configuration error")
-    
-    # Get raw body for HMAC verification (must read once)
-    raw_body = await request.body()
-    
-    # Log for debugging
-    logger.info(f"Webhook received - Body length: {len(raw_body)} bytes, HMAC header: {x_shopify_hmac_sha256[:20]}...")
-    logger.info(f"SHOPIFY_WEBHOOK_SECRET configured: {bool(SHOPIFY_WEBHOOK_SECRET)}, length: {len(SHOPIFY_WEBHOOK_SECRET) if SHOPIFY_WEBHOOK_SECRET else 0}")
-    
-    # Verify webhook signature
-    if not verify_shopify_webhook(SHOPIFY_WEBHOOK_SECRET, raw_body, x_shopify_hmac_sha256):
-        logger.warning("Webhook HMAC verification failed for orders/create")
-        raise HTTPException(status_code=401, detail="Invalid webhook signature")
-    
-    # Parse JSON payload from raw body (already read)
+    ttl = get_config().webhook_dedup_ttl
+    if not webhook_id or ttl <= 0:
+        return True
     try:
-        order = json.loads(raw_body.decode('utf-8'))
+        with timed_phase("dedup"):
+            return await get_state_store().add(WEBHOOK_DEDUP_NAMESPACE, webhook_id, topic, ttl=ttl)
     except Exception as e:
-        logger.error(f"Failed to parse webhook JSON: {e}")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
-    
-    # Get shop domain from header or order data
-    shop_domain = x_shopify_shop_domain or order.get("myshopify_domain", "")
-    
-    if not shop_domain:
-        logger.warning("Missing shop domain in webhook")
-        return Response(status_code=200)
-    
-    logger.info(f"Processing order/create webhook for shop: {shop_domain}, order ID: {order.get('id')}")
-    
-    # Check Termii configuration (global from .env)
-    if not TERMII_API_KEY or not TERMII_SENDER_ID:
-        logger.error("Termii not configured in environment variables. Check TERMII_API_KEY and TERMII_SENDER_ID in .env")
-        return Response(status_code=200)
-    
-    # Get SMS templates for this shop
-    templates = get_templates(shop_domain)
-    
-    # Extract customer phone number (handle case where customer might be None)
-    customer = order.get("customer") or {}
-    phone = customer.get("phone") or order.get("phone") or order.get("billing_address", {}).get("phone")
-    
-    if not phone:
-        logger.info(f"No phone number found for order {order.get('id')} on shop {shop_domain}")
-        return Response(status_code=200)
-    
+        logger.error(f"Webhook dedup check failed, accepting {topic} delivery {webhook_id}: {e}")
+        return True
+
+
+async def release_delivery(webhook_id: Optional[str]) -> None:
+    """Forget a claimed delivery that could not be queued, so Shopify's retry is accepted."""
+    if not webhook_id or get_config().webhook_dedup_ttl <= 0:
+        return
     try:
-        # Format phone number
-        logger.info(f"Formatting phone number: {phone}")
-        formatted_phone = format_phone_for_termii(phone)
-        logger.info(f"Formatted phone number: {formatted_phone}")
-        
-        # Prepare template context
-        customer_name = customer.get("first_name", "Customer") or "Customer"
-        order_number = order.get("order_number") or order.get("name", "N/A")
-        total_price = order.get("total_price", "0")
-        currency = order.get("currency", "")
-        
-        context = {
-            "customer_name": customer_name,
-            "order_number": order_number,
-            "total_price": f"{currency} {total_price}" if currency else total_price
-        }
-        
-        # Render SMS template
-        message = render_template(templates.order_confirmation, context)
-        logger.info(f"SMS message: {message[:100]}...")
-        
-        # Send SMS
-        termii_service = TermiiService(
-            api_key=TERMII_API_KEY,
-            base_url=TERMII_BASE_URL
-        )
-        
-        result = await termii_service.send_sms(
-            to=formatted_phone,
-            message=message,
-            sender_id=TERMII_SENDER_ID,
-            channel="generic"
-        )
-        
-        logger.info(f"Order confirmation SMS sent to {formatted_phone} for order {order_number}. Response: {result}")
-        
+        await get_state_store().delete(WEBHOOK_DEDUP_NAMESPACE, webhook_id)
     except Exception as e:
-        logger.error(f"Error sending order confirmation SMS for order {order.get('id')}: {e}", exc_info=True)
-        # Return 200 OK even if SMS fails (to prevent webhook retries)
-    
-    return Response(status_code=200)
+        logger.error(f"Failed to release webhook delivery {webhook_id}: {e}")
 
 
-@router.post("/orders/fulfilled")
-async def handle_order_fulfilled(
-    request: Request, 
+@router.post("/{topic_name:path}")
+async def handle_webhook(
+    topic_name: str,
+    request: Request,
     x_shopify_hmac_sha256: str = Header(..., alias="X-Shopify-Hmac-Sha256"),
-    x_shopify_shop_domain: str = Header(None, alias="X-Shopify-Shop-Domain")
+    x_shopify_shop_domain: str = Header(None, alias="X-Shopify-Shop-Domain"),
+    x_shopify_webhook_id: str = Header(None, alias="X-Shopify-Webhook-Id")
 ):
     """
-    Handle order fulfillment webhook.
-    Sends fulfillment notification SMS to customer.
+    Handle a webhook for any registered topic.
+    Queues the topic's SMS to the customer.
     """
-    if not SHOPIFY_WEBHOOK_SECRET:
+    topic = get_topic(topic_name)
+    if topic is None:
+        raise HTTPException(status_code=404, detail=f"Unsupported webhook topic: {topic_name}")
+
+    # Webhook signing secret from Shopify Admin → Settings → Notifications → Webhooks
+    # (falls back to SHOPIFY_API_SECRET); one config snapshot for the whole request
+    config = get_config()
+    webhook_secret = config.webhook_secret
+    if not webhook_secret:
         logger.error("Shopify webhook secret not configured")
         raise HTTPException(status_code=500, detail="Server configuration error")
     
     # Get raw body for HMAC verification (must read once)
-    raw_body = await request.body()
+    with timed_phase("body"):
+        raw_body = await request.body()
     
     # Log for debugging
     logger.info(f"Webhook received - Body length: {len(raw_body)} bytes, HMAC header: {x_shopify_hmac_sha256[:20]}...")
-    logger.info(f"SHOPIFY_WEBHOOK_SECRET configured: {bool(SHOPIFY_WEBHOOK_SECRET)}, length: {len(SHOPIFY_WEBHOOK_SECRET) if SHOPIFY_WEBHOOK_SECRET else 0}")
+    logger.info(f"SHOPIFY_WEBHOOK_SECRET configured: {bool(webhook_secret)}, length: {len(webhook_secret)}")
     
     # Verify webhook signature
-    if not verify_shopify_webhook(SHOPIFY_WEBHOOK_SECRET, raw_body, x_shopify_hmac_sha256):
-        logger.warning("Webhook HMAC verification failed for orders/fulfilled")
+    with timed_phase("hmac"):
+        is_valid = verify_shopify_webhook(webhook_secret, raw_body, x_shopify_hmac_sha256)
+    if not is_valid:
+        logger.warning(f"Webhook HMAC verification failed for {topic.topic}")
         raise HTTPException(status_code=401, detail="Invalid webhook signature")
     
+    capture.maybe_capture(request.url.path, dict(request.headers), raw_body)
+    
     # Parse JSON payload from raw body (already read)
     try:
-        order = json.loads(raw_body.decode('utf-8'))
+        with timed_phase("parse"):
+            payload = json.loads(raw_body.decode('utf-8'))
     except Exception as e:
         logger.error(f"Failed to parse webhook JSON: {e}")
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
     
-    # Get shop domain from header or order data
-    shop_domain = x_shopify_shop_domain or order.get("myshopify_domain", "")
+    # Get shop domain from header or payload
+    shop_domain = x_shopify_shop_domain or payload.get("myshopify_domain", "")
     
     if not shop_domain:
         logger.warning("Missing shop domain in webhook")
         return Response(status_code=200)
-    
-    logger.info(f"Processing order/fulfilled webhook for shop: {shop_domain}, order ID: {order.get('id')}")
-    
-    # Check Termii configuration (global from .env)
-    if not TERMII_API_KEY or not TERMII_SENDER_ID:
-        logger.error("Termii not configured in environment variables. Check TERMII_API_KEY and TERMII_SENDER_ID in .env")
+
+    missing = topic.missing_fields(payload)
+    if missing:
+        logger.warning(f"Skipping {topic.topic} webhook for shop {shop_domain}: missing {', '.join(missing)}")
         return Response(status_code=200)
+
+    order_id = topic.order_id(payload)
+    logger.info(f"Processing {topic.topic} webhook for shop: {shop_domain}, order ID: {order_id}")
     
-    # Get SMS templates for this shop
-    templates = get_templates(shop_domain)
-    
-    # Extract customer phone number (handle case where customer might be None)
-    customer = order.get("customer") or {}
-    phone = customer.get("phone") or order.get("phone") or order.get("billing_address", {}).get("phone")
-    
+    phone = topic.phone(payload)
     if not phone:
-        logger.info(f"No phone number found for fulfilled order {order.get('id')} on shop {shop_domain}")
+        logger.info(f"No phone number found for {topic.topic} order {order_id} on shop {shop_domain}")
         return Response(status_code=200)
-    
+
+    if not await claim_delivery(x_shopify_webhook_id, topic.topic):
+        logger.info(f"Ignoring duplicate {topic.topic} delivery {x_shopify_webhook_id} for order {order_id}")
+        registry.counter("webhook_duplicates_total", {"topic": topic.topic}).inc()
+        return Response(status_code=200)
+
     try:
-        # Format phone number
-        logger.info(f"Formatting phone number: {phone}")
-        formatted_phone = format_phone_for_termii(phone)
-        logger.info(f"Formatted phone number: {formatted_phone}")
-        
-        # Prepare template context
-        customer_name = customer.get("first_name", "Customer") or "Customer"
-        order_number = order.get("order_number") or order.get("name", "N/A")
-        
-        # Get tracking info if available
-        fulfillments = order.get("fulfillments", [])
-        tracking_number = ""
-        tracking_url = ""
-        if fulfillments:
-            tracking_number = fulfillments[0].get("tracking_number", "")
-            tracking_url = fulfillments[0].get("tracking_url", "")
-        
-        context = {
-            "customer_name": customer_name,
-            "order_number": order_number,
-            "tracking_number": tracking_number,
-            "tracking_url": tracking_url
-        }
-        
-        # Render SMS template
-        message = render_template(templates.fulfillment, context)
-        logger.info(f"SMS message: {message[:100]}...")
-        
-        # Send SMS
-        termii_service = TermiiService(
-            api_key=TERMII_API_KEY,
-            base_url=TERMII_BASE_URL
-        )
-        
-        result = await termii_service.send_sms(
-            to=formatted_phone,
-            message=message,
-            sender_id=TERMII_SENDER_ID,
-            channel="generic"
-        )
-        
-        logger.info(f"Fulfillment SMS sent to {formatted_phone} for order {order_number}. Response: {result}")
-        
-    except Exception as e:
-        logger.error(f"Error sending fulfillment SMS for order {order.get('id')}: {e}", exc_info=True)
-        # Return 200 OK even if SMS fails (to prevent webhook retries)
+        await enqueue_notification(NotificationJob(
+            kind=topic.kind,
+            shop_domain=shop_domain,
+            order_id=str(order_id),
+            phone=phone,
+            context=topic.build_context(payload),
+            correlation_id=get_correlation_id(),
+            lane=topic.lane
+        ))
+    except Exception:
+        await release_delivery(x_shopify_webhook_id)
+        raise
     
     return Response(status_code=200)
-
@@ -0,0 +1,311 @@
+"""
+Production launcher: preload the app once, then fork worker processes.
+
+The master imports app.main (and the lazily loaded HTML page modules) before
+forking, so workers share those pages copy-on-write instead of each holding
+its own copy. All workers accept connections from one listening socket
+created by the master. Each worker is a normal uvicorn server and runs the
+app's lifespan hooks itself.
+
+Signals to the master:
+    SIGHUP           rolling restart: reload config, then replace workers one
+                     at a time, waiting for each replacement to finish startup
+                     before stopping the old worker (no dropped connections)
+    SIGTERM, SIGINT  graceful shutdown of all workers
+    SIGTTIN/SIGTTOU  add/remove one worker
+
+Workers exit after --max-requests requests (plus jitter) and are replaced.
+Code changes are not picked up by a rolling restart because the app is
+preloaded; restart the master to deploy new code.
+
+Usage:
+    python -m app.server --workers 4 --max-requests 10000
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import uvicorn
+
+from app.config import get_config, reload_config
+from app.services import shutdown
+
+logger = logging.getLogger("app.server")
+
+# Time between a stopping worker closing its listener and closing idle connections
+SHUTDOWN_SETTLE_SECONDS = 0.5
+
+# At most max(2 x workers, MIN_SPAWNS_PER_WINDOW) replacement spawns per window
+SPAWN_WINDOW_SECONDS = 10.0
+MIN_SPAWNS_PER_WINDOW = 10
+
+WORKER_SIGNALS = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD, signal.SIGTTIN, signal.SIGTTOU)
+
+
+class _WorkerServer(uvicorn.Server):
+    """uvicorn server that tells the master when startup (including lifespan) has finished."""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: Optional[int]):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if self.ready_fd is not None:
+            if not self.should_exit:
+                os.write(self.ready_fd, b"1")
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+    async def shutdown(self, sockets=None) -> None:
+        # Webhooks arriving from here on get 503 + Retry-After and /ready fails
+        shutdown.begin_drain()
+        # Stop accepting first, then give connections accepted just before the
+        # signal time to send their request: uvicorn closes connections that
+        # have no request in progress, which would drop them
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(SHUTDOWN_SETTLE_SECONDS)
+        await super().shutdown(sockets=sockets)
+
+
+class Master:
+    def __init__(self, app, args: argparse.Namespace):
+        self.app = app
+        self.args = args
+        self.num_workers = args.workers
+        self.workers: Dict[int, int] = {}  # pid -> generation
+        self.generation = 0
+        self.socket: Optional[socket.socket] = None
+        self._signals: List[int] = []
+        self._stopping = False
+        self._spawn_times: Deque[float] = deque()
+
+    def bind(self) -> None:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.args.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.args.host, self.args.port))
+        sock.listen(self.args.backlog)
+        sock.set_inheritable(True)
+        self.socket = sock
+
+    # Worker lifecycle
+
+    def spawn(self, wait_ready: bool = False) -> Optional[int]:
+        """
+        Fork a worker. With wait_ready, block until it has finished startup
+        and return None if it fails to.
+        """
+        read_fd, write_fd = os.pipe() if wait_ready else (None, None)
+        pid = os.fork()
+        if pid == 0:
+            if read_fd is not None:
+                os.close(read_fd)
+            self._run_worker(write_fd)
+            os._exit(0)
+
+        self.workers[pid] = self.generation
+        logger.info(f"Spawned worker {pid} (generation {self.generation})")
+        if read_fd is None:
+            return pid
+
+        os.close(write_fd)
+        try:
+            ready, _, _ = select.select([read_fd], [], [], self.args.startup_timeout)
+            if not ready or not os.read(read_fd, 1):
+                logger.error(f"Worker {pid} did not finish startup within {self.args.startup_timeout:.0f}s")
+                self.stop_worker(pid, signal.SIGKILL)
+                return None
+        finally:
+            os.close(read_fd)
+        return pid
+
+    def _run_worker(self, ready_fd: Optional[int]) -> None:
+        for sig in WORKER_SIGNALS:
+            signal.signal(sig, signal.SIG_DFL)
+        # Forked children inherit the master's random state
+        random.seed()
+        limit = None
+        if self.args.max_requests:
+            limit = self.args.max_requests + random.randint(0, self.args.max_requests_jitter)
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            log_level=self.args.log_level,
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=self.args.graceful_timeout,
+            proxy_headers=True,
+            forwarded_allow_ips=self.args.forwarded_allow_ips,
+        )
+        try:
+            _WorkerServer(config, ready_fd).run(sockets=[self.socket])
+        except SystemExit as e:
+            os._exit(e.code if isinstance(e.code, int) else 1)
+        except Exception:
+            logger.exception("Worker crashed")
+            os._exit(1)
+
+    @property
+    def stop_timeout(self) -> float:
+        """How long a stopping worker gets: finish requests, drain queued SMS, then a margin."""
+        return self.args.graceful_timeout + get_config().shutdown_drain_timeout + 5
+
+    def stop_worker(self, pid: int, sig: int = signal.SIGTERM) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def wait_for_exit(self, pids: List[int], timeout: float) -> None:
+        """Reap the given workers, killing any still alive after timeout."""
+        deadline = time.monotonic() + timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            self.reap(expected=remaining)
+            remaining &= set(self.workers)
+            if remaining:
+                time.sleep(0.1)
+        for pid in remaining:
+            logger.warning(f"Worker {pid} did not exit within {timeout:.0f}s; killing")
+            self.stop_worker(pid, signal.SIGKILL)
+        if remaining:
+            time.sleep(0.1)
+            self.reap(expected=remaining)
+
+    def reap(self, expected: Optional[set] = None) -> None:
+        """Collect exited workers, logging those that were not being stopped."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if self.workers.pop(pid, None) is None:
+                continue
+            if expected is None or pid not in expected:
+                code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+                logger.info(f"Worker {pid} exited with code {code}")
+
+    def rolling_restart(self) -> None:
+        reload_config()
+        self.generation += 1
+        old = [pid for pid, generation in self.workers.items() if generation < self.generation]
+        logger.info(f"Rolling restart of {len(old)} workers (generation {self.generation})")
+        for pid in old:
+            if self._stopping:
+                return
+            new_pid = self.spawn(wait_ready=True)
+            if new_pid is None:
+                # Keep the old worker serving; a broken release should not take the site down
+                logger.error("Aborting rolling restart: replacement worker failed to start")
+                return
+            self.stop_worker(pid)
+            self.wait_for_exit([pid], self.stop_timeout)
+        logger.info("Rolling restart complete")
+
+    def _spawning_too_fast(self) -> bool:
+        """Throttle respawns so workers crashing at startup don't turn into a fork loop."""
+        now = time.monotonic()
+        while self._spawn_times and now - self._spawn_times[0] > SPAWN_WINDOW_SECONDS:
+            self._spawn_times.popleft()
+        if len(self._spawn_times) >= max(2 * self.num_workers, MIN_SPAWNS_PER_WINDOW):
+            return True
+        self._spawn_times.append(now)
+        return False
+
+    # Main loop
+
+    def _handle_signal(self, sig: int, frame) -> None:
+        self._signals.append(sig)
+
+    def run(self) -> None:
+        self.bind()
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, self._handle_signal)
+
+        # Objects created during preload are never freed; keeping them out of
+        # the GC's generations stops collections from dirtying shared pages
+        gc.collect()
+        gc.freeze()
+
+        logger.info(
+            f"Master {os.getpid()} listening on {self.args.host}:{self.args.port} with {self.num_workers} workers"
+        )
+        for _ in range(self.num_workers):
+            self.spawn()
+
+        while not self._stopping:
+            while self._signals:
+                sig = self._signals.pop(0)
+                if sig in (signal.SIGTERM, signal.SIGINT):
+                    self._stopping = True
+                elif sig == signal.SIGHUP:
+                    self.rolling_restart()
+                elif sig == signal.SIGTTIN:
+                    self.num_workers += 1
+                elif sig == signal.SIGTTOU and self.num_workers > 1:
+                    self.num_workers -= 1
+            if self._stopping:
+                break
+
+            self.reap()
+            # Replace recycled or crashed workers, and apply SIGTTIN/SIGTTOU
+            while len(self.workers) < self.num_workers and not self._spawning_too_fast():
+                self.spawn()
+            if len(self.workers) > self.num_workers:
+                oldest = min(self.workers)
+                self.stop_worker(oldest)
+                self.wait_for_exit([oldest], self.stop_timeout)
+            time.sleep(0.2)
+
+        logger.info("Shutting down workers")
+        pids = list(self.workers)
+        for pid in pids:
+            self.stop_worker(pid)
+        self.wait_for_exit(pids, self.stop_timeout)
+        self.socket.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Preforking production server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=None, help="Defaults to PORT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--max-requests", type=int, default=0, help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=0, help="Random extra requests per worker so they don't recycle together")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="Seconds a stopping worker may spend finishing requests")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="Seconds a new worker may take to start during a rolling restart")
+    parser.add_argument("--forwarded-allow-ips", default="127.0.0.1")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    if args.port is None:
+        args.port = get_config().port
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    if not hasattr(os, "fork"):
+        sys.exit("app.server needs os.fork(); on Windows run `python -m app.main` instead")
+    args = parse_args(argv)
+
+    from app.main import app
+    from app.routes.lazy import preload_lazy_routers
+
+    preload_lazy_routers(app)
+    Master(app, args).run()
+
+
+if __name__ == "__main__":
+    main()
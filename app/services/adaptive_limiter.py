@@ -0,0 +1,172 @@
+"""
+Adaptive concurrency limit (AIMD) for calls to an external API.
+
+The limit grows by one per "window" of fast, successful calls (additive
+increase: +1/limit per call) while the API is actually kept busy, and is
+cut multiplicatively when the API signals overload: timeouts, 429s or
+"temporarily unavailable" responses. A call counts as fast when its
+latency is within `latency_tolerance` x the baseline, where the baseline
+tracks the lowest recent latency and drifts up slowly so it follows a
+genuinely slower API. Slow calls hold the limit where it is.
+
+Throughput therefore settles at whatever the API sustains at the moment
+instead of a fixed guess that is too low when it is fast and too high
+when it is degraded. Callers waiting for capacity are admitted strictly by
+priority, then in arrival order, so urgent calls overtake queued bulk ones.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the gap by which the baseline moves up towards a slower sample
+BASELINE_DRIFT = 0.01
+
+
+class Slot:
+    """One admitted call. Mark overload or ignore it; otherwise it counts as a success."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.overload_reason: Optional[str] = None
+        self.sample = True
+
+    def overloaded(self, reason: str) -> None:
+        self.overload_reason = reason
+
+    def ignore(self) -> None:
+        """Don't learn from this call (e.g. a validation error unrelated to load)."""
+        self.sample = False
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.5,
+    ):
+        """
+        Args:
+            name: Used as the metrics label
+            initial: Starting limit
+            minimum, maximum: Bounds for the limit
+            latency_tolerance: Calls slower than this multiple of the baseline don't grow the limit
+            backoff: Factor applied to the limit on overload
+        """
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self._last_backoff = 0.0
+        # priority -> waiting callers in arrival order
+        self._waiters: Dict[int, Deque[asyncio.Future]] = {}
+        self._limit_gauge = registry.gauge("adaptive_limit", {"name": name})
+        self._in_flight_gauge = registry.gauge("adaptive_limit_in_flight", {"name": name})
+        self._limit_gauge.set(int(self.limit))
+
+    def configure(self, minimum: int, maximum: int, latency_tolerance: float) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self._set_limit(self.limit)
+
+    def close(self) -> None:
+        """Stop reporting metrics for this limiter (e.g. when its client is evicted)."""
+        registry.remove("adaptive_limit", {"name": self.name})
+        registry.remove("adaptive_limit_in_flight", {"name": self.name})
+
+    def _set_limit(self, limit: float) -> None:
+        self.limit = min(max(limit, float(self.minimum)), float(self.maximum))
+        self._limit_gauge.set(int(self.limit))
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            priority = max(self._waiters)
+            queue = self._waiters[priority]
+            waiter = queue.popleft()
+            if not queue:
+                del self._waiters[priority]
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self, priority: int) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(priority, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                queue = self._waiters.get(priority)
+                if queue is not None and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._waiters[priority]
+            raise
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _record(self, slot: Slot, in_flight: int) -> None:
+        latency = time.perf_counter() - slot.started
+        if slot.overload_reason is not None:
+            registry.counter("adaptive_limit_backoffs_total", {"name": self.name, "reason": slot.overload_reason}).inc()
+            # Calls that were in flight together fail together; cut once per baseline latency
+            now = time.monotonic()
+            if now - self._last_backoff >= (self.baseline or latency):
+                self._last_backoff = now
+                previous = int(self.limit)
+                self._set_limit(self.limit * self.backoff)
+                logger.warning(
+                    f"{self.name} overloaded ({slot.overload_reason}); concurrency limit {previous} -> {int(self.limit)}"
+                )
+            return
+        if not slot.sample:
+            return
+
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * BASELINE_DRIFT
+        # Only grow while the limit is actually being used
+        if latency <= self.baseline * self.latency_tolerance and in_flight * 2 >= int(self.limit):
+            self._set_limit(self.limit + 1 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[Slot]:
+        """Wait for capacity (higher priority first), then run one call."""
+        await self._acquire(priority)
+        self._in_flight_gauge.set(self.in_flight)
+        slot = Slot()
+        in_flight = self.in_flight
+        try:
+            yield slot
+        except BaseException:
+            if slot.overload_reason is None:
+                slot.ignore()
+            raise
+        finally:
+            self._record(slot, in_flight)
+            self._release()
+            self._in_flight_gauge.set(self.in_flight)
@@ -0,0 +1,139 @@
+"""
+Channel fallback for SMS that don't get through.
+
+A shop's fallback policy (app/models/fallback_policy.py, or
+DISPATCH_FALLBACK_CHANNELS for shops without one) lists channels to try
+after the lane's own, e.g. dnd → whatsapp → voice. The dispatcher moves a
+job to the next channel when Termii rejects the message or retries on the
+current channel run out, and when the delivery report for a sent message
+says it failed or doesn't arrive within the policy's receipt timeout.
+
+Delivery reports reach POST /webhooks/termii/delivery-reports
+(app/routes/delivery_reports.py) and are kept in the state store, but only
+for messages the dispatcher is waiting on (expect_receipt), so untracked
+reports cost nothing. Each tracked message remembers its shop, so its report
+can be verified with the secret key of the account that sent it.
+"""
+import json
+import logging
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.config import get_config
+from app.models.fallback_policy import FallbackPolicy, get_fallback_policy
+from app.services.state_store import get_state_store
+
+logger = logging.getLogger(__name__)
+
+# State store namespace of delivery statuses by Termii message ID
+RECEIPTS_NAMESPACE = "sms_receipts"
+
+PENDING = "pending"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+# Delivery report statuses meaning the message will not arrive
+FAILED_STATUSES = ("failed", "rejected", "expired", "undelivered", "dnd active")
+
+# Seconds a delivery status is kept beyond the receipt timeout
+RECEIPT_TTL = 3600.0
+
+# Seconds a shop's policy is cached in-process
+POLICY_CACHE_TTL = 30.0
+
+_policy_cache: Dict[str, Tuple[float, Optional[FallbackPolicy]]] = {}
+
+
+class Receipt(NamedTuple):
+    status: str
+    # Shop that sent the message
+    shop_domain: str
+
+
+def default_policy() -> FallbackPolicy:
+    config = get_config()
+    return FallbackPolicy(channels=config.fallback_channels, receipt_timeout=config.dispatch_receipt_timeout)
+
+
+async def get_shop_policy(shop_domain: str) -> FallbackPolicy:
+    """The shop's saved policy, or the default from config (also if the store is unavailable)."""
+    cached = _policy_cache.get(shop_domain)
+    if cached is not None and time.monotonic() - cached[0] < POLICY_CACHE_TTL:
+        policy = cached[1]
+    else:
+        try:
+            policy = await get_fallback_policy(shop_domain)
+        except Exception as e:
+            logger.error(f"Failed to load fallback policy for {shop_domain}, using the default: {e}")
+            return default_policy()
+        _policy_cache[shop_domain] = (time.monotonic(), policy)
+    return policy or default_policy()
+
+
+def forget_shop_policy(shop_domain: str) -> None:
+    """Drop a shop's cached policy after it changes."""
+    _policy_cache.pop(shop_domain, None)
+
+
+def channel_chain(first: str, policy: FallbackPolicy) -> Tuple[str, ...]:
+    """Channels to try in order: the lane's channel, then the policy's (without repeats)."""
+    chain = [first]
+    for channel in policy.channels:
+        if channel not in chain:
+            chain.append(channel)
+    return tuple(chain)
+
+
+def next_channel(chain: Tuple[str, ...], current: str) -> Optional[str]:
+    """Channel after `current` in the chain, or None if it is the last (or no longer listed)."""
+    if current not in chain:
+        return None
+    index = chain.index(current) + 1
+    return chain[index] if index < len(chain) else None
+
+
+def receipt_status(report_status: str) -> str:
+    """Map a Termii delivery report status ("DELIVERED", "Message Failed", ...) to delivered/failed/pending."""
+    status = report_status.strip().lower()
+    if status == "delivered":
+        return DELIVERED
+    if any(marker in status for marker in FAILED_STATUSES):
+        return FAILED
+    return PENDING
+
+
+def _encode_receipt(receipt: Receipt) -> str:
+    return json.dumps(receipt._asdict())
+
+
+def _decode_receipt(raw: str) -> Receipt:
+    return Receipt(**json.loads(raw))
+
+
+async def expect_receipt(message_id: str, shop_domain: str, timeout: float) -> None:
+    """Start keeping delivery reports for a shop's sent message, waited on for up to timeout seconds."""
+    await get_state_store().set(
+        RECEIPTS_NAMESPACE, message_id, _encode_receipt(Receipt(PENDING, shop_domain)), ttl=timeout + RECEIPT_TTL
+    )
+
+
+async def get_tracked_receipt(message_id: str) -> Optional[Receipt]:
+    """The receipt of a message the dispatcher is waiting on, or None if nobody is."""
+    raw = await get_state_store().get(RECEIPTS_NAMESPACE, message_id)
+    return _decode_receipt(raw) if raw is not None else None
+
+
+async def record_receipt(message_id: str, current: Receipt, report_status: str) -> str:
+    """Store a delivery report for a tracked message (see get_tracked_receipt). Returns the mapped status."""
+    status = receipt_status(report_status)
+    if current.status == PENDING and status != PENDING:
+        await get_state_store().set(
+            RECEIPTS_NAMESPACE, message_id, _encode_receipt(current._replace(status=status)), ttl=RECEIPT_TTL
+        )
+    return status
+
+
+async def get_receipt(message_id: str) -> str:
+    """Delivery status of a tracked message (pending until a report arrives)."""
+    receipt = await get_tracked_receipt(message_id)
+    return receipt.status if receipt is not None else PENDING
@@ -0,0 +1,97 @@
+"""
+Circuit breaker for calls to an external account.
+
+After `failure_threshold` consecutive failures the breaker opens and calls
+are rejected immediately with CircuitOpenError, without touching the
+network, for `reset_timeout` seconds. Then one trial call is let through
+(half-open): success closes the breaker, failure opens it again. Callers
+decide what counts as a failure; for Termii that is overload and
+account-level errors such as an exhausted balance or a revoked key, not
+per-message errors like an invalid number.
+"""
+import logging
+import time
+from typing import Optional
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ValueError):
+    """Raised instead of calling out while the breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open; retrying in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """
+        Args:
+            name: Used in logs and as the metrics label
+            failure_threshold: Consecutive failures that open the breaker (0 disables it)
+            reset_timeout: Seconds the breaker stays open before a trial call
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._open_gauge = registry.gauge("circuit_breaker_open", {"name": name})
+
+    def configure(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go out now."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        registry.counter("circuit_breaker_rejections_total", {"name": self.name}).inc()
+        retry_after = max(self.opened_at + self.reset_timeout - time.monotonic(), 1.0)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"{self.name} circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._open_gauge.set(0)
+
+    def record_failure(self, reason: str) -> None:
+        self.failures += 1
+        trial = self._trial_in_flight
+        self._trial_in_flight = False
+        if self.failure_threshold <= 0:
+            return
+        if trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._open_gauge.set(1)
+            logger.warning(
+                f"{self.name} circuit opened after {self.failures} consecutive failures ({reason}); "
+                f"pausing calls for {self.reset_timeout:.0f}s"
+            )
+
+    def record_neutral(self) -> None:
+        """A call that says nothing about the account (e.g. an invalid number)."""
+        self._trial_in_flight = False
+
+    def close(self) -> None:
+        """Stop reporting metrics for this breaker (e.g. when its client is evicted)."""
+        registry.remove("circuit_breaker_open", {"name": self.name})
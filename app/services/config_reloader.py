@@ -0,0 +1,75 @@
+"""
+Hot reload of the application configuration.
+
+Reloads the AppConfig snapshot when the process receives SIGHUP or when the
+.env file's modification time changes. Requests already in flight keep the
+snapshot they started with; new requests see the new one.
+"""
+import asyncio
+import logging
+import os
+import signal
+from pathlib import Path
+from typing import Optional, Union
+
+from app.config import ENV_FILE, reload_config
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigReloader:
+    def __init__(self, env_file: Union[str, Path] = ENV_FILE, interval: float = 5.0):
+        """
+        Args:
+            env_file: File whose modification triggers a reload
+            interval: Seconds between modification checks; 0 disables file watching
+        """
+        self.env_file = env_file
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._signal_installed = False
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.env_file).st_mtime
+        except OSError:
+            return None
+
+    def reload(self, reason: str) -> None:
+        logger.info(f"Reloading configuration ({reason})")
+        reload_config()
+        registry.counter("config_reloads_total", {"reason": reason}).inc()
+
+    async def _watch(self) -> None:
+        last_mtime = self._mtime()
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self._mtime()
+            if mtime != last_mtime:
+                last_mtime = mtime
+                self.reload("file_change")
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, "SIGHUP"):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self.reload, "sighup")
+                self._signal_installed = True
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Not the main thread (e.g. embedded in a test runner) or unsupported platform
+                logger.warning("SIGHUP config reload unavailable in this process")
+        if self.interval > 0 and self._task is None:
+            self._task = loop.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal_installed = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
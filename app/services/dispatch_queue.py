@@ -0,0 +1,557 @@
+"""
+Queue of pending SMS notifications between the webhook routes and the dispatcher.
+
+Webhook handlers enqueue a NotificationJob and return; a Dispatcher (inside
+the web process or in `python -m app.worker`) claims jobs, sends them and
+acknowledges them. A claimed job that is never acknowledged (its worker
+died) becomes visible again after the visibility timeout, so every job is
+delivered at least once. Backends (DISPATCH_BACKEND):
+
+    memory  - in-process; jobs are lost on restart, single process only
+    sqlite  - a local SQLite file shared by all processes on one host
+    redis   - a Redis-compatible server shared across hosts
+              (requires the optional `redis` package)
+
+Every job belongs to a lane: transactional (order confirmations and
+updates) or promotional (campaigns). Consumers claim from one lane at a
+time, so the dispatcher can give each lane its own budget and keep
+promotional traffic out of the way of transactional SMS.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import get_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = Path(__file__).parent.parent / "dispatch.db"
+
+# Dispatch lanes, in priority order
+TRANSACTIONAL = "transactional"
+PROMOTIONAL = "promotional"
+LANES = (TRANSACTIONAL, PROMOTIONAL)
+
+# Order in which an order's notifications must reach the customer
+KIND_SEQUENCE = {"order_confirmation": 0, "fulfillment": 1}
+
+# Redis: per-order sets score jobs as sequence * stride + created_at
+ORDER_SCORE_STRIDE = 1e11
+ORDER_KEY_TTL = 7 * 24 * 3600
+
+# How often SQLite consumers poll for new jobs when nothing was enqueued locally
+POLL_INTERVAL = 0.25
+
+
+@dataclass
+class NotificationJob:
+    """One SMS to render and send."""
+    kind: str  # "order_confirmation" or "fulfillment"
+    shop_domain: str
+    order_id: str
+    phone: str
+    context: Dict[str, Any]
+    correlation_id: str = "-"
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+    attempts: int = 0
+    # When the dispatcher first held this job back for an earlier job of the same order
+    deferred_since: Optional[float] = None
+    lane: str = TRANSACTIONAL
+    # Channel fallback: the channel to send on (None: the lane's), and the
+    # Termii message ID and send time of a sent message awaiting its delivery report
+    channel: Optional[str] = None
+    receipt_id: Optional[str] = None
+    sent_at: Optional[float] = None
+
+    @property
+    def order_key(self) -> Optional[str]:
+        """
+        Jobs with the same key are sent in sequence order; None if the order
+        is unknown or the job only checks a delivery report (the SMS is out).
+        """
+        if not self.order_id or self.order_id == "None" or self.receipt_id is not None:
+            return None
+        return f"{self.shop_domain}:{self.order_id}"
+
+    @property
+    def sequence(self) -> tuple:
+        """Position among the order's jobs: by kind, then enqueue time."""
+        return (KIND_SEQUENCE.get(self.kind, 0), self.created_at)
+
+    def precedes(self, other: "NotificationJob") -> bool:
+        return self.id != other.id and self.order_key == other.order_key and self.sequence < other.sequence
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "NotificationJob":
+        return cls(**json.loads(raw))
+
+
+class DispatchQueue:
+    """Interface implemented by every backend."""
+
+    name = "base"
+    # Whether queued jobs survive a process restart
+    durable = True
+
+    async def put(self, job: NotificationJob, delay: float = 0.0) -> None:
+        raise NotImplementedError
+
+    async def get(
+        self, timeout: float, shop: Optional[str] = None, lane: Optional[str] = None
+    ) -> Optional[NotificationJob]:
+        """
+        Claim the next available job (of one shop and/or lane, if given),
+        waiting up to timeout seconds.
+        """
+        raise NotImplementedError
+
+    async def ack(self, job: NotificationJob) -> None:
+        """Remove a finished job."""
+        raise NotImplementedError
+
+    async def nack(self, job: NotificationJob, delay: float = 0.0) -> None:
+        """Return a claimed job to the queue (with its updated attempt count)."""
+        raise NotImplementedError
+
+    async def requeue_stale(self, visibility_timeout: float) -> int:
+        """Make jobs claimed longer than visibility_timeout ago available again."""
+        return 0
+
+    async def depth(self) -> int:
+        """Number of jobs waiting (not claimed)."""
+        raise NotImplementedError
+
+    async def pending_by_shop(self, lane: Optional[str] = None) -> Dict[str, int]:
+        """Number of jobs available now, per shop (for fair scheduling), optionally of one lane."""
+        raise NotImplementedError
+
+    async def has_predecessor(self, job: NotificationJob) -> bool:
+        """Whether a job of the same order that must go first is still queued or in flight."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    async def readiness(self) -> dict:
+        try:
+            depth = await self.depth()
+        except Exception as e:
+            return {"ok": False, "backend": self.name, "error": str(e)}
+        return {"ok": True, "backend": self.name, "depth": depth}
+
+
+class MemoryDispatchQueue(DispatchQueue):
+    name = "memory"
+    durable = False
+
+    def __init__(self):
+        self._pending: List[tuple] = []  # (available_at, seq, job)
+        self._claimed: Dict[str, tuple] = {}  # job id -> (claimed_at, job)
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+
+    async def put(self, job: NotificationJob, delay: float = 0.0) -> None:
+        self._seq += 1
+        self._pending.append((time.time() + delay, self._seq, job))
+        self._pending.sort(key=lambda entry: entry[:2])
+        self._wakeup.set()
+
+    def _claim(self, now: float, shop: Optional[str], lane: Optional[str]) -> Optional[NotificationJob]:
+        for index, (available_at, _, job) in enumerate(self._pending):
+            if available_at > now:
+                break
+            if (shop is None or job.shop_domain == shop) and (lane is None or job.lane == lane):
+                del self._pending[index]
+                self._claimed[job.id] = (now, job)
+                return job
+        return None
+
+    async def get(
+        self, timeout: float, shop: Optional[str] = None, lane: Optional[str] = None
+    ) -> Optional[NotificationJob]:
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            job = self._claim(now, shop, lane)
+            if job is not None:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            wait = remaining
+            if self._pending:
+                wait = min(wait, max(0.0, self._pending[0][0] - now))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job: NotificationJob) -> None:
+        self._claimed.pop(job.id, None)
+
+    async def nack(self, job: NotificationJob, delay: float = 0.0) -> None:
+        self._claimed.pop(job.id, None)
+        await self.put(job, delay)
+
+    async def requeue_stale(self, visibility_timeout: float) -> int:
+        cutoff = time.time() - visibility_timeout
+        stale = [job for claimed_at, job in self._claimed.values() if claimed_at < cutoff]
+        for job in stale:
+            await self.nack(job)
+        return len(stale)
+
+    async def depth(self) -> int:
+        return len(self._pending)
+
+    async def pending_by_shop(self, lane: Optional[str] = None) -> Dict[str, int]:
+        now = time.time()
+        counts: Dict[str, int] = {}
+        for available_at, _, job in self._pending:
+            if available_at > now:
+                break
+            if lane is not None and job.lane != lane:
+                continue
+            counts[job.shop_domain] = counts.get(job.shop_domain, 0) + 1
+        return counts
+
+    async def has_predecessor(self, job: NotificationJob) -> bool:
+        queued = [entry[2] for entry in self._pending] + [entry[1] for entry in self._claimed.values()]
+        return any(other.precedes(job) for other in queued)
+
+
+class SQLiteDispatchQueue(DispatchQueue):
+    """
+    SQLite-backed queue. Claims take the write lock (BEGIN IMMEDIATE) so a job
+    is handed to exactly one consumer across all processes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, shop TEXT NOT NULL, lane TEXT NOT NULL, order_key TEXT,"
+            " sequence INTEGER NOT NULL, created_at REAL NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, available_at REAL NOT NULL, claimed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_available ON jobs (status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_shop_available ON jobs (status, shop, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_lane_available ON jobs (status, lane, shop, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_order ON jobs (order_key)")
+        self._wakeup = asyncio.Event()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _run(self, sql: str, params: tuple = ()):
+        return asyncio.to_thread(self._execute, sql, params)
+
+    def _claim(self, shop: Optional[str], lane: Optional[str]) -> Optional[str]:
+        now = time.time()
+        sql = "SELECT id, payload FROM jobs WHERE status = 'pending'"
+        params: tuple = ()
+        if lane is not None:
+            sql += " AND lane = ?"
+            params += (lane,)
+        if shop is not None:
+            sql += " AND shop = ?"
+            params += (shop,)
+        sql += " AND available_at <= ?"
+        params += (now,)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(sql + " ORDER BY available_at LIMIT 1", params).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'claimed', claimed_at = ? WHERE id = ?", (now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[1] if row else None
+
+    async def put(self, job: NotificationJob, delay: float = 0.0) -> None:
+        await self._run(
+            "INSERT OR REPLACE INTO jobs"
+            " (id, shop, lane, order_key, sequence, created_at, payload, status, available_at, claimed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, NULL)",
+            (
+                job.id, job.shop_domain, job.lane, job.order_key, job.sequence[0], job.created_at,
+                job.to_json(), time.time() + delay,
+            ),
+        )
+        self._wakeup.set()
+
+    async def get(
+        self, timeout: float, shop: Optional[str] = None, lane: Optional[str] = None
+    ) -> Optional[NotificationJob]:
+        deadline = time.monotonic() + timeout
+        while True:
+            payload = await asyncio.to_thread(self._claim, shop, lane)
+            if payload is not None:
+                return NotificationJob.from_json(payload)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Jobs enqueued by this process wake us immediately; other
+            # processes' jobs are picked up on the next poll
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(POLL_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job: NotificationJob) -> None:
+        await self._run("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def nack(self, job: NotificationJob, delay: float = 0.0) -> None:
+        await self._run(
+            "UPDATE jobs SET status = 'pending', payload = ?, available_at = ?, claimed_at = NULL WHERE id = ?",
+            (job.to_json(), time.time() + delay, job.id),
+        )
+        self._wakeup.set()
+
+    def _requeue_stale(self, cutoff: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'pending', claimed_at = NULL WHERE status = 'claimed' AND claimed_at < ?",
+                (cutoff,),
+            )
+            return cursor.rowcount
+
+    async def requeue_stale(self, visibility_timeout: float) -> int:
+        return await asyncio.to_thread(self._requeue_stale, time.time() - visibility_timeout)
+
+    async def depth(self) -> int:
+        rows = await self._run("SELECT COUNT(*) FROM jobs WHERE status = 'pending'")
+        return rows[0][0]
+
+    async def pending_by_shop(self, lane: Optional[str] = None) -> Dict[str, int]:
+        if lane is None:
+            sql, params = "SELECT shop, COUNT(*) FROM jobs WHERE status = 'pending' AND available_at <= ?", (time.time(),)
+        else:
+            sql = "SELECT shop, COUNT(*) FROM jobs WHERE status = 'pending' AND lane = ? AND available_at <= ?"
+            params = (lane, time.time())
+        rows = await self._run(sql + " GROUP BY shop", params)
+        return dict(rows)
+
+    async def has_predecessor(self, job: NotificationJob) -> bool:
+        if job.order_key is None:
+            return False
+        sequence, created_at = job.sequence
+        rows = await self._run(
+            "SELECT 1 FROM jobs WHERE order_key = ? AND id != ?"
+            " AND (sequence < ? OR (sequence = ? AND created_at < ?)) LIMIT 1",
+            (job.order_key, job.id, sequence, sequence, created_at),
+        )
+        return bool(rows)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisDispatchQueue(DispatchQueue):
+    """
+    Redis-backed queue: per-lane, per-shop sorted sets of pending job IDs
+    scored by availability time, a set per lane of the shops with pending
+    jobs, a hash of payloads and a sorted set of claims scored by claim time.
+    Claims run as a Lua script so they are atomic across consumers; the claim
+    that empties a shop's set also drops the shop from its lane.
+    """
+
+    name = "redis"
+
+    _CLAIM_SCRIPT = """
+    local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+    if #ids > 0 then
+        redis.call('ZREM', KEYS[1], ids[1])
+        redis.call('ZADD', KEYS[2], ARGV[1], ids[1])
+    end
+    if redis.call('ZCARD', KEYS[1]) == 0 then
+        redis.call('SREM', KEYS[4], ARGV[2])
+    end
+    if #ids == 0 then return nil end
+    return redis.call('HGET', KEYS[3], ids[1])
+    """
+
+    def __init__(self, url: str, prefix: str = "smsapp:dispatch:", client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("DISPATCH_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            client = redis_asyncio.from_url(url, decode_responses=True)
+        self._redis = client
+        self._prefix = prefix
+        self._claimed_key = f"{prefix}claimed"
+        self._jobs_key = f"{prefix}jobs"
+        self._claim = self._redis.register_script(self._CLAIM_SCRIPT)
+
+    def _lane_prefix(self, lane: str) -> str:
+        return f"{self._prefix}{lane}:"
+
+    def _shops_key(self, lane: str) -> str:
+        return f"{self._lane_prefix(lane)}shops"
+
+    def _pending_key(self, shop: str, lane: str) -> str:
+        return f"{self._lane_prefix(lane)}pending:{shop}"
+
+    def _order_key(self, job: NotificationJob) -> str:
+        return f"{self._prefix}order:{job.order_key}"
+
+    @staticmethod
+    def _order_score(job: NotificationJob) -> float:
+        sequence, created_at = job.sequence
+        return sequence * ORDER_SCORE_STRIDE + created_at
+
+    def _enqueue(self, pipe, job: NotificationJob, delay: float) -> None:
+        pipe.hset(self._jobs_key, job.id, job.to_json())
+        pipe.sadd(self._shops_key(job.lane), job.shop_domain)
+        pipe.zadd(self._pending_key(job.shop_domain, job.lane), {job.id: time.time() + delay})
+        if job.order_key is not None:
+            # Unfinished jobs of one order, scored by sequence; the TTL cleans up after crashes
+            pipe.zadd(self._order_key(job), {job.id: self._order_score(job)})
+            pipe.expire(self._order_key(job), ORDER_KEY_TTL)
+
+    async def put(self, job: NotificationJob, delay: float = 0.0) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._enqueue(pipe, job, delay)
+            await pipe.execute()
+
+    async def _claim_from(self, shop: str, lane: str) -> Optional[str]:
+        return await self._claim(
+            keys=[self._pending_key(shop, lane), self._claimed_key, self._jobs_key, self._shops_key(lane)],
+            args=[time.time(), shop],
+        )
+
+    async def get(
+        self, timeout: float, shop: Optional[str] = None, lane: Optional[str] = None
+    ) -> Optional[NotificationJob]:
+        deadline = time.monotonic() + timeout
+        while True:
+            for candidate_lane in ([lane] if lane is not None else LANES):
+                if shop is not None:
+                    shops = [shop]
+                else:
+                    shops = await self._redis.smembers(self._shops_key(candidate_lane))
+                for candidate in shops:
+                    payload = await self._claim_from(candidate, candidate_lane)
+                    if payload is not None:
+                        return NotificationJob.from_json(payload)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+    async def ack(self, job: NotificationJob) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._claimed_key, job.id)
+            pipe.hdel(self._jobs_key, job.id)
+            if job.order_key is not None:
+                pipe.zrem(self._order_key(job), job.id)
+            await pipe.execute()
+
+    async def nack(self, job: NotificationJob, delay: float = 0.0) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._claimed_key, job.id)
+            self._enqueue(pipe, job, delay)
+            await pipe.execute()
+
+    async def requeue_stale(self, visibility_timeout: float) -> int:
+        stale = await self._redis.zrangebyscore(self._claimed_key, "-inf", time.time() - visibility_timeout)
+        requeued = 0
+        for job_id in stale:
+            payload = await self._redis.hget(self._jobs_key, job_id)
+            if payload is not None and await self._redis.zrem(self._claimed_key, job_id):
+                job = NotificationJob.from_json(payload)
+                async with self._redis.pipeline(transaction=True) as pipe:
+                    pipe.sadd(self._shops_key(job.lane), job.shop_domain)
+                    pipe.zadd(self._pending_key(job.shop_domain, job.lane), {job_id: time.time()})
+                    await pipe.execute()
+                requeued += 1
+        return requeued
+
+    async def depth(self) -> int:
+        total = 0
+        for lane in LANES:
+            for shop in await self._redis.smembers(self._shops_key(lane)):
+                total += await self._redis.zcard(self._pending_key(shop, lane))
+        return total
+
+    async def pending_by_shop(self, lane: Optional[str] = None) -> Dict[str, int]:
+        now = time.time()
+        counts: Dict[str, int] = {}
+        for candidate_lane in ([lane] if lane is not None else LANES):
+            for shop in await self._redis.smembers(self._shops_key(candidate_lane)):
+                count = await self._redis.zcount(self._pending_key(shop, candidate_lane), "-inf", now)
+                if count:
+                    counts[shop] = counts.get(shop, 0) + count
+        return counts
+
+    async def has_predecessor(self, job: NotificationJob) -> bool:
+        if job.order_key is None:
+            return False
+        return await self._redis.zcount(self._order_key(job), "-inf", f"({self._order_score(job)}") > 0
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_dispatch_queue() -> DispatchQueue:
+    """Build the backend selected by DISPATCH_BACKEND."""
+    config = get_config()
+    backend = config.dispatch_backend.lower()
+    if backend == "memory":
+        return MemoryDispatchQueue()
+    if backend == "sqlite":
+        return SQLiteDispatchQueue(Path(config.dispatch_sqlite_path) if config.dispatch_sqlite_path else DEFAULT_SQLITE_PATH)
+    if backend == "redis":
+        return RedisDispatchQueue(config.dispatch_redis_url)
+    raise ValueError(f"Unknown DISPATCH_BACKEND: {config.dispatch_backend}")
+
+
+_queue: Optional[DispatchQueue] = None
+
+
+def get_dispatch_queue() -> DispatchQueue:
+    """Return the process-wide queue, creating it on first use."""
+    global _queue
+    if _queue is None:
+        _queue = create_dispatch_queue()
+        logger.info(f"Using {_queue.name} dispatch queue")
+    return _queue
+
+
+def set_dispatch_queue(queue: Optional[DispatchQueue]) -> None:
+    """Replace the process-wide queue (e.g. with MemoryDispatchQueue in tests)."""
+    global _queue
+    _queue = queue
+
+
+async def close_dispatch_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.close()
+        _queue = None
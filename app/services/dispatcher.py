@@ -0,0 +1,453 @@
+"""
+Consumes notification jobs from the dispatch queue and sends them via Termii.
+
+A Dispatcher runs a fixed number of consumer tasks per lane. Each claims a
+job, renders the shop's template, formats the phone number and sends the
+SMS, then acknowledges the job. Transactional SMS (order notifications) go
+out on the DND route and promotional SMS on the generic route; each lane
+has its own consumers and send rate, and promotional consumers stand back
+whenever transactional jobs are waiting, so a campaign never delays an
+order confirmation. Within a lane, backed-up jobs are claimed shop by shop
+in deficit round robin order (DISPATCH_SHOP_WEIGHTS), so one shop's burst
+cannot hold up every other shop's notifications. A fulfillment SMS whose
+order still has a confirmation in the queue is put back until the
+confirmation has gone out (for at most DISPATCH_ORDER_WAIT), so customers
+never get "shipped" before "confirmed". Failed sends are retried with
+exponential backoff up to DISPATCH_MAX_ATTEMPTS. If the shop's fallback
+policy lists more channels (e.g. WhatsApp, then voice), a message Termii
+rejects, runs out of retries on, or whose delivery report fails or doesn't
+arrive in time is sent again on the next channel; delivery reports are
+checked by delayed queue entries, never by a consumer waiting. On stop,
+consumers finish the job in hand (up to the drain timeout); jobs still in
+flight after that are returned to the queue for another dispatcher.
+
+Runs inside the web process (DISPATCH_MODE=inline) or in its own process
+via `python -m app.worker`.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from app.config import get_config
+from app.models.templates import get_templates, render_template
+from app.services.dispatch_queue import (
+    PROMOTIONAL,
+    TRANSACTIONAL,
+    DispatchQueue,
+    NotificationJob,
+    get_dispatch_queue,
+)
+from app.services.fair_scheduler import DeficitRoundRobin
+from app.services.channel_fallback import (
+    DELIVERED,
+    FAILED,
+    channel_chain,
+    expect_receipt,
+    get_receipt,
+    get_shop_policy,
+    next_channel,
+)
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.termii import MessageRejectedError, get_shop_credentials, get_termii_service
+from app.services.token_bucket import TokenBucket
+from app.utils.metrics import registry
+from app.utils.phone_formatter import format_phone_for_termii
+from app.utils.request_context import correlation_id_var
+
+logger = logging.getLogger(__name__)
+
+JOBS_METRIC = "dispatch_jobs_total"
+
+# Retry delay is RETRY_BASE_DELAY * 2^(attempts - 1), capped at RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 300.0
+
+# How long an idle consumer blocks on the queue before re-checking for stop
+GET_TIMEOUT = 1.0
+
+# Per-shop backlog is re-read at most this often (seconds), and at least this
+# often while the scheduler still has shops to serve
+BACKLOG_MIN_INTERVAL = 0.1
+BACKLOG_MAX_INTERVAL = 1.0
+
+# Seconds before a job waiting on an earlier notification of its order is re-checked
+ORDER_RECHECK_DELAY = 0.5
+
+# Seconds between checks for the delivery report of a message that may need a fallback channel
+RECEIPT_POLL_INTERVAL = 10.0
+
+# Priority of a lane's sends when they wait for the Termii account's concurrency limit
+LANE_PRIORITY = {TRANSACTIONAL: 1, PROMOTIONAL: 0}
+
+
+class DispatchLane:
+    """Consumers, fair scheduler and send rate of one lane."""
+
+    def __init__(self, name: str, concurrency: int, weights: Dict[str, float]):
+        self.name = name
+        self.concurrency = concurrency
+        self.scheduler = DeficitRoundRobin(weights)
+        self.backlog_read_at = 0.0
+        self.backlog_lock: Optional[asyncio.Lock] = None
+        self.bucket: Optional[TokenBucket] = None
+        self.shop_depths: Dict[str, int] = {}
+        self.in_flight = registry.gauge("dispatch_in_flight", {"lane": name})
+
+    def rate(self, config) -> float:
+        return config.dispatch_transactional_rate if self.name == TRANSACTIONAL else config.dispatch_promotional_rate
+
+    def channel(self, config) -> str:
+        return config.termii_transactional_channel if self.name == TRANSACTIONAL else config.termii_promotional_channel
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        queue: Optional[DispatchQueue] = None,
+        concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        visibility_timeout: Optional[float] = None,
+        promotional_concurrency: Optional[int] = None,
+    ):
+        """
+        Args:
+            queue: Queue to consume (defaults to the process-wide queue)
+            concurrency: Number of transactional jobs sent in parallel
+            max_attempts: Sends attempted per job before giving up
+            visibility_timeout: Seconds after which another dispatcher's
+                unacknowledged job is redelivered
+            promotional_concurrency: Number of promotional jobs sent in parallel
+        """
+        config = get_config()
+        self._configured_queue = queue
+        self.queue: Optional[DispatchQueue] = None
+        self.concurrency = concurrency or config.dispatch_concurrency
+        if promotional_concurrency is None:
+            promotional_concurrency = config.dispatch_promotional_concurrency
+        self.max_attempts = max_attempts or config.dispatch_max_attempts
+        self.visibility_timeout = visibility_timeout or config.dispatch_visibility_timeout
+        self._stopping: Optional[asyncio.Event] = None
+        self._consumers: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self.lanes: Dict[str, DispatchLane] = {
+            TRANSACTIONAL: DispatchLane(TRANSACTIONAL, self.concurrency, config.shop_weights),
+            PROMOTIONAL: DispatchLane(PROMOTIONAL, promotional_concurrency, config.shop_weights),
+        }
+
+    async def start(self) -> None:
+        # Resolved on every start: the process-wide queue is recreated after
+        # close_dispatch_queue(), and each lifespan may run on a new event loop
+        self.queue = self._configured_queue or get_dispatch_queue()
+        self._stopping = asyncio.Event()
+        config = get_config()
+        self._consumers = []
+        for lane in self.lanes.values():
+            lane.backlog_lock = asyncio.Lock()
+            lane.bucket = TokenBucket(lane.rate(config))
+            self._consumers += [asyncio.create_task(self._consume(lane, index)) for index in range(lane.concurrency)]
+        self._maintenance = asyncio.create_task(self._maintain())
+        logger.info(
+            f"Dispatcher started with {self.concurrency} transactional and "
+            f"{self.lanes[PROMOTIONAL].concurrency} promotional consumers on the {self.queue.name} queue"
+        )
+
+    async def stop(self, drain_timeout: Optional[float] = None) -> None:
+        """
+        Stop claiming jobs and wait up to drain_timeout (SHUTDOWN_DRAIN_TIMEOUT)
+        for jobs in flight; unfinished jobs go back to the queue. A
+        non-durable queue is emptied first, since its jobs die with the process.
+        """
+        if not self._consumers:
+            return
+        if drain_timeout is None:
+            drain_timeout = get_config().shutdown_drain_timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+
+        if not self.queue.durable:
+            while await self.queue.depth() and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+
+        self._stopping.set()
+        _, pending = await asyncio.wait(self._consumers, timeout=max(0.0, deadline - loop.time()))
+        if pending:
+            logger.warning(f"Drain timed out; returning {len(pending)} in-flight jobs to the queue")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._maintenance.cancel()
+        await asyncio.gather(self._maintenance, return_exceptions=True)
+        self._consumers = []
+        self._maintenance = None
+
+        if not self.queue.durable:
+            lost = await self.queue.depth()
+            if lost:
+                logger.error(f"Dropping {lost} queued SMS: the {self.queue.name} dispatch queue does not survive restarts")
+                registry.counter(JOBS_METRIC, {"kind": "all", "outcome": "dropped"}).inc(lost)
+        logger.info("Dispatcher stopped")
+
+    async def _maintain(self) -> None:
+        """Redeliver jobs abandoned by dead dispatchers and publish the queue depth."""
+        depth_gauge = registry.gauge("dispatch_queue_depth")
+        interval = max(1.0, min(self.visibility_timeout / 4, 15.0))
+        while True:
+            try:
+                requeued = await self.queue.requeue_stale(self.visibility_timeout)
+                if requeued:
+                    logger.warning(f"Requeued {requeued} jobs whose dispatcher stopped responding")
+                    registry.counter("dispatch_jobs_requeued_total").inc(requeued)
+                depth_gauge.set(await self.queue.depth())
+            except Exception as e:
+                logger.error(f"Dispatch queue maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def _refresh_backlog(self, lane: DispatchLane) -> None:
+        """Re-read the lane's per-shop backlog into its scheduler and the depth gauges."""
+        age = time.monotonic() - lane.backlog_read_at
+        if age < BACKLOG_MIN_INTERVAL or (age < BACKLOG_MAX_INTERVAL and lane.scheduler.backlog):
+            return
+        if lane.backlog_lock.locked():
+            # Another consumer is already reading it
+            return
+        async with lane.backlog_lock:
+            backlog = await self.queue.pending_by_shop(lane=lane.name)
+            lane.backlog_read_at = time.monotonic()
+            config = get_config()
+            lane.scheduler.weights = config.shop_weights
+            lane.bucket.configure(lane.rate(config))
+            lane.scheduler.update_backlog(backlog)
+            for shop, depth in backlog.items():
+                registry.gauge("dispatch_shop_queue_depth", {"shop": shop, "lane": lane.name}).set(depth)
+            # Drained shops drop their series instead of leaving a 0 behind for every shop ever seen
+            for shop in set(lane.shop_depths) - set(backlog):
+                registry.remove("dispatch_shop_queue_depth", {"shop": shop, "lane": lane.name})
+            lane.shop_depths = backlog
+
+    async def _transactional_waiting(self) -> bool:
+        """Whether transactional jobs are available but not yet claimed."""
+        lane = self.lanes[TRANSACTIONAL]
+        await self._refresh_backlog(lane)
+        return bool(lane.scheduler.backlog)
+
+    async def _next_job(self, lane: DispatchLane) -> Optional[NotificationJob]:
+        await self._refresh_backlog(lane)
+        shop = lane.scheduler.next()
+        if shop is None:
+            # No backlog: take whatever arrives first
+            return await self.queue.get(timeout=GET_TIMEOUT, lane=lane.name)
+        job = await self.queue.get(timeout=0, shop=shop, lane=lane.name)
+        if job is None:
+            # Claimed by another dispatcher since the backlog was read
+            lane.scheduler.discard(shop)
+        return job
+
+    async def _consume(self, lane: DispatchLane, index: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                if lane.name != TRANSACTIONAL and await self._transactional_waiting():
+                    # Strict priority: promotional consumers stand back while
+                    # transactional SMS are waiting to be claimed
+                    await asyncio.sleep(BACKLOG_MIN_INTERVAL)
+                    continue
+                job = await self._next_job(lane)
+            except Exception as e:
+                logger.error(f"Dispatcher {lane.name} {index} failed to read the queue: {e}")
+                await asyncio.sleep(GET_TIMEOUT)
+                continue
+            if job is None:
+                continue
+            lane.in_flight.inc()
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                # Drain timed out mid-send: hand the job back so it isn't lost
+                # (at-least-once: the SMS may be sent again)
+                await asyncio.shield(self.queue.nack(job))
+                raise
+            finally:
+                lane.in_flight.dec()
+
+    async def _process(self, job: NotificationJob) -> None:
+        token = correlation_id_var.set(job.correlation_id)
+        try:
+            await self._send(job)
+        finally:
+            correlation_id_var.reset(token)
+
+    async def _defer_for_predecessor(self, job: NotificationJob) -> bool:
+        """
+        Put the job back if an earlier notification of the same order is still
+        queued or being sent. Returns True if it was deferred.
+        """
+        if job.order_key is None or not await self.queue.has_predecessor(job):
+            return False
+        now = time.time()
+        if job.deferred_since is None:
+            job.deferred_since = now
+        elif now - job.deferred_since >= get_config().dispatch_order_wait:
+            logger.warning(
+                f"Sending {job.kind} SMS for order {job.order_id} on {job.shop_domain} after waiting "
+                f"{now - job.deferred_since:.0f}s for an earlier notification of the order"
+            )
+            registry.counter("dispatch_order_wait_expired_total", {"kind": job.kind}).inc()
+            return False
+        registry.counter("dispatch_order_deferrals_total", {"kind": job.kind}).inc()
+        # Not a send attempt, so the attempt count is left alone
+        await self.queue.nack(job, delay=ORDER_RECHECK_DELAY)
+        return True
+
+    async def _send(self, job: NotificationJob) -> None:
+        if job.receipt_id is not None:
+            await self._check_receipt(job)
+            return
+        if await self._defer_for_predecessor(job):
+            return
+        try:
+            formatted_phone = format_phone_for_termii(job.phone)
+        except ValueError as e:
+            logger.warning(f"Dropping {job.kind} SMS for order {job.order_id} on {job.shop_domain}: {e}")
+            await self._finish(job, "invalid")
+            return
+
+        lane = self.lanes.get(job.lane, self.lanes[TRANSACTIONAL])
+        # Per-lane send rate (DISPATCH_*_RATE)
+        await lane.bucket.acquire()
+
+        policy = await get_shop_policy(job.shop_domain)
+        chain = channel_chain(lane.channel(get_config()), policy)
+        channel = job.channel or chain[0]
+        fallback = next_channel(chain, channel)
+
+        job.attempts += 1
+        try:
+            # The shop's own Termii account, or the global one
+            credentials = await get_shop_credentials(job.shop_domain)
+
+            templates = get_templates(job.shop_domain)
+            message = render_template(getattr(templates, job.kind), job.context)
+            logger.info(f"SMS message: {message[:100]}...")
+
+            sender_id = credentials.sender_id
+            if channel == "whatsapp" and policy.whatsapp_sender:
+                sender_id = policy.whatsapp_sender
+
+            termii_service = get_termii_service(credentials.api_key)
+            result = await termii_service.send_sms(
+                to=formatted_phone,
+                message=message,
+                sender_id=sender_id,
+                channel=channel,
+                message_type="voice" if channel == "voice" else "plain",
+                priority=LANE_PRIORITY[lane.name]
+            )
+        except Exception as e:
+            if fallback and (isinstance(e, MessageRejectedError) or job.attempts >= self.max_attempts):
+                await self._fall_back(job, channel, fallback, str(e))
+                return
+            if isinstance(e, MessageRejectedError):
+                # Permanent: resending the same message on the same channel won't help
+                logger.error(
+                    f"Termii rejected {job.kind} SMS for order {job.order_id} on {job.shop_domain} ({channel}), "
+                    f"not retrying: {e}"
+                )
+                await self._finish(job, "failed")
+                return
+            await self._retry_or_fail(job, e)
+            return
+
+        logger.info(f"{job.kind} SMS sent to {formatted_phone} on {channel} for order {job.order_id}. Response: {result}")
+        registry.histogram("dispatch_latency_ms", {"kind": job.kind}).observe((time.time() - job.created_at) * 1000)
+        message_id = result.get("message_id") or result.get("message_id_str")
+        if fallback and policy.receipt_timeout > 0 and message_id:
+            await self._await_receipt(job, channel, str(message_id), policy.receipt_timeout)
+            return
+        self._delivered(job, channel)
+        await self._finish(job, "sent")
+
+    async def _await_receipt(self, job: NotificationJob, channel: str, message_id: str, timeout: float) -> None:
+        """
+        Schedule checks of a sent message's delivery report, so the next
+        channel can be tried if it fails or doesn't arrive within timeout.
+        """
+        try:
+            await expect_receipt(message_id, job.shop_domain, timeout)
+            # A separate job, so the order's later notifications needn't wait for the report
+            await self.queue.put(
+                replace(job, id=uuid.uuid4().hex, attempts=0, channel=channel, receipt_id=message_id, sent_at=time.time()),
+                delay=min(RECEIPT_POLL_INTERVAL, timeout)
+            )
+        except Exception as e:
+            logger.error(f"Not waiting for the delivery report of {job.kind} SMS for order {job.order_id}: {e}")
+            self._delivered(job, channel)
+        await self._finish(job, "sent")
+
+    async def _check_receipt(self, job: NotificationJob) -> None:
+        try:
+            status = await get_receipt(job.receipt_id)
+        except Exception as e:
+            logger.error(f"Failed to read the delivery report of message {job.receipt_id}: {e}")
+            await self.queue.nack(job, delay=RECEIPT_POLL_INTERVAL)
+            return
+        if status == DELIVERED:
+            self._delivered(job, job.channel)
+            await self.queue.ack(job)
+            return
+
+        policy = await get_shop_policy(job.shop_domain)
+        waited = time.time() - job.sent_at
+        if status != FAILED and waited < policy.receipt_timeout:
+            await self.queue.nack(job, delay=min(RECEIPT_POLL_INTERVAL, policy.receipt_timeout - waited))
+            return
+
+        lane = self.lanes.get(job.lane, self.lanes[TRANSACTIONAL])
+        fallback = next_channel(channel_chain(lane.channel(get_config()), policy), job.channel)
+        reason = "delivery failed" if status == FAILED else f"no delivery report within {policy.receipt_timeout:.0f}s"
+        registry.counter("dispatch_receipts_total", {"channel": job.channel, "status": status if status == FAILED else "timeout"}).inc()
+        if fallback is None:
+            logger.warning(f"{job.kind} SMS for order {job.order_id} on {job.channel}: {reason}; no channel left to try")
+            await self.queue.ack(job)
+            return
+        await self._fall_back(job, job.channel, fallback, reason)
+
+    async def _fall_back(self, job: NotificationJob, channel: str, fallback: str, reason: str) -> None:
+        """Send the job again on the next channel of its shop's fallback policy."""
+        logger.warning(f"Trying {fallback} for {job.kind} SMS for order {job.order_id} on {job.shop_domain} ({channel}: {reason})")
+        registry.counter("dispatch_fallbacks_total", {"kind": job.kind, "from": channel, "to": fallback}).inc()
+        job.channel = fallback
+        job.attempts = 0
+        job.receipt_id = None
+        job.sent_at = None
+        await self.queue.nack(job)
+
+    def _delivered(self, job: NotificationJob, channel: str) -> None:
+        """Record the channel that got the notification through."""
+        if job.receipt_id is not None:
+            logger.info(f"{job.kind} SMS for order {job.order_id} on {job.shop_domain} delivered via {channel}")
+        registry.counter("dispatch_channel_success_total", {"kind": job.kind, "channel": channel}).inc()
+
+    async def _retry_or_fail(self, job: NotificationJob, error: Exception) -> None:
+        if job.attempts >= self.max_attempts:
+            logger.error(
+                f"Giving up on {job.kind} SMS for order {job.order_id} on {job.shop_domain} "
+                f"after {job.attempts} attempts: {error}"
+            )
+            await self._finish(job, "failed")
+            return
+        delay = min(RETRY_BASE_DELAY * 2 ** (job.attempts - 1), RETRY_MAX_DELAY)
+        if isinstance(error, CircuitOpenError):
+            # No point retrying before the account's breaker lets a trial through
+            delay = max(delay, error.retry_after)
+        logger.warning(
+            f"Error sending {job.kind} SMS for order {job.order_id} (attempt {job.attempts}/{self.max_attempts}), "
+            f"retrying in {delay:.0f}s: {error}"
+        )
+        registry.counter(JOBS_METRIC, {"kind": job.kind, "outcome": "retried"}).inc()
+        await self.queue.nack(job, delay=delay)
+
+    async def _finish(self, job: NotificationJob, outcome: str) -> None:
+        registry.counter(JOBS_METRIC, {"kind": job.kind, "outcome": outcome}).inc()
+        await self.queue.ack(job)
@@ -0,0 +1,68 @@
+"""
+Deficit round robin (DRR) over per-shop backlogs.
+
+The dispatcher asks the scheduler which shop to serve next and then claims
+one of that shop's jobs. Shops with a backlog take turns; on each turn a
+shop's deficit grows by its weight and it is served while the deficit
+covers a job (each SMS costs 1). With equal weights, a shop importing 20k
+orders gets one send per round like everyone else, so another shop's
+confirmation waits behind at most one job per active shop, not behind the
+whole burst. A weight of 2 gives a shop twice the share; 0.5 half.
+"""
+from collections import deque
+from typing import Deque, Dict, Mapping, Optional
+
+# Smallest accepted weight; keeps every shop with a backlog moving
+MIN_WEIGHT = 0.01
+
+
+class DeficitRoundRobin:
+    def __init__(self, weights: Optional[Mapping[str, float]] = None, default_weight: float = 1.0):
+        self.weights: Mapping[str, float] = weights or {}
+        self.default_weight = default_weight
+        self.backlog: Dict[str, int] = {}
+        self._active: Deque[str] = deque()
+        self._deficit: Dict[str, float] = {}
+
+    def weight(self, shop: str) -> float:
+        return max(self.weights.get(shop.lower(), self.default_weight), MIN_WEIGHT)
+
+    def update_backlog(self, backlog: Mapping[str, int]) -> None:
+        """Replace the known backlog (jobs available now, per shop)."""
+        self.backlog = {shop: count for shop, count in backlog.items() if count > 0}
+        for shop in list(self._active):
+            if shop not in self.backlog:
+                self._remove(shop)
+        for shop in self.backlog:
+            if shop not in self._deficit:
+                # New shops join at the back of the round
+                self._active.append(shop)
+                self._deficit[shop] = 0.0
+
+    def _remove(self, shop: str) -> None:
+        self._active.remove(shop)
+        # DRR resets the deficit of a shop whose queue empties, so idle
+        # shops cannot bank credit for a later burst
+        del self._deficit[shop]
+        self.backlog.pop(shop, None)
+
+    def discard(self, shop: str) -> None:
+        """Forget a shop whose backlog turned out to be empty (e.g. claimed by another process)."""
+        if shop in self._deficit:
+            self._remove(shop)
+
+    def next(self) -> Optional[str]:
+        """Pick the shop to serve next, or None if no shop has a backlog."""
+        while self._active:
+            shop = self._active[0]
+            if self._deficit[shop] >= 1:
+                self._deficit[shop] -= 1
+                self.backlog[shop] -= 1
+                if self.backlog[shop] <= 0:
+                    self._remove(shop)
+                return shop
+            # Turn over: move to the back and start the next shop's turn
+            self._active.rotate(-1)
+            upcoming = self._active[0]
+            self._deficit[upcoming] += self.weight(upcoming)
+        return None
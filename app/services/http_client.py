@@ -0,0 +1,121 @@
+"""
+Outbound HTTP client factory with connection-level timing.
+
+Clients created here attach an httpcore "trace" extension to every request
+and record per-phase durations into the metrics registry, labelled by host:
+
+- pool_wait: request hook to the first transport event (waiting for a pooled
+  connection or a free slot)
+- connect: TCP connect, including DNS resolution (httpcore resolves inside
+  connect_tcp, so the two cannot be separated)
+- tls: TLS handshake
+- ttfb: request headers sent to response headers received
+- body_read: reading the response body
+- total: request hook to response closed
+
+Services that call the same host repeatedly use get_shared_client() so
+connections are pooled across calls; shared clients are closed by
+close_shared_clients() at shutdown.
+"""
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PHASE_METRIC = "http_client_phase_ms"
+CONNECTIONS_METRIC = "http_client_connections_total"
+
+# Phase name -> (start event, end event), matched on the event name without
+# its httpcore prefix ("connection.", "http11.", "http2.")
+_SPAN_PHASES = {
+    "connect": ("connect_tcp.started", "connect_tcp.complete"),
+    "tls": ("start_tls.started", "start_tls.complete"),
+    "ttfb": ("send_request_headers.started", "receive_response_headers.complete"),
+    "body_read": ("receive_response_body.started", "receive_response_body.complete"),
+}
+
+
+class RequestTrace:
+    """httpcore trace callback that timestamps connection events for one request."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.started = time.perf_counter()
+        self.first_event: Optional[float] = None
+        self.events: Dict[str, float] = {}
+        self.finished = False
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        if self.first_event is None:
+            self.first_event = now
+        event = event_name.split(".", 1)[1] if "." in event_name else event_name
+        self.events.setdefault(event, now)
+
+        if event == "response_closed.complete" or event.endswith(".failed"):
+            self.finish(now)
+
+    def phases(self, finished_at: float) -> Dict[str, float]:
+        phases: Dict[str, float] = {}
+        if self.first_event is not None:
+            phases["pool_wait"] = (self.first_event - self.started) * 1000
+        for phase, (start_event, end_event) in _SPAN_PHASES.items():
+            if start_event in self.events and end_event in self.events:
+                phases[phase] = (self.events[end_event] - self.events[start_event]) * 1000
+        phases["total"] = (finished_at - self.started) * 1000
+        return phases
+
+    def finish(self, finished_at: Optional[float] = None) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        finished_at = finished_at or time.perf_counter()
+
+        for phase, duration in self.phases(finished_at).items():
+            registry.histogram(PHASE_METRIC, {"host": self.host, "phase": phase}).observe(duration)
+
+        reused = "false" if "connect_tcp.started" in self.events else "true"
+        registry.counter(CONNECTIONS_METRIC, {"host": self.host, "reused": reused}).inc()
+        if any(event.endswith(".failed") for event in self.events):
+            registry.counter("http_client_errors_total", {"host": self.host}).inc()
+
+
+async def _attach_trace(request: httpx.Request) -> None:
+    request.extensions["trace"] = RequestTrace(request.url.host)
+
+
+def create_client(timeout: float = 10.0, **kwargs: Any) -> httpx.AsyncClient:
+    """Create an AsyncClient whose requests are traced into the metrics registry."""
+    event_hooks = kwargs.pop("event_hooks", {}) or {}
+    event_hooks = {
+        "request": [_attach_trace, *event_hooks.get("request", [])],
+        "response": list(event_hooks.get("response", [])),
+    }
+    return httpx.AsyncClient(timeout=timeout, event_hooks=event_hooks, **kwargs)
+
+
+_shared_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_shared_client(name: str, timeout: float = 10.0, **kwargs: Any) -> httpx.AsyncClient:
+    """Return the process-wide pooled client for `name`, creating it on first use."""
+    client = _shared_clients.get(name)
+    if client is None or client.is_closed:
+        client = _shared_clients[name] = create_client(timeout=timeout, **kwargs)
+    return client
+
+
+async def close_shared_clients() -> None:
+    """Close every shared client (after in-flight calls have finished)."""
+    clients = list(_shared_clients.values())
+    _shared_clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client: {e}")
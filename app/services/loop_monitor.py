@@ -0,0 +1,107 @@
+"""
+Event loop lag monitor.
+
+A background task sleeps for a fixed interval and records how late it was
+woken up (the scheduling lag) into a histogram. A watchdog thread notices
+when that task stops reporting - i.e. the loop is blocked by synchronous
+work - and logs the stack of whatever is running on the loop thread.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LAG_METRIC = "event_loop_lag_ms"
+STALL_METRIC = "event_loop_stalls_total"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.25, threshold: float = 0.25):
+        """
+        Args:
+            interval: Seconds between lag measurements
+            threshold: Lag in seconds above which the loop is considered blocked
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    async def _measure(self) -> None:
+        histogram = registry.histogram(LAG_METRIC)
+        gauge = registry.gauge("event_loop_lag_last_ms")
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            histogram.observe(lag * 1000)
+            gauge.set(round(lag * 1000, 3))
+            if lag > self.threshold:
+                logger.warning(f"Event loop lag {lag * 1000:.0f}ms exceeded {self.threshold * 1000:.0f}ms")
+
+    def _watch(self) -> None:
+        reported_heartbeat = None
+        while not self._stopping.wait(self.threshold / 2):
+            stalled_for = time.monotonic() - self._heartbeat - self.interval
+            if stalled_for <= self.threshold or reported_heartbeat == self._heartbeat:
+                continue
+            # Report each stall once, while it is still in progress
+            reported_heartbeat = self._heartbeat
+            registry.counter(STALL_METRIC).inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(no frame)"
+            logger.warning(
+                f"Event loop blocked for {stalled_for * 1000:.0f}ms; loop thread stack:\n{stack}"
+            )
+
+    def start(self) -> None:
+        """Start monitoring the running event loop (call from the loop thread)."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started (interval={self.interval}s, threshold={self.threshold}s)")
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    def readiness(self) -> dict:
+        """Readiness check: fails while the measured lag is above the threshold."""
+        stalled_for = max(0.0, time.monotonic() - self._heartbeat - self.interval)
+        current_lag = max(self.last_lag, stalled_for)
+        return {
+            "ok": self._task is not None and current_lag <= self.threshold,
+            "lag_ms": round(current_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000, 1),
+        }
@@ -0,0 +1,103 @@
+"""
+tracemalloc-based memory diagnostics.
+
+A baseline snapshot is taken on demand; later calls diff the current heap
+against it and report the allocation sites that grew the most.
+"""
+import logging
+import os
+import tracemalloc
+from typing import List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+TRACEBACK_FRAMES = 10
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+# Ignore allocations made by tracemalloc itself and by the import system
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def is_tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def has_baseline() -> bool:
+    return _baseline is not None
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def take_baseline() -> None:
+    """Start tracing if needed and record the current heap as the baseline."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_FRAMES)
+        logger.info(f"tracemalloc started with {TRACEBACK_FRAMES} frames")
+    _baseline = _take_snapshot()
+
+
+def stop_tracing() -> None:
+    """Stop tracing and drop the baseline (tracing has a CPU and memory cost)."""
+    global _baseline
+    _baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("tracemalloc stopped")
+
+
+def diff_against_baseline(limit: int = 25, group_by: str = "lineno") -> List[dict]:
+    """
+    Top allocation sites by growth since the baseline.
+
+    Args:
+        limit: Number of sites to return
+        group_by: "lineno", "filename" or "traceback"
+    """
+    if _baseline is None:
+        raise ValueError("No baseline snapshot. Take a baseline first.")
+
+    stats = _take_snapshot().compare_to(_baseline, group_by)
+    top = []
+    for stat in stats[:limit]:
+        top.append({
+            "site": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            "size_kb": round(stat.size / 1024, 1),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        })
+    return top
+
+
+def traced_memory() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    return {"current_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1)}
+
+
+def process_rss_kb() -> dict:
+    """Current resident set size (Linux) and peak RSS of this process."""
+    current_kb: Optional[int] = None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        current_kb = resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return {
+        "rss_kb": current_kb,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+    }
@@ -0,0 +1,101 @@
+"""
+Low-overhead sampling CPU profiler for the running event loop.
+
+A helper thread periodically captures the event loop thread's Python stack
+via sys._current_frames() and counts identical stacks. Results can be
+exported as collapsed stacks (flamegraph.pl / speedscope input) or as a
+speedscope JSON document.
+"""
+import collections
+import logging
+import sys
+import threading
+import time
+from typing import Counter, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (function name, file name, line number of the function definition)
+Frame = Tuple[str, str, int]
+Stack = Tuple[Frame, ...]
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[Stack] = collections.Counter()
+        self.sample_count = 0
+        self.duration = 0.0
+
+    def _capture(self) -> Stack:
+        frame = sys._current_frames().get(self.thread_id)
+        stack: List[Frame] = []
+        while frame is not None:
+            code = frame.f_code
+            # co_qualname is new in Python 3.11
+            stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def run(self, seconds: float) -> None:
+        """Sample the target thread for the given duration (blocking; run in a worker thread)."""
+        if self.thread_id == threading.get_ident():
+            raise RuntimeError("Profiler cannot sample its own thread")
+
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            stack = self._capture()
+            if stack:
+                self.samples[stack] += 1
+                self.sample_count += 1
+            time.sleep(self.interval)
+        self.duration = time.perf_counter() - started
+        logger.info(f"Profiler collected {self.sample_count} samples over {self.duration:.1f}s")
+
+    def to_collapsed(self) -> str:
+        """Collapsed stack format: 'frame;frame;frame count' per line."""
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self, name: str = "event loop") -> dict:
+        """Speedscope 'sampled' profile document."""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[dict] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        interval_ms = self.interval * 1000
+
+        for stack, count in self.samples.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indices.append(frame_index[frame])
+            samples.append(indices)
+            weights.append(count * interval_ms)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "shopify-ng-sms-sender",
+        }
@@ -0,0 +1,39 @@
+"""
+Readiness checks for the /ready endpoint.
+
+Components register a named check that returns a dict with at least an
+"ok" key. Checks may be plain functions or coroutines.
+"""
+import inspect
+import logging
+from typing import Awaitable, Callable, Dict, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ReadinessCheck = Callable[[], Union[dict, Awaitable[dict]]]
+
+_checks: Dict[str, ReadinessCheck] = {}
+
+
+def register_check(name: str, check: ReadinessCheck) -> None:
+    """Register (or replace) a named readiness check."""
+    _checks[name] = check
+
+
+def unregister_check(name: str) -> None:
+    _checks.pop(name, None)
+
+
+async def run_checks() -> Tuple[bool, Dict[str, dict]]:
+    """Run every registered check. Returns (all_ok, results_by_name)."""
+    results: Dict[str, dict] = {}
+    for name, check in list(_checks.items()):
+        try:
+            result = check()
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            logger.error(f"Readiness check '{name}' failed: {e}", exc_info=True)
+            result = {"ok": False, "error": str(e)}
+        results[name] = result
+    return all(result.get("ok", False) for result in results.values()), results
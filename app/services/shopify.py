@@ -1,37 +1,43 @@
 import os
 import logging
-from typing import Optional, Dict
+from typing import Optional, List
 import httpx
-from dotenv import load_dotenv
+from app.services.http_client import get_shared_client
+from app.services.state_store import get_state_store
+from app.utils.request_context import outbound_headers, timed_phase
 
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
-# In-memory storage for OAuth tokens per shop
+# OAuth tokens per shop, kept in the shared state store
 # Format: {shop_domain: access_token}
-_shop_tokens: Dict[str, str] = {}
+SHOP_TOKEN_NAMESPACE = "shop_token"
 
 
-def get_shop_token(shop_domain: str) -> Optional[str]:
+async def get_shop_token(shop_domain: str) -> Optional[str]:
     """Get OAuth access token for a specific shop."""
-    return _shop_tokens.get(shop_domain)
+    return await get_state_store().get(SHOP_TOKEN_NAMESPACE, shop_domain)
 
 
-def save_shop_token(shop_domain: str, access_token: str) -> None:
+async def save_shop_token(shop_domain: str, access_token: str) -> None:
     """Save OAuth access token for a specific shop."""
-    _shop_tokens[shop_domain] = access_token
+    await get_state_store().set(SHOP_TOKEN_NAMESPACE, shop_domain, access_token)
 
 
 class ShopifyService:
-    def __init__(self, shop_domain: str):
+    def __init__(self, shop_domain: str, access_token: Optional[str]):
         self.shop_domain = shop_domain
-        self.access_token = get_shop_token(shop_domain)
+        self.access_token = access_token
         
         if not self.access_token:
             raise ValueError(f"No access token found for shop: {shop_domain}")
     
+    @classmethod
+    async def for_shop(cls, shop_domain: str) -> "ShopifyService":
+        """Create a service using the shop's stored access token."""
+        return cls(shop_domain, await get_shop_token(shop_domain))
+    
     async def get_order(self, order_id: str) -> dict:
         """
         Fetch order details from Shopify.
@@ -47,18 +53,51 @@ class ShopifyService:
         
         headers = {
             "X-Shopify-Access-Token": self.access_token,
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            **outbound_headers()
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            client = get_shared_client("shopify")
+            with timed_phase("shopify"):
                 response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response.json()["order"]
+            response.raise_for_status()
+            return response.json()["order"]
         except httpx.HTTPStatusError as e:
             logger.error(f"Shopify API error fetching order {order_id}: {e.response.status_code}")
             raise
         except Exception as e:
             logger.error(f"Error fetching order from Shopify: {e}")
             raise
-
+    
+    async def get_recent_orders(self, limit: int = 50) -> List[dict]:
+        """
+        Fetch the shop's most recent orders (any status), newest first.
+        
+        Args:
+            limit: Number of orders (Shopify allows up to 250)
+        
+        Returns:
+            List of order dicts
+        """
+        api_version = "2024-01"
+        url = f"https://{self.shop_domain}/admin/api/{api_version}/orders.json"
+        
+        headers = {
+            "X-Shopify-Access-Token": self.access_token,
+            "Content-Type": "application/json",
+            **outbound_headers()
+        }
+        
+        try:
+            client = get_shared_client("shopify")
+            with timed_phase("shopify"):
+                response = await client.get(url, headers=headers, params={"status": "any", "limit": limit})
+            response.raise_for_status()
+            return response.json()["orders"]
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Shopify API error fetching recent orders: {e.response.status_code}")
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching recent orders from Shopify: {e}")
+            raise
@@ -0,0 +1,40 @@
+"""
+Graceful shutdown state.
+
+begin_drain() marks the process as shutting down. From then on /ready
+reports unavailable so load balancers stop routing here, and the webhook
+routes answer 503 with Retry-After so Shopify redelivers the webhook
+(to this or another instance) instead of it racing the shutdown. Queued
+notifications are finished by the dispatcher, within
+SHUTDOWN_DRAIN_TIMEOUT, or left in the durable queue for the next one.
+"""
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_drain_started: Optional[float] = None
+
+
+def begin_drain() -> None:
+    global _drain_started
+    if _drain_started is None:
+        _drain_started = time.monotonic()
+        logger.info("Draining: rejecting new webhooks")
+
+
+def is_draining() -> bool:
+    return _drain_started is not None
+
+
+def reset() -> None:
+    """Clear the draining flag (for a new lifespan in the same process, e.g. tests)."""
+    global _drain_started
+    _drain_started = None
+
+
+def readiness() -> dict:
+    if _drain_started is None:
+        return {"ok": True}
+    return {"ok": False, "draining": True, "draining_for_s": round(time.monotonic() - _drain_started, 1)}
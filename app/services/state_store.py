@@ -0,0 +1,302 @@
+"""
+Shared key-value state for OAuth states, shop tokens and shop settings.
+
+Everything that must be visible to every worker process lives here instead
+of in module-level dicts, so the app can run with several uvicorn workers or
+on several hosts. Backends (STATE_BACKEND):
+
+    memory  - in-process dict; single worker only, used as the fake in tests
+    sqlite  - a local SQLite file in WAL mode, shared by workers on one host
+    redis   - any Redis-compatible server, shared across hosts
+              (requires the optional `redis` package)
+
+Values are strings; callers serialize structured data themselves. Keys live
+in a namespace and may carry a TTL in seconds.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.config import get_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = Path(__file__).parent.parent / "state.db"
+
+# Expired SQLite rows are purged at most this often (seconds)
+PURGE_INTERVAL = 60.0
+
+
+class StateStore:
+    """Interface implemented by every backend."""
+
+    name = "base"
+
+    async def get(self, namespace: str, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def add(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Set a key only if it is absent (or expired). Returns True if this call set it."""
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    async def pop(self, namespace: str, key: str) -> Optional[str]:
+        """Atomically get and delete a key (for one-time values such as OAuth states)."""
+        raise NotImplementedError
+
+    async def count(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    async def ping(self) -> None:
+        """Raise if the backend is unreachable."""
+
+    async def close(self) -> None:
+        pass
+
+    async def readiness(self) -> dict:
+        try:
+            await self.ping()
+        except Exception as e:
+            return {"ok": False, "backend": self.name, "error": str(e)}
+        return {"ok": True, "backend": self.name}
+
+
+class MemoryStateStore(StateStore):
+    name = "memory"
+
+    def __init__(self):
+        # {(namespace, key): (value, expires_at or None)}
+        self._data: Dict[Tuple[str, str], Tuple[str, Optional[float]]] = {}
+
+    def _live(self, namespace: str, key: str) -> Optional[str]:
+        entry = self._data.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[(namespace, key)]
+            return None
+        return value
+
+    async def get(self, namespace: str, key: str) -> Optional[str]:
+        return self._live(namespace, key)
+
+    async def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    async def add(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if self._live(namespace, key) is not None:
+            return False
+        await self.set(namespace, key, value, ttl)
+        return True
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self._data.pop((namespace, key), None)
+
+    async def pop(self, namespace: str, key: str) -> Optional[str]:
+        value = self._live(namespace, key)
+        self._data.pop((namespace, key), None)
+        return value
+
+    async def count(self, namespace: str) -> int:
+        return sum(1 for ns, key in list(self._data) if ns == namespace and self._live(ns, key) is not None)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    SQLite-backed store. Queries run in a worker thread so they never block
+    the event loop; WAL mode lets several processes read while one writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._last_purge = 0.0
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _run(self, sql: str, params: tuple = ()):
+        return asyncio.to_thread(self._execute, sql, params)
+
+    async def get(self, namespace: str, key: str) -> Optional[str]:
+        rows = await self._run(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        )
+        return rows[0][0] if rows else None
+
+    async def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        await self._run(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, now + ttl if ttl else None),
+        )
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            await self._run("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def _add(self, namespace: str, key: str, value: str, expires_at: Optional[float], now: float) -> bool:
+        with self._lock:
+            # An expired row doesn't count as present
+            self._conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, key, now),
+            )
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, expires_at),
+            )
+            return cursor.rowcount == 1
+
+    async def add(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        return await asyncio.to_thread(self._add, namespace, key, value, now + ttl if ttl else None, now)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._run("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _pop(self, namespace: str, key: str) -> Optional[tuple]:
+        # BEGIN IMMEDIATE takes the write lock before reading, so two workers
+        # racing on the same key cannot both get the value
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    async def pop(self, namespace: str, key: str) -> Optional[str]:
+        row = await asyncio.to_thread(self._pop, namespace, key)
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return value
+
+    async def count(self, namespace: str) -> int:
+        rows = await self._run(
+            "SELECT COUNT(*) FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        )
+        return rows[0][0]
+
+    async def ping(self) -> None:
+        await self._run("SELECT 1")
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStateStore(StateStore):
+    """Store on a Redis-compatible server. Pass `client` to use an existing (or fake) client."""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "smsapp:", client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            client = redis_asyncio.from_url(url, decode_responses=True)
+        self._redis = client
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Optional[str]:
+        return await self._redis.get(self._key(namespace, key))
+
+    async def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._redis.set(self._key(namespace, key), value, px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(await self._redis.set(self._key(namespace, key), value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._redis.delete(self._key(namespace, key))
+
+    async def pop(self, namespace: str, key: str) -> Optional[str]:
+        return await self._redis.getdel(self._key(namespace, key))
+
+    async def count(self, namespace: str) -> int:
+        count = 0
+        async for _ in self._redis.scan_iter(match=f"{self.prefix}{namespace}:*", count=500):
+            count += 1
+        return count
+
+    async def ping(self) -> None:
+        await self._redis.ping()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_state_store() -> StateStore:
+    """Build the backend selected by STATE_BACKEND."""
+    config = get_config()
+    backend = config.state_backend.lower()
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "sqlite":
+        return SQLiteStateStore(Path(config.state_sqlite_path) if config.state_sqlite_path else DEFAULT_SQLITE_PATH)
+    if backend == "redis":
+        return RedisStateStore(config.state_redis_url)
+    raise ValueError(f"Unknown STATE_BACKEND: {config.state_backend}")
+
+
+_store: Optional[StateStore] = None
+
+
+def get_state_store() -> StateStore:
+    """Return the process-wide store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_state_store()
+        logger.info(f"Using {_store.name} state backend")
+    return _store
+
+
+def set_state_store(store: Optional[StateStore]) -> None:
+    """Replace the process-wide store (e.g. with MemoryStateStore in tests)."""
+    global _store
+    _store = store
+
+
+async def close_state_store() -> None:
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
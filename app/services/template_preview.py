@@ -0,0 +1,106 @@
+"""
+Template previews across many order shapes.
+
+Renders one template against a batch of orders (built-in synthetic edge
+cases, the shop's recent orders, or orders supplied by the caller) and
+reports each message's encoding and segment count. The template is compiled
+once per text and every sample's context is built in one pass, so a preview
+is cheap enough to refresh on each keystroke; recent orders are cached for
+RECENT_ORDERS_TTL so typing doesn't call Shopify every time.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from app.models.templates import compile_template
+from app.services.shopify import ShopifyService
+from app.services.webhook_topics import SAMPLE_ORDER, topic_for_kind
+from app.utils.sms_segments import segment_info
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on samples per preview
+MAX_PREVIEW_SAMPLES = 50
+
+# Seconds a shop's recent orders are reused between previews
+RECENT_ORDERS_TTL = 60.0
+
+# Shops whose recent orders are cached at once (they hold customer data, so no more than needed)
+RECENT_ORDERS_MAX_SHOPS = 100
+
+# Order shapes that commonly break templates, as (label, order)
+SYNTHETIC_ORDERS: List[Tuple[str, Dict[str, Any]]] = [
+    ("typical", SAMPLE_ORDER),
+    ("long name", {
+        **SAMPLE_ORDER,
+        "customer": {"first_name": "Oluwadamilarefunmilayo-Chukwuemeka", "phone": "+2348031234567"},
+    }),
+    ("no customer", {"id": 1002, "order_number": 1002, "total_price": "4500.00", "currency": "NGN", "phone": None}),
+    ("large total", {**SAMPLE_ORDER, "order_number": 1003, "total_price": "12500000.00"}),
+    ("accented name", {**SAMPLE_ORDER, "order_number": 1004, "customer": {"first_name": "Adébáyọ̀"}}),
+    ("no currency", {**SAMPLE_ORDER, "order_number": 1005, "currency": ""}),
+    ("name only", {"id": 1006, "name": "#SHOP-1006", "total_price": "0.00", "customer": {"first_name": ""}}),
+    ("no tracking", {**SAMPLE_ORDER, "order_number": 1007, "fulfillments": []}),
+]
+
+# Shop -> (fetched at, orders), oldest fetch first
+_recent_orders: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+
+def _prune_recent_orders(now: float) -> None:
+    """Drop expired entries, then the oldest beyond RECENT_ORDERS_MAX_SHOPS."""
+    while _recent_orders:
+        shop_domain, (fetched_at, _) = next(iter(_recent_orders.items()))
+        if now - fetched_at < RECENT_ORDERS_TTL and len(_recent_orders) <= RECENT_ORDERS_MAX_SHOPS:
+            break
+        del _recent_orders[shop_domain]
+
+
+async def recent_orders(shop_domain: str, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """The shop's latest orders as (label, order), cached briefly."""
+    _prune_recent_orders(time.monotonic())
+    cached = _recent_orders.get(shop_domain)
+    if cached is None:
+        service = await ShopifyService.for_shop(shop_domain)
+        orders = await service.get_recent_orders(MAX_PREVIEW_SAMPLES)
+        cached = _recent_orders[shop_domain] = (time.monotonic(), orders)
+        _prune_recent_orders(cached[0])
+    return [(f"order {order.get('name') or order.get('id')}", order) for order in cached[1][:limit]]
+
+
+def synthetic_orders(limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+    return SYNTHETIC_ORDERS[:limit]
+
+
+def preview(template: str, kind: str, samples: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Render a template for every (label, order) sample. Raises ValueError
+    for an unknown notification kind or an order that isn't shaped like a
+    Shopify order.
+    """
+    topic = topic_for_kind(kind)
+    if topic is None:
+        raise ValueError(f"Unknown template kind: {kind}")
+    compiled = compile_template(template)
+    contexts = []
+    for index, (label, order) in enumerate(samples):
+        try:
+            contexts.append(topic.build_context(order))
+        except (AttributeError, TypeError, KeyError) as e:
+            raise ValueError(f"Sample {index} ({label}): invalid order: {e}")
+
+    results = []
+    for (label, _), context in zip(samples, contexts):
+        message = compiled.render(context)
+        info = segment_info(message)
+        results.append({
+            "label": label,
+            "message": message,
+            "characters": len(message),
+            "encoding": info.encoding,
+            "units": info.units,
+            "segments": info.segments,
+            "missing_variables": compiled.missing(context),
+        })
+    return {"kind": kind, "variables": list(compiled.variables), "samples": results}
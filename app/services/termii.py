@@ -1,21 +1,140 @@
-import os
+"""
+Termii API client.
+
+Each merchant may bill their own Termii account: a shop's saved settings
+(app/models/settings.py) take precedence over the global TERMII_* account.
+Services are pooled per credential (get_termii_service), and every pooled
+service carries its own adaptive concurrency limiter and circuit breaker,
+so one account's rate limit or exhausted balance only slows that account's
+sends. All services share one HTTP connection pool to Termii.
+"""
+import hashlib
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
 import httpx
-from dotenv import load_dotenv
+from app.config import TERMII_CHANNELS, AppConfig, get_config
+from app.models.settings import Settings, get_settings
+from app.services.adaptive_limiter import AdaptiveLimiter
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.http_client import get_shared_client
+from app.utils.request_context import outbound_headers, timed_phase
 
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Response text Termii (or a proxy in front of it) uses when shedding load
+OVERLOAD_MARKERS = ("temporarily unavailable", "too many requests", "rate limit")
+
+# Response text meaning the account itself can't send (trips the breaker)
+ACCOUNT_ERROR_MARKERS = ("insufficient", "balance", "invalid api key", "unauthorized", "inactive", "suspended")
+
+# Seconds a shop's saved credentials are cached in-process
+CREDENTIALS_CACHE_TTL = 30.0
+
+
+class MessageRejectedError(ValueError):
+    """Termii refused this message (not the account or its capacity); resending it unchanged won't help."""
+
+
+class TermiiCredentials(NamedTuple):
+    api_key: str
+    sender_id: str
+    # "shop" (the merchant's own account) or "global" (TERMII_* settings)
+    source: str
+    # Signs the account's delivery reports ("" if unknown)
+    secret_key: str = ""
+
+
+_credentials_cache: Dict[str, Tuple[float, Optional[Settings]]] = {}
+
+
+async def get_shop_credentials(shop_domain: Optional[str]) -> TermiiCredentials:
+    """
+    Termii account to send a shop's SMS with: the shop's own key and sender
+    ID if saved, otherwise the global account. Raises ValueError if neither
+    is configured.
+    """
+    settings = None
+    if shop_domain:
+        cached = _credentials_cache.get(shop_domain)
+        if cached is not None and time.monotonic() - cached[0] < CREDENTIALS_CACHE_TTL:
+            settings = cached[1]
+        else:
+            settings = await get_settings(shop_domain)
+            _credentials_cache[shop_domain] = (time.monotonic(), settings)
+    if settings is not None:
+        return TermiiCredentials(settings.termii_api_key, settings.termii_sender_id, "shop", settings.termii_secret_key)
+
+    config = get_config()
+    if not config.termii_api_key or not config.termii_sender_id:
+        raise ValueError("Termii not configured. Check TERMII_API_KEY and TERMII_SENDER_ID in .env")
+    return TermiiCredentials(config.termii_api_key, config.termii_sender_id, "global", config.termii_webhook_secret)
+
+
+def forget_shop_credentials(shop_domain: str) -> None:
+    """Drop a shop's cached credentials after its settings change."""
+    _credentials_cache.pop(shop_domain, None)
+
+
+def credential_id(api_key: str) -> str:
+    """Short, non-reversible identifier of an API key for logs and metric labels."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:10]
+
+
+def overload_reason(response: httpx.Response) -> Optional[str]:
+    """Classify a response that means "send less", or None."""
+    if response.status_code == 429:
+        return "rate_limited"
+    if response.status_code >= 500:
+        return "unavailable"
+    text = response.text[:500].lower()
+    if any(marker in text for marker in OVERLOAD_MARKERS):
+        return "unavailable"
+    return None
+
+
+def account_error(response: httpx.Response, message: str = "") -> Optional[str]:
+    """Classify an error meaning the account can't send right now (vs. a bad message), or None."""
+    if response.status_code in (401, 403):
+        return "unauthorized"
+    if any(marker in message.lower() for marker in ACCOUNT_ERROR_MARKERS):
+        return "account"
+    return None
+
 
 class TermiiService:
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
-        self.api_key = api_key or os.getenv("TERMII_API_KEY")
-        self.base_url = base_url or os.getenv("TERMII_BASE_URL", "https://v3.api.termii.com")
+        """
+        Use get_termii_service() instead of constructing services directly, so
+        every sender with the same key shares one limiter and breaker.
+        """
+        config = get_config()
+        self.api_key = api_key or config.termii_api_key
+        self.base_url = base_url or config.termii_base_url
         
         if not self.api_key:
             raise ValueError("Termii API key is required")
+
+        self.credential_id = credential_id(self.api_key)
+        name = f"termii:{self.credential_id}"
+        self.limiter = AdaptiveLimiter(
+            name,
+            initial=config.termii_concurrency_initial,
+            minimum=config.termii_concurrency_min,
+            maximum=config.termii_concurrency_max,
+            latency_tolerance=config.termii_latency_tolerance,
+        )
+        self.breaker = CircuitBreaker(name, config.termii_breaker_failures, config.termii_breaker_reset)
+
+    def configure(self, config: AppConfig) -> None:
+        self.limiter.configure(config.termii_concurrency_min, config.termii_concurrency_max, config.termii_latency_tolerance)
+        self.breaker.configure(config.termii_breaker_failures, config.termii_breaker_reset)
+
+    def close(self) -> None:
+        self.limiter.close()
+        self.breaker.close()
     
     async def fetch_sender_ids(self, sender_id: Optional[str] = None, status: Optional[str] = None) -> dict:
         """
@@ -44,47 +163,49 @@ class TermiiService:
             params["status"] = status
         
         headers = {
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            **outbound_headers()
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            client = get_shared_client("termii")
+            with timed_phase("termii"):
                 response = await client.get(url, params=params, headers=headers)
                 
-                # Log the raw response for debugging
-                logger.info(f"Termii Sender IDs API response status: {response.status_code}")
-                logger.info(f"Termii Sender IDs API response text: {response.text[:500] if response.text else '(empty)'}")  # First 500 chars
+            # Log the raw response for debugging
+            logger.info(f"Termii Sender IDs API response status: {response.status_code}")
+            logger.info(f"Termii Sender IDs API response text: {response.text[:500] if response.text else '(empty)'}")  # First 500 chars
                 
-                # Handle empty response
-                if not response.text or response.text.strip() == '':
-                    logger.info("Termii API returned empty response - no sender IDs found")
+            # Handle empty response
+            if not response.text or response.text.strip() == '':
+                logger.info("Termii API returned empty response - no sender IDs found")
+                return {
+                    "content": [],
+                    "totalElements": 0,
+                    "empty": True
+                }
+                
+            try:
+                result = response.json()
+            except Exception as e:
+                logger.warning(f"Failed to parse JSON response: {e}, raw text: {response.text[:200]}")
+                # If not JSON, might be empty or different format
+                if response.text.strip():
+                    result = {"error": response.text}
+                else:
                     return {
                         "content": [],
                         "totalElements": 0,
                         "empty": True
                     }
                 
-                try:
-                    result = response.json()
-                except Exception as e:
-                    logger.warning(f"Failed to parse JSON response: {e}, raw text: {response.text[:200]}")
-                    # If not JSON, might be empty or different format
-                    if response.text.strip():
-                        result = {"error": response.text}
-                    else:
-                        return {
-                            "content": [],
-                            "totalElements": 0,
-                            "empty": True
-                        }
-                
-                if result.get("status") == "error":
-                    error_message = result.get("message", "Unknown error from Termii API")
-                    logger.error(f"Termii API error fetching sender IDs: {error_message}")
-                    raise ValueError(f"Termii API Error: {error_message}")
+            if result.get("status") == "error":
+                error_message = result.get("message", "Unknown error from Termii API")
+                logger.error(f"Termii API error fetching sender IDs: {error_message}")
+                raise ValueError(f"Termii API Error: {error_message}")
                 
-                response.raise_for_status()
-                return result
+            response.raise_for_status()
+            return result
                 
         except ValueError as e:
             raise
@@ -110,7 +231,8 @@ class TermiiService:
         message: str,
         sender_id: str,
         channel: str = "generic",
-        message_type: str = "plain"
+        message_type: str = "plain",
+        priority: int = 0
     ) -> dict:
         """
         Send SMS via Termii API using generic channel for messages.
@@ -119,8 +241,11 @@ class TermiiService:
             to: Destination phone number in international format (no +, e.g., "2349118462627")
             message: Text message to send
             sender_id: Sender ID (alphanumeric, 3-11 characters)
-            channel: Messaging channel - use "generic" for messages (or "dnd" if activated)
-            message_type: Message format - "plain", "unicode", or "encrypted"
+            channel: Messaging channel - "dnd" (transactional, if activated), "generic"
+                (promotional), "whatsapp" or "voice"
+            message_type: Message format - "plain", "unicode", "encrypted" or "voice"
+            priority: Sends waiting for this account's concurrency limit are
+                admitted highest priority first (transactional over promotional)
         
         Returns:
             Response dict with message_id, balance, etc.
@@ -128,6 +253,7 @@ class TermiiService:
         Raises:
             httpx.HTTPError: If API request fails
             ValueError: If parameters are invalid
+            MessageRejectedError: If Termii rejects the message itself
         """
         if not to:
             raise ValueError("Phone number is required")
@@ -135,8 +261,8 @@ class TermiiService:
             raise ValueError("Message content is required")
         if not sender_id:
             raise ValueError("Sender ID is required")
-        if channel not in ["dnd", "generic", "whatsapp", "voice"]:
-            raise ValueError(f"Invalid channel: {channel}. Must be one of: dnd, generic, whatsapp, voice")
+        if channel not in TERMII_CHANNELS:
+            raise ValueError(f"Invalid channel: {channel}. Must be one of: {', '.join(TERMII_CHANNELS)}")
         
         url = f"{self.base_url}/api/sms/send"
         
@@ -150,47 +276,73 @@ class TermiiService:
         }
         
         headers = {
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            **outbound_headers()
         }
         
         # Log the payload for debugging (hide API key)
         debug_payload = {**payload, "api_key": "***HIDDEN***"}
         logger.info(f"Sending SMS to Termii API: URL={url}, Payload={debug_payload}")
         
+        # Fails fast with CircuitOpenError while this account keeps failing
+        self.breaker.before_call()
+        breaker_failure = None
+        sent = False
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(url, json=payload, headers=headers)
+            client = get_shared_client("termii")
+            # Concurrency adapts to this account's latency and overload responses
+            async with self.limiter.slot(priority) as slot:
+                with timed_phase("termii"):
+                    try:
+                        response = await client.post(url, json=payload, headers=headers)
+                    except httpx.TimeoutException:
+                        slot.overloaded("timeout")
+                        breaker_failure = "timeout"
+                        raise
+                    except httpx.RequestError:
+                        breaker_failure = "network"
+                        raise
+                reason = overload_reason(response)
+                if reason:
+                    slot.overloaded(reason)
+                elif response.is_error:
+                    slot.ignore()
+            breaker_failure = reason or account_error(response)
                 
-                logger.info(f"Termii API HTTP status: {response.status_code}")
-                logger.info(f"Termii API response text: {response.text[:500]}")
+            logger.info(f"Termii API HTTP status: {response.status_code}")
+            logger.info(f"Termii API response text: {response.text[:500]}")
                 
-                # Parse response even if status code indicates error
-                try:
-                    result = response.json()
-                    logger.info(f"Termii API JSON response: {result}")
-                except Exception:
-                    result = {"error": response.text}
-                    logger.warning(f"Termii API returned non-JSON response: {response.text[:200]}")
+            # Parse response even if status code indicates error
+            try:
+                result = response.json()
+                logger.info(f"Termii API JSON response: {result}")
+            except Exception:
+                result = {"error": response.text}
+                logger.warning(f"Termii API returned non-JSON response: {response.text[:200]}")
                 
-                # Check for API-level errors in response body
-                if result.get("status") == "error" or result.get("code") not in ["ok", 200, None]:
-                    error_message = result.get("message", "Unknown error from Termii API")
-                    error_code = result.get("code", "unknown")
-                    logger.error(f"Termii API error: {error_code} - {error_message}")
-                    logger.error(f"Full error response: {result}")
-                    raise ValueError(f"Termii API Error: {error_message}")
+            # Check for API-level errors in response body
+            if result.get("status") == "error" or result.get("code") not in ["ok", 200, None]:
+                error_message = result.get("message", "Unknown error from Termii API")
+                error_code = result.get("code", "unknown")
+                breaker_failure = breaker_failure or account_error(response, str(error_message))
+                logger.error(f"Termii API error: {error_code} - {error_message}")
+                logger.error(f"Full error response: {result}")
+                if breaker_failure is None:
+                    raise MessageRejectedError(f"Termii API Error: {error_message}")
+                raise ValueError(f"Termii API Error: {error_message}")
                 
-                # Check HTTP status
-                response.raise_for_status()
+            # Check HTTP status
+            response.raise_for_status()
                 
-                if result.get("code") == "ok":
-                    message_id = result.get('message_id') or result.get('messageId') or result.get('data', {}).get('message_id')
-                    logger.info(f"SMS sent successfully to {to}. Message ID: {message_id}")
-                    logger.info(f"Full success response: {result}")
-                else:
-                    logger.warning(f"Termii API returned non-ok status: {result}")
+            if result.get("code") == "ok":
+                message_id = result.get('message_id') or result.get('messageId') or result.get('data', {}).get('message_id')
+                logger.info(f"SMS sent successfully to {to}. Message ID: {message_id}")
+                logger.info(f"Full success response: {result}")
+            else:
+                logger.warning(f"Termii API returned non-ok status: {result}")
                 
-                return result
+            sent = True
+            return result
                 
         except ValueError as e:
             # Re-raise ValueError (API errors) as-is
@@ -211,4 +363,87 @@ class TermiiService:
         except Exception as e:
             logger.error(f"Unexpected error sending SMS: {e}")
             raise ValueError(f"Unexpected error: {str(e)}")
+        finally:
+            if breaker_failure:
+                self.breaker.record_failure(breaker_failure)
+            elif sent:
+                self.breaker.record_success()
+            else:
+                # e.g. an invalid number: says nothing about the account
+                self.breaker.record_neutral()
+
+
+class TermiiServicePool:
+    """
+    TermiiService per (API key, base URL), least recently used evicted once
+    more than TERMII_CLIENT_POOL_SIZE accounts are in use. Services with
+    sends in flight are never evicted.
+    """
+
+    def __init__(self):
+        self._services: "OrderedDict[Tuple[str, str], TermiiService]" = OrderedDict()
+        self._config: Optional[AppConfig] = None
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def get(self, api_key: str, base_url: Optional[str] = None) -> TermiiService:
+        config = get_config()
+        if config is not self._config:
+            # Limits and breaker settings follow configuration reloads
+            self._config = config
+            for service in self._services.values():
+                service.configure(config)
+
+        key = (api_key, base_url or config.termii_base_url)
+        service = self._services.get(key)
+        if service is not None:
+            self._services.move_to_end(key)
+            return service
+
+        service = self._services[key] = TermiiService(api_key=key[0], base_url=key[1])
+        self._evict(config.termii_client_pool_size)
+        return service
+
+    def peek(self, api_key: str, base_url: Optional[str] = None) -> Optional[TermiiService]:
+        """The pooled service for an API key, if any, without creating it or refreshing its LRU position."""
+        return self._services.get((api_key, base_url or get_config().termii_base_url))
+
+    def _evict(self, max_size: int) -> None:
+        for key in list(self._services):
+            if len(self._services) <= max_size:
+                break
+            service = self._services[key]
+            if service.limiter.in_flight:
+                continue
+            del self._services[key]
+            service.close()
+            logger.info(f"Evicted idle Termii client {service.credential_id} from the pool")
+
+    def clear(self) -> None:
+        for service in self._services.values():
+            service.close()
+        self._services.clear()
+
+
+_pool = TermiiServicePool()
+
+
+def get_termii_service(api_key: str, base_url: Optional[str] = None) -> TermiiService:
+    """Pooled service for an API key (with that account's limiter and breaker)."""
+    return _pool.get(api_key, base_url)
+
 
+def readiness() -> dict:
+    """
+    Readiness check: state of the global account's circuit breaker. An open
+    breaker marks the check degraded rather than failing it, since other
+    workers share the same account and SMS stay queued until it recovers.
+    """
+    config = get_config()
+    if not config.termii_api_key:
+        return {"ok": True, "configured": False}
+    # Probes must not add a client to the pool (and evict a shop's); no client yet means nothing failed
+    service = _pool.peek(config.termii_api_key)
+    state = service.breaker.state if service is not None else "closed"
+    return {"ok": True, "degraded": state == "open", "breaker": state, "credential": credential_id(config.termii_api_key)}
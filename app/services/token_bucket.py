@@ -0,0 +1,42 @@
+"""
+Token bucket rate limit for one process.
+
+Tokens accrue at `rate` per second up to `burst`; each call to acquire()
+takes one, waiting for it if the bucket is empty. Waiters are served in
+arrival order. A rate of 0 disables the limit.
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens per second; 0 or less means unlimited
+            burst: Bucket size (defaults to one second's worth, at least 1)
+        """
+        self.configure(rate, burst)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def configure(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
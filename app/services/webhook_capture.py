@@ -0,0 +1,154 @@
+"""
+Opt-in capture of production webhook traffic for offline replay.
+
+When WEBHOOK_CAPTURE_SAMPLE_RATE > 0, a sample of verified webhook requests
+is written to a gzip-compressed JSONL corpus. Customer PII is anonymized
+before it touches disk: phone numbers keep their shape but get hashed
+digits, and names, emails and street addresses are replaced with hashes.
+The HMAC header is dropped (replays are re-signed with a test secret).
+
+Anonymization and disk writes happen on a background thread so capture
+never blocks the event loop.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import queue
+import random
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import get_config
+from app.utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+# Headers worth keeping for replay; everything else (including the HMAC) is dropped
+CAPTURED_HEADERS = (
+    "content-type",
+    "x-shopify-topic",
+    "x-shopify-shop-domain",
+    "x-shopify-webhook-id",
+    "x-shopify-api-version",
+    "x-shopify-triggered-at",
+)
+
+_HASHED_KEYS = {"first_name", "last_name", "email", "address1", "address2", "company", "contact_email"}
+_PHONE_KEYS = {"phone"}
+
+QUEUE_SIZE = 1000
+
+
+class _Anonymizer:
+    def __init__(self, salt: str):
+        self.salt = salt.encode("utf-8")
+
+    def _digest(self, value: str) -> str:
+        return hashlib.sha256(self.salt + value.encode("utf-8")).hexdigest()
+
+    def phone(self, value: str) -> str:
+        """Replace digits with hash-derived digits, keeping '+', spaces and length."""
+        digits = iter(str(int(self._digest(value), 16)))
+        # Keep the country code / trunk prefix so formatting logic sees a realistic number
+        prefix_length = 4 if value.startswith("+") else 3 if value.startswith("234") else 1
+        prefix, rest = value[:prefix_length], value[prefix_length:]
+        return prefix + "".join(next(digits) if ch.isdigit() else ch for ch in rest)
+
+    def text(self, key: str, value: str) -> str:
+        digest = self._digest(value)[:12]
+        if "email" in key:
+            return f"{digest}@example.invalid"
+        return f"anon-{digest}"
+
+    def walk(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            # A "name" next to first/last name fields is a person's full name
+            is_person = "first_name" in obj or "last_name" in obj
+            result = {}
+            for key, value in obj.items():
+                if isinstance(value, str) and value:
+                    if key in _PHONE_KEYS:
+                        value = self.phone(value)
+                    elif key in _HASHED_KEYS or (key == "name" and is_person):
+                        value = self.text(key, value)
+                    result[key] = value
+                else:
+                    result[key] = self.walk(value)
+            return result
+        if isinstance(obj, list):
+            return [self.walk(item) for item in obj]
+        return obj
+
+
+class WebhookCapture:
+    def __init__(self, path: Path, sample_rate: float, salt: Optional[str] = None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.anonymizer = _Anonymizer(salt or secrets.token_hex(16))
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name="webhook-capture", daemon=True)
+        self._thread.start()
+        logger.info(f"Webhook capture enabled: sampling {self.sample_rate:.1%} to {self.path}")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+        self._thread = None
+
+    def maybe_capture(self, path: str, headers: Dict[str, str], raw_body: bytes) -> None:
+        """Sample a verified webhook for capture (non-blocking; drops when the queue is full)."""
+        if self._thread is None or random.random() >= self.sample_rate:
+            return
+        record = {
+            "ts": time.time(),
+            "path": path,
+            "headers": {name: headers[name] for name in CAPTURED_HEADERS if name in headers},
+            "raw_body": raw_body,
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            registry.counter("webhook_capture_dropped_total").inc()
+
+    def _write_loop(self) -> None:
+        # gzip members can be appended, so restarts keep extending the same corpus
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                try:
+                    body = json.loads(record.pop("raw_body").decode("utf-8"))
+                except Exception:
+                    registry.counter("webhook_capture_dropped_total").inc()
+                    continue
+                record["body"] = self.anonymizer.walk(body)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                registry.counter("webhook_capture_records_total").inc()
+                if self._queue.empty():
+                    f.flush()
+
+
+_config = get_config()
+capture = WebhookCapture(
+    path=Path(_config.webhook_capture_path),
+    sample_rate=_config.webhook_capture_sample_rate,
+    salt=_config.webhook_capture_salt,
+)
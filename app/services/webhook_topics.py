@@ -0,0 +1,112 @@
+"""
+Registry of the Shopify webhook topics that trigger an SMS.
+
+Every topic shares one ingress pipeline (app/routes/webhooks.py): verify
+the HMAC, parse the body, drop duplicate deliveries, then enqueue a
+NotificationJob. A topic only declares what differs: the notification kind
+(which is also the template name), the payload fields it needs, and how to
+build the template context. Supporting a new topic means registering one
+WebhookTopic here (and a template for its kind).
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services.dispatch_queue import TRANSACTIONAL
+
+
+def order_phone(order: dict) -> Optional[str]:
+    """Customer phone from an order payload: customer, then order, then billing address."""
+    customer = order.get("customer") or {}
+    return customer.get("phone") or order.get("phone") or (order.get("billing_address") or {}).get("phone")
+
+
+def order_id_of(order: dict) -> Any:
+    return order.get("id")
+
+
+def _customer_name(order: dict) -> str:
+    customer = order.get("customer") or {}
+    return customer.get("first_name", "Customer") or "Customer"
+
+
+def _order_number(order: dict) -> Any:
+    return order.get("order_number") or order.get("name", "N/A")
+
+
+def order_confirmation_context(order: dict) -> Dict[str, Any]:
+    total_price = order.get("total_price", "0")
+    currency = order.get("currency", "")
+    return {
+        "customer_name": _customer_name(order),
+        "order_number": _order_number(order),
+        "total_price": f"{currency} {total_price}" if currency else total_price
+    }
+
+
+def fulfillment_context(order: dict) -> Dict[str, Any]:
+    # Tracking info of the first fulfillment, if any
+    fulfillments = order.get("fulfillments") or []
+    first = fulfillments[0] if fulfillments else {}
+    return {
+        "customer_name": _customer_name(order),
+        "order_number": _order_number(order),
+        "tracking_number": first.get("tracking_number", ""),
+        "tracking_url": first.get("tracking_url", "")
+    }
+
+
+@dataclass(frozen=True)
+class WebhookTopic:
+    """
+    Args:
+        topic: Shopify topic, also the path under /webhooks (e.g. "orders/create")
+        kind: Notification kind and template name
+        build_context: Template variables from the payload
+        fields: Top-level payload fields the topic needs; deliveries missing
+            any of them are acknowledged and skipped
+        phone: Recipient phone from the payload
+        order_id: Order the notification belongs to (for per-order sequencing)
+        lane: Dispatch lane; order notifications are transactional
+    """
+    topic: str
+    kind: str
+    build_context: Callable[[dict], Dict[str, Any]]
+    fields: Tuple[str, ...] = ("id",)
+    phone: Callable[[dict], Optional[str]] = order_phone
+    order_id: Callable[[dict], Any] = order_id_of
+    lane: str = TRANSACTIONAL
+
+    def missing_fields(self, payload: dict) -> Tuple[str, ...]:
+        return tuple(name for name in self.fields if payload.get(name) is None)
+
+
+TOPICS: Dict[str, WebhookTopic] = {}
+
+
+def register_topic(topic: WebhookTopic) -> WebhookTopic:
+    TOPICS[topic.topic] = topic
+    return topic
+
+
+def get_topic(name: str) -> Optional[WebhookTopic]:
+    return TOPICS.get(name)
+
+
+def topic_for_kind(kind: str) -> Optional[WebhookTopic]:
+    """The topic whose notification kind (template name) is `kind`."""
+    return next((topic for topic in TOPICS.values() if topic.kind == kind), None)
+
+
+# Order payload used to render templates when no real order is at hand (test sends, previews)
+SAMPLE_ORDER: Dict[str, Any] = {
+    "id": 1001,
+    "order_number": 1001,
+    "total_price": "25000.00",
+    "currency": "NGN",
+    "customer": {"first_name": "Ada", "phone": "+2348031234567"},
+    "fulfillments": [{"tracking_number": "NG123456789", "tracking_url": "https://track.example.com/NG123456789"}],
+}
+
+
+register_topic(WebhookTopic("orders/create", "order_confirmation", order_confirmation_context))
+register_topic(WebhookTopic("orders/fulfilled", "fulfillment", fulfillment_context))
@@ -61,3 +61,15 @@ def verify_shopify_webhook(secret: str, raw_body: bytes, hmac_header: Optional[s
         logger.error(f"Error verifying webhook HMAC: {e}", exc_info=True)
         return False
 
+
+def verify_termii_signature(secret: str, raw_body: bytes, signature_header: Optional[str]) -> bool:
+    """
+    Verify the X-Termii-Signature header of a Termii event (delivery report).
+
+    Termii signs the raw body with HMAC-SHA512 using the account's secret key
+    and sends the hex digest.
+    """
+    if not signature_header or not secret:
+        return False
+    calculated = hmac.new(secret.encode('utf-8'), raw_body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(calculated, signature_header.strip().lower())
@@ -0,0 +1,135 @@
+"""
+Minimal in-process metrics: counters, gauges and bucketed histograms.
+
+Metrics are keyed by name plus a set of labels and exposed as a JSON
+snapshot through the diagnostics API.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS: Tuple[float, ...] = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def snapshot(self) -> dict:
+        return {"value": self.value}
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def snapshot(self) -> dict:
+        return {"value": self.value}
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        # One extra slot for observations above the largest bucket
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """Approximate a percentile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.percentile(0.50),
+            "p90": self.percentile(0.90),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[LabelKey, object]] = {}
+
+    def _get_or_create(self, name: str, labels: Optional[Dict[str, str]], factory):
+        key = _label_key(labels)
+        with self._lock:
+            family = self._metrics.setdefault(name, {})
+            metric = family.get(key)
+            if metric is None:
+                metric = family[key] = factory()
+            return metric
+
+    def counter(self, name: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get_or_create(name, labels, Counter)
+
+    def gauge(self, name: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get_or_create(name, labels, Gauge)
+
+    def histogram(self, name: str, labels: Optional[Dict[str, str]] = None) -> Histogram:
+        return self._get_or_create(name, labels, Histogram)
+
+    def remove(self, name: str, labels: Optional[Dict[str, str]] = None) -> None:
+        """Drop one labelled series (e.g. for an object that no longer exists)."""
+        with self._lock:
+            self._metrics.get(name, {}).pop(_label_key(labels), None)
+
+    def snapshot(self) -> Dict[str, List[dict]]:
+        with self._lock:
+            families = {name: dict(family) for name, family in self._metrics.items()}
+        return {
+            name: [
+                {"labels": dict(key), **metric.snapshot()}
+                for key, metric in family.items()
+            ]
+            for name, family in sorted(families.items())
+        }
+
+
+registry = MetricsRegistry()
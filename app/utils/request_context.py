@@ -0,0 +1,110 @@
+"""
+Per-request context: correlation IDs and phase timings.
+
+The correlation ID and the phase timer live in context variables so that
+services called from a request (e.g. TermiiService) can record timings and
+propagate the ID without it being passed through every function signature.
+"""
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+CORRELATION_ID_HEADER = "X-Request-ID"
+
+correlation_id_var: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+
+class PhaseTimer:
+    """Accumulates named phase durations (in milliseconds) for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, duration_ms: float) -> None:
+        """Add a duration to a phase (repeated phases are summed)."""
+        self.phases[name] = self.phases.get(name, 0.0) + duration_ms
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing_header(self) -> str:
+        """Format phases plus the request total as a Server-Timing header value."""
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.phases.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+
+_phase_timer_var: ContextVar[Optional[PhaseTimer]] = ContextVar("phase_timer", default=None)
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_correlation_id() -> str:
+    return correlation_id_var.get()
+
+
+def get_phase_timer() -> Optional[PhaseTimer]:
+    return _phase_timer_var.get()
+
+
+def start_request_context(correlation_id: str) -> PhaseTimer:
+    """Bind a correlation ID and a fresh phase timer to the current context."""
+    correlation_id_var.set(correlation_id)
+    timer = PhaseTimer()
+    _phase_timer_var.set(timer)
+    return timer
+
+
+@contextmanager
+def timed_phase(name: str) -> Iterator[None]:
+    """
+    Time a block as a named phase of the current request.
+    No-op when called outside a request (e.g. from a background task).
+    """
+    timer = _phase_timer_var.get()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers that propagate the current correlation ID to outbound calls."""
+    correlation_id = correlation_id_var.get()
+    if correlation_id == "-":
+        return {}
+    return {CORRELATION_ID_HEADER: correlation_id}
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Logging filter that stamps every record with the current correlation ID."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = correlation_id_var.get()
+        return True
+
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s"
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Configure root logging with the correlation ID in every line."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(CorrelationIdFilter())
@@ -0,0 +1,48 @@
+"""
+SMS length accounting: encoding and segment (page) count of a message.
+
+Messages that only use the GSM 03.38 alphabet are sent as GSM-7: 160
+characters fit one SMS, 153 per segment once it is split (the rest carries
+the concatenation header). Characters from the GSM extension table, such as
+{ } [ ] ~ | ^ \\ and €, take two. Any other character (most accented letters,
+Yoruba tone marks, emoji, curly quotes) switches the whole message to UCS-2:
+70 UTF-16 code units in one SMS, 67 per segment.
+"""
+from typing import NamedTuple
+
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+
+GSM7_ALL = GSM7_BASIC | GSM7_EXTENDED
+
+GSM7 = "GSM-7"
+UCS2 = "UCS-2"
+
+# (single SMS, per segment of a split message) in characters / UTF-16 units
+SEGMENT_LIMITS = {GSM7: (160, 153), UCS2: (70, 67)}
+
+
+class SegmentInfo(NamedTuple):
+    encoding: str
+    # Length in the encoding's units (GSM-7 septets or UTF-16 code units)
+    units: int
+    segments: int
+
+
+def segment_info(text: str) -> SegmentInfo:
+    """Encoding, encoded length and segment count of an SMS body."""
+    if GSM7_ALL.issuperset(text):
+        encoding = GSM7
+        units = len(text) + sum(1 for char in text if char in GSM7_EXTENDED)
+    else:
+        encoding = UCS2
+        units = len(text.encode("utf-16-le")) // 2
+    single, per_segment = SEGMENT_LIMITS[encoding]
+    if units <= single:
+        segments = 1 if units else 0
+    else:
+        segments = -(-units // per_segment)
+    return SegmentInfo(encoding, units, segments)
@@ -0,0 +1,75 @@
+"""
+Standalone SMS dispatch worker.
+
+Consumes the notifications queued by the webhook routes and sends them,
+independently of the web processes. Run the web tier with
+DISPATCH_MODE=external and scale workers on queue depth
+(dispatch_queue_depth) rather than on request rate.
+
+On SIGTERM/SIGINT the worker stops claiming jobs, finishes those in hand
+for up to --drain-timeout seconds (default SHUTDOWN_DRAIN_TIMEOUT) and
+returns the rest to the queue.
+SIGHUP reloads the configuration.
+
+Usage:
+    python -m app.worker --concurrency 16
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from typing import List, Optional
+
+from app.config import get_config
+from app.services.config_reloader import ConfigReloader
+from app.services.dispatch_queue import close_dispatch_queue
+from app.services.dispatcher import Dispatcher
+from app.services.http_client import close_shared_clients
+from app.utils.request_context import configure_logging
+
+logger = logging.getLogger("app.worker")
+
+
+async def run(args: argparse.Namespace) -> None:
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+
+    config_reloader = ConfigReloader(interval=get_config().config_watch_interval)
+    dispatcher = Dispatcher(concurrency=args.concurrency, promotional_concurrency=args.promotional_concurrency)
+    config_reloader.start()
+    await dispatcher.start()
+    try:
+        await stop.wait()
+        logger.info("Shutdown requested; draining")
+    finally:
+        await dispatcher.stop(drain_timeout=args.drain_timeout)
+        await config_reloader.stop()
+        await close_shared_clients()
+        await close_dispatch_queue()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="SMS dispatch worker")
+    parser.add_argument("--concurrency", type=int, default=None, help="Parallel transactional sends; defaults to DISPATCH_CONCURRENCY")
+    parser.add_argument("--promotional-concurrency", type=int, default=None, help="Parallel promotional sends; defaults to DISPATCH_PROMOTIONAL_CONCURRENCY")
+    parser.add_argument("--drain-timeout", type=float, default=None, help="Seconds to finish in-flight sends on shutdown; defaults to SHUTDOWN_DRAIN_TIMEOUT")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    configure_logging()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Open-loop webhook load generator.
+
+Sends signed synthetic orders/create and orders/fulfilled webhooks at a fixed
+arrival rate, independent of how fast the app responds, and reports
+throughput, latency percentiles and error rates. Latency is measured from
+each request's scheduled send time, so queueing inside the client is counted
+(no coordinated omission).
+
+Usage:
+    # In-process via ASGI transport (no server needed)
+    python -m bench.loadgen --target asgi --rate 200 --duration 30
+
+    # Against a running instance
+    python -m bench.loadgen --target http://localhost:8000 --secret $SHOPIFY_WEBHOOK_SECRET
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.payloads import DEFAULT_SIZE_MIX, ORDER_SIZES, OrderFactory
+
+DEFAULT_SECRET = "bench-webhook-secret"
+
+
+@dataclass
+class LoadResult:
+    scheduled: int = 0
+    completed: int = 0
+    elapsed: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+    by_topic: Dict[str, List[float]] = field(default_factory=dict)
+
+    def record(self, topic: str, latency_ms: float, status: Optional[int], error: Optional[str]) -> None:
+        self.completed += 1
+        self.latencies_ms.append(latency_ms)
+        self.by_topic.setdefault(topic, []).append(latency_ms)
+        if status is not None:
+            self.statuses[status] += 1
+        if error is not None:
+            self.errors[error] += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(result: LoadResult) -> dict:
+    failed = sum(count for status, count in result.statuses.items() if status >= 400) + sum(result.errors.values())
+    latencies = result.latencies_ms
+    return {
+        "scheduled": result.scheduled,
+        "completed": result.completed,
+        "elapsed_s": round(result.elapsed, 2),
+        "throughput_rps": round(result.completed / result.elapsed, 1) if result.elapsed else 0.0,
+        "error_rate": round(failed / result.completed, 4) if result.completed else 0.0,
+        "statuses": {str(status): count for status, count in sorted(result.statuses.items())},
+        "errors": dict(result.errors),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p90": round(percentile(latencies, 0.90), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "p999": round(percentile(latencies, 0.999), 2),
+            "max": round(max(latencies), 2) if latencies else 0.0,
+        },
+        "latency_p99_ms_by_topic": {
+            topic: round(percentile(values, 0.99), 2) for topic, values in result.by_topic.items()
+        },
+    }
+
+
+def print_report(summary: dict) -> None:
+    latency = summary["latency_ms"]
+    print(f"Scheduled:   {summary['scheduled']}")
+    print(f"Completed:   {summary['completed']} in {summary['elapsed_s']}s")
+    print(f"Throughput:  {summary['throughput_rps']} req/s")
+    print(f"Error rate:  {summary['error_rate'] * 100:.2f}%")
+    print(f"Statuses:    {summary['statuses']}")
+    if summary["errors"]:
+        print(f"Errors:      {summary['errors']}")
+    print(
+        f"Latency ms:  p50={latency['p50']} p90={latency['p90']} p99={latency['p99']} "
+        f"p99.9={latency['p999']} max={latency['max']}"
+    )
+    for topic, p99 in summary["latency_p99_ms_by_topic"].items():
+        print(f"  {topic:<18} p99={p99}")
+
+
+def build_requests(
+    factory: OrderFactory,
+    count: int,
+    secret: str,
+    shops: List[str]
+) -> List[Tuple[str, bytes, Dict[str, str]]]:
+    """Pre-generate signed requests so payload construction does not skew timing."""
+    return [factory.webhook(secret, shops[i % len(shops)]) for i in range(count)]
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    requests: List[Tuple[str, bytes, Dict[str, str]]],
+    rate: float,
+    duration: float,
+    max_in_flight: int
+) -> LoadResult:
+    result = LoadResult()
+    in_flight: set = set()
+    total = int(rate * duration)
+
+    async def send(topic: str, body: bytes, headers: Dict[str, str], scheduled_at: float) -> None:
+        status: Optional[int] = None
+        error: Optional[str] = None
+        try:
+            response = await client.post(f"/webhooks/{topic}", content=body, headers=headers)
+            status = response.status_code
+        except Exception as e:
+            error = type(e).__name__
+        result.record(topic, (time.perf_counter() - scheduled_at) * 1000, status, error)
+
+    started = time.perf_counter()
+    for i in range(total):
+        scheduled_at = started + i / rate
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        result.scheduled += 1
+        if len(in_flight) >= max_in_flight:
+            result.record("client", 0.0, None, "client_in_flight_limit")
+            continue
+        topic, body, headers = requests[i % len(requests)]
+        # A fresh webhook ID per send (it is not part of the signature)
+        headers = {**headers, "X-Shopify-Webhook-Id": f"bench-{i}-{time.time_ns()}"}
+        task = asyncio.create_task(send(topic, body, headers, scheduled_at))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    size_mix = DEFAULT_SIZE_MIX
+    if args.size:
+        size_mix = {args.size: 1.0}
+    factory = OrderFactory(seed=args.seed, phone_ratio=args.phone_ratio, unicode_ratio=args.unicode_ratio, size_mix=size_mix)
+    shops = [s.strip() for s in args.shops.split(",") if s.strip()]
+    print(f"Generating {args.pool_size} signed payloads...")
+    requests = build_requests(factory, args.pool_size, args.secret, shops)
+    sizes = sorted(len(body) for _, body, _ in requests)
+    print(f"Payload bytes: min={sizes[0]} median={sizes[len(sizes) // 2]} max={sizes[-1]}")
+
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    timeout = httpx.Timeout(args.timeout)
+
+    if args.target == "asgi":
+        # The app reads the webhook secret at import time
+        os.environ["SHOPIFY_WEBHOOK_SECRET"] = args.secret
+        from app.main import app
+
+        logging.getLogger().setLevel(args.app_log_level)
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+                result = await run_load(client, requests, args.rate, args.duration, args.max_in_flight)
+    else:
+        async with httpx.AsyncClient(base_url=args.target, timeout=timeout, limits=limits) as client:
+            result = await run_load(client, requests, args.rate, args.duration, args.max_in_flight)
+
+    return summarize(result)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Open-loop Shopify webhook load generator")
+    parser.add_argument("--target", default="asgi", help="'asgi' for in-process, or a base URL such as http://localhost:8000")
+    parser.add_argument("--rate", type=float, default=50.0, help="Arrival rate in requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Test duration in seconds")
+    parser.add_argument("--secret", default=os.getenv("SHOPIFY_WEBHOOK_SECRET") or DEFAULT_SECRET, help="Webhook signing secret")
+    parser.add_argument("--shops", default="bench-store.myshopify.com", help="Comma-separated shop domains to rotate through")
+    parser.add_argument("--size", choices=sorted(ORDER_SIZES), help="Use a single order size instead of the default mix")
+    parser.add_argument("--phone-ratio", type=float, default=0.85, help="Fraction of orders with a customer phone")
+    parser.add_argument("--unicode-ratio", type=float, default=0.2, help="Fraction of orders with unicode names")
+    parser.add_argument("--pool-size", type=int, default=200, help="Distinct payloads to pre-generate")
+    parser.add_argument("--max-in-flight", type=int, default=10000, help="Client-side cap on concurrent requests")
+    parser.add_argument("--max-connections", type=int, default=500, help="HTTP connection pool size (socket mode)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible payloads")
+    parser.add_argument("--app-log-level", default="WARNING", help="Root log level for the in-process app")
+    parser.add_argument("--json", dest="json_path", help="Also write the summary as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    summary = asyncio.run(main_async(args))
+    print_report(summary)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
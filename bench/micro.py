@@ -0,0 +1,259 @@
+"""
+Microbenchmarks for the functions on the per-webhook hot path.
+
+Covers render_template, format_phone_for_termii, verify_shopify_webhook,
+get_templates, webhook JSON parsing and the add_embed_headers middleware,
+plus the template preview API's rendering and segment counting,
+with the size-dependent cases run on bodies from 2KB to 2MB. Results are
+written as JSON and can be compared against a checked-in baseline.
+
+Usage:
+    python -m bench.micro                                   # run and print
+    python -m bench.micro --output results.json             # save results
+    python -m bench.micro --compare bench/baselines/micro.json --fail-above 1.25
+    python -m bench.micro --filter verify_shopify_webhook   # subset by name
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from bench.payloads import OrderFactory, sign_body
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "micro.json"
+
+# Target body sizes in bytes and the line-item count that approximately produces them
+PAYLOAD_SIZES = {
+    "2KB": 0,
+    "20KB": 24,
+    "200KB": 265,
+    "2MB": 2750,
+}
+
+SECRET = "bench-webhook-secret"
+
+
+@dataclass
+class Case:
+    name: str
+    # Runs the operation `loops` times and returns the elapsed seconds
+    run: Callable[[int], float]
+
+
+def sync_case(name: str, fn: Callable[[], object]) -> Case:
+    def run(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - started
+    return Case(name, run)
+
+
+def async_case(name: str, fn: Callable[[], object], loop: asyncio.AbstractEventLoop) -> Case:
+    async def batch(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in range(loops):
+            await fn()
+        return time.perf_counter() - started
+    return Case(name, lambda loops: loop.run_until_complete(batch(loops)))
+
+
+def make_body(line_items: int) -> bytes:
+    factory = OrderFactory(seed=42, unicode_ratio=0.5)
+    order = factory.order("orders/create", size="small")
+    if line_items:
+        order["line_items"] = [factory._line_item(i) for i in range(line_items)]
+    return json.dumps(order, ensure_ascii=False).encode("utf-8")
+
+
+def build_cases(loop: asyncio.AbstractEventLoop, templates_dir: Path) -> List[Case]:
+    from starlette.requests import Request
+    from starlette.responses import Response
+
+    from app.main import add_embed_headers
+    from app.models import templates as templates_module
+    from app.models.templates import render_template
+    from app.services.template_preview import preview, synthetic_orders
+    from app.services.webhook_verifier import verify_shopify_webhook
+    from app.utils.sms_segments import segment_info
+    from app.utils.phone_formatter import format_phone_for_termii
+
+    cases: List[Case] = []
+
+    template = templates_module.ShopTemplates().order_confirmation
+    context = {"customer_name": "Adébáyọ̀", "order_number": 1042, "total_price": "NGN 45000.00"}
+    cases.append(sync_case("render_template", lambda: render_template(template, context)))
+    cases.append(sync_case("segment_info", lambda: segment_info(render_template(template, context))))
+    samples = synthetic_orders(8)
+    cases.append(sync_case("template_preview[8]", lambda: preview(template, "order_confirmation", samples)))
+
+    for label, phone in [("intl_plus", "+2348031234567"), ("local", "0803 123 4567")]:
+        cases.append(sync_case(f"format_phone_for_termii[{label}]", lambda phone=phone: format_phone_for_termii(phone)))
+
+    for label, line_items in PAYLOAD_SIZES.items():
+        body = make_body(line_items)
+        signature = sign_body(SECRET, body)
+        cases.append(sync_case(
+            f"verify_shopify_webhook[{label}]",
+            lambda body=body, signature=signature: verify_shopify_webhook(SECRET, body, signature)
+        ))
+        cases.append(sync_case(
+            f"json_parse[{label}]",
+            lambda body=body: json.loads(body.decode("utf-8"))
+        ))
+
+    # get_templates reads the whole templates file on every call, so cost grows with shop count
+    for shop_count in (1, 1000):
+        path = templates_dir / f"templates_{shop_count}.json"
+        data = {
+            f"shop-{i}.myshopify.com": {
+                "order_confirmation": templates_module.ShopTemplates().order_confirmation,
+                "fulfillment": templates_module.ShopTemplates().fulfillment,
+            }
+            for i in range(shop_count)
+        }
+        path.write_text(json.dumps(data), encoding="utf-8")
+
+        def lookup(path: Path = path) -> None:
+            templates_module.TEMPLATES_FILE = path
+            templates_module.get_templates("shop-0.myshopify.com")
+        cases.append(sync_case(f"get_templates[{shop_count}_shops]", lookup))
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/admin/settings",
+        "query_string": b"",
+        "headers": [(b"referer", b"https://bench-store.myshopify.com/admin/apps")],
+    }
+
+    async def call_next(request):
+        return Response()
+
+    async def run_middleware():
+        await add_embed_headers(Request(scope), call_next)
+
+    cases.append(async_case("add_embed_headers", run_middleware, loop))
+    return cases
+
+
+def calibrate(case: Case, min_time: float) -> int:
+    """Find a loop count whose run takes at least min_time seconds (like timeit.autorange)."""
+    loops = 1
+    while True:
+        if case.run(loops) >= min_time:
+            return loops
+        loops *= 2 if loops < 1000 else 10
+
+
+def measure(case: Case, repeats: int, min_time: float) -> dict:
+    loops = calibrate(case, min_time)
+    per_op_us = [case.run(loops) / loops * 1e6 for _ in range(repeats)]
+    return {
+        "loops": loops,
+        "min_us": round(min(per_op_us), 3),
+        "median_us": round(statistics.median(per_op_us), 3),
+        "stdev_us": round(statistics.stdev(per_op_us), 3) if len(per_op_us) > 1 else 0.0,
+    }
+
+
+def run_suite(name_filter: Optional[str], repeats: int, min_time: float) -> dict:
+    # Benchmark the functions themselves, not the log handlers they call
+    logging.disable(logging.CRITICAL)
+    loop = asyncio.new_event_loop()
+    results: Dict[str, dict] = {}
+    from app.models import templates as templates_module
+    templates_file = templates_module.TEMPLATES_FILE
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for case in build_cases(loop, Path(tmp)):
+                if name_filter and name_filter not in case.name:
+                    continue
+                results[case.name] = measure(case, repeats, min_time)
+                print(f"{case.name:<40} {results[case.name]['median_us']:>12.3f} us", file=sys.stderr)
+    finally:
+        templates_module.TEMPLATES_FILE = templates_file
+        loop.close()
+        logging.disable(logging.NOTSET)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> List[dict]:
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        ratio = result["median_us"] / base["median_us"] if base and base["median_us"] else None
+        rows.append({
+            "name": name,
+            "baseline_us": base["median_us"] if base else None,
+            "current_us": result["median_us"],
+            "ratio": round(ratio, 3) if ratio is not None else None,
+        })
+    return rows
+
+
+def print_comparison(rows: List[dict], fail_above: float) -> bool:
+    """Print a comparison table. Returns True when any case regressed past fail_above."""
+    regressed = False
+    print(f"{'benchmark':<40} {'baseline us':>12} {'current us':>12} {'ratio':>8}")
+    for row in rows:
+        baseline = f"{row['baseline_us']:.3f}" if row["baseline_us"] is not None else "-"
+        ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "new"
+        flag = ""
+        if row["ratio"] is not None and row["ratio"] > fail_above:
+            flag = "  REGRESSION"
+            regressed = True
+        elif row["ratio"] is not None and row["ratio"] < 1 / fail_above:
+            flag = "  faster"
+        print(f"{row['name']:<40} {baseline:>12} {row['current_us']:>12.3f} {ratio:>8}{flag}")
+    return regressed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Hot-path microbenchmarks")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--compare", nargs="?", const=str(BASELINE_PATH), help="Compare against a baseline JSON (default: checked-in baseline)")
+    parser.add_argument("--fail-above", type=float, default=1.25, help="Exit non-zero if any case is slower than baseline by this ratio")
+    args = parser.parse_args(argv)
+
+    current = run_suite(args.filter, args.repeats, args.min_time)
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if print_comparison(compare(current, baseline), args.fail_above):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Synthetic Shopify order webhook payloads for load testing.
+
+Orders cover small to very large line-item counts, customers with and
+without phone numbers (in the formats merchants actually store), and
+unicode names. Bodies are signed exactly as Shopify signs webhooks.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+TOPICS = ("orders/create", "orders/fulfilled")
+
+# Line items per order; "huge" produces bodies in the megabyte range
+ORDER_SIZES: Dict[str, int] = {
+    "small": 1,
+    "medium": 10,
+    "large": 100,
+    "huge": 1000,
+}
+
+DEFAULT_SIZE_MIX: Dict[str, float] = {
+    "small": 0.70,
+    "medium": 0.25,
+    "large": 0.045,
+    "huge": 0.005,
+}
+
+FIRST_NAMES = [
+    "Ada", "Chinedu", "Tunde", "Ngozi", "Emeka", "Funmilayo", "Ibrahim", "Zainab",
+    "Adébáyọ̀", "Ọlámídé", "Chiamaka", "Oluwaseun", "Zoë", "李雷", "Kémi 🎉", "Nneka",
+]
+LAST_NAMES = [
+    "Okafor", "Adeyemi", "Bello", "Nwankwo", "Eze", "Abubakar", "Ọládipọ̀", "Nwáńkwọ",
+    "Balogun", "Okonkwo", "Musa", "Ogunleye",
+]
+PHONE_FORMATS = [
+    "+234{number}",
+    "0{number}",
+    "234{number}",
+    "0{spaced}",
+]
+PHONE_PREFIXES = ["803", "806", "813", "816", "805", "807", "815", "802", "808", "809", "817", "818"]
+CITIES = ["Lagos", "Abuja", "Port Harcourt", "Ibadan", "Kano", "Enugu", "Benin City"]
+PRODUCTS = [
+    "Ankara Print Dress", "Agbada Set", "Shea Butter 250ml", "Zobo Mix", "Plantain Chips",
+    "Aso Oke Gele", "Leather Sandals", "Adire Tote Bag", "Suya Spice Jar", "Beaded Necklace",
+]
+
+
+def sign_body(secret: str, body: bytes) -> str:
+    """Compute the X-Shopify-Hmac-Sha256 header value for a body."""
+    return base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode("utf-8")
+
+
+class OrderFactory:
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        phone_ratio: float = 0.85,
+        unicode_ratio: float = 0.2,
+        size_mix: Optional[Dict[str, float]] = None
+    ):
+        self.random = random.Random(seed)
+        self.phone_ratio = phone_ratio
+        self.unicode_ratio = unicode_ratio
+        self.size_mix = size_mix or DEFAULT_SIZE_MIX
+        self._order_number = 1000
+
+    def _pick_size(self) -> str:
+        sizes = list(self.size_mix)
+        return self.random.choices(sizes, weights=[self.size_mix[s] for s in sizes])[0]
+
+    def _phone(self) -> str:
+        number = self.random.choice(PHONE_PREFIXES) + "".join(self.random.choices("0123456789", k=7))
+        spaced = f"{number[:3]} {number[3:6]} {number[6:]}"
+        return self.random.choice(PHONE_FORMATS).format(number=number, spaced=spaced)
+
+    def _name(self) -> Tuple[str, str]:
+        if self.random.random() < self.unicode_ratio:
+            return self.random.choice(FIRST_NAMES[8:]), self.random.choice(LAST_NAMES[6:8])
+        return self.random.choice(FIRST_NAMES[:8]), self.random.choice(LAST_NAMES)
+
+    def _line_item(self, index: int) -> dict:
+        price = f"{self.random.randint(500, 95000)}.00"
+        title = self.random.choice(PRODUCTS)
+        return {
+            "id": self.random.randint(10**12, 10**13),
+            "admin_graphql_api_id": f"gid://shopify/LineItem/{self.random.randint(10**12, 10**13)}",
+            "fulfillable_quantity": 1,
+            "fulfillment_service": "manual",
+            "fulfillment_status": None,
+            "gift_card": False,
+            "grams": self.random.randint(50, 3000),
+            "name": f"{title} - Size {self.random.choice('SMLX')}",
+            "price": price,
+            "price_set": {
+                "shop_money": {"amount": price, "currency_code": "NGN"},
+                "presentment_money": {"amount": price, "currency_code": "NGN"},
+            },
+            "product_exists": True,
+            "product_id": self.random.randint(10**12, 10**13),
+            "properties": [],
+            "quantity": self.random.randint(1, 3),
+            "requires_shipping": True,
+            "sku": f"SKU-{index:05d}",
+            "taxable": True,
+            "title": title,
+            "total_discount": "0.00",
+            "variant_id": self.random.randint(10**12, 10**13),
+            "variant_title": self.random.choice(["Small", "Medium", "Large", "Default Title"]),
+            "vendor": "Naija Store",
+            "tax_lines": [{"price": "0.00", "rate": 0.075, "title": "VAT"}],
+        }
+
+    def _address(self, first_name: str, last_name: str, phone: Optional[str]) -> dict:
+        return {
+            "first_name": first_name,
+            "last_name": last_name,
+            "name": f"{first_name} {last_name}",
+            "address1": f"{self.random.randint(1, 200)} Admiralty Way",
+            "address2": None,
+            "city": self.random.choice(CITIES),
+            "province": "Lagos",
+            "country": "Nigeria",
+            "country_code": "NG",
+            "zip": "100001",
+            "phone": phone,
+            "company": None,
+        }
+
+    def order(self, topic: str = "orders/create", size: Optional[str] = None) -> dict:
+        """Build one order payload for the given topic."""
+        size = size or self._pick_size()
+        self._order_number += 1
+        first_name, last_name = self._name()
+        phone = self._phone() if self.random.random() < self.phone_ratio else None
+        # Merchants store the phone on the customer, the order or only the billing address
+        phone_location = self.random.choice(["customer", "order", "billing"])
+        line_items = [self._line_item(i) for i in range(ORDER_SIZES[size])]
+        total = sum(float(item["price"]) * item["quantity"] for item in line_items)
+        order_id = self.random.randint(10**12, 10**13)
+        now = datetime.now(timezone.utc).isoformat()
+
+        order = {
+            "id": order_id,
+            "admin_graphql_api_id": f"gid://shopify/Order/{order_id}",
+            "name": f"#{self._order_number}",
+            "order_number": self._order_number,
+            "number": self._order_number - 1000,
+            "email": f"customer{self._order_number}@example.com",
+            "phone": phone if phone_location == "order" else None,
+            "created_at": now,
+            "updated_at": now,
+            "currency": "NGN",
+            "presentment_currency": "NGN",
+            "financial_status": "paid",
+            "fulfillment_status": "fulfilled" if topic == "orders/fulfilled" else None,
+            "subtotal_price": f"{total:.2f}",
+            "total_price": f"{total:.2f}",
+            "total_tax": "0.00",
+            "total_discounts": "0.00",
+            "customer": {
+                "id": self.random.randint(10**12, 10**13),
+                "email": f"customer{self._order_number}@example.com",
+                "first_name": first_name,
+                "last_name": last_name,
+                "phone": phone if phone_location == "customer" else None,
+                "verified_email": True,
+                "tags": "",
+                "currency": "NGN",
+            },
+            "billing_address": self._address(first_name, last_name, phone if phone_location == "billing" else None),
+            "shipping_address": self._address(first_name, last_name, None),
+            "line_items": line_items,
+            "shipping_lines": [{"code": "Standard", "price": "2500.00", "title": "Standard Delivery"}],
+            "note": None,
+            "tags": "",
+        }
+        if topic == "orders/fulfilled":
+            order["fulfillments"] = [{
+                "id": self.random.randint(10**12, 10**13),
+                "status": "success",
+                "tracking_company": "GIG Logistics",
+                "tracking_number": f"GIG{self.random.randint(10**8, 10**9)}",
+                "tracking_url": "https://giglogistics.com/track",
+                "created_at": now,
+            }]
+        return order
+
+    def webhook(
+        self,
+        secret: str,
+        shop_domain: str,
+        topic: Optional[str] = None,
+        size: Optional[str] = None
+    ) -> Tuple[str, bytes, Dict[str, str]]:
+        """Build a signed webhook request. Returns (topic, body, headers)."""
+        topic = topic or self.random.choice(TOPICS)
+        body = json.dumps(self.order(topic, size), ensure_ascii=False).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "X-Shopify-Topic": topic,
+            "X-Shopify-Shop-Domain": shop_domain,
+            "X-Shopify-Hmac-Sha256": sign_body(secret, body),
+            "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+            "X-Shopify-API-Version": "2025-10",
+        }
+        return topic, body, headers
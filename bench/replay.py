@@ -0,0 +1,132 @@
+"""
+Replay a captured webhook corpus against an instance.
+
+Reads the gzip JSONL files written by webhook capture mode
+(WEBHOOK_CAPTURE_SAMPLE_RATE), re-signs every body with a test secret and
+sends it preserving the original inter-arrival times, optionally sped up.
+
+Usage:
+    python -m bench.replay captures/webhooks.jsonl.gz --target http://localhost:8000 --speed 10
+    python -m bench.replay captures/*.jsonl.gz --target asgi --speed max
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.loadgen import DEFAULT_SECRET, LoadResult, print_report, summarize
+from bench.payloads import sign_body
+
+# (offset seconds from the first request, path, body, headers)
+ReplayRequest = Tuple[float, str, bytes, Dict[str, str]]
+
+
+def load_corpus(paths: List[str], secret: str, keep_ids: bool) -> List[ReplayRequest]:
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record["ts"])
+    if not records:
+        return []
+
+    first_ts = records[0]["ts"]
+    requests: List[ReplayRequest] = []
+    for record in records:
+        body = json.dumps(record["body"], ensure_ascii=False).encode("utf-8")
+        headers = dict(record["headers"])
+        headers["x-shopify-hmac-sha256"] = sign_body(secret, body)
+        if not keep_ids:
+            headers["x-shopify-webhook-id"] = str(uuid.uuid4())
+        requests.append((record["ts"] - first_ts, record["path"], body, headers))
+    return requests
+
+
+async def replay(client: httpx.AsyncClient, requests: List[ReplayRequest], speed: Optional[float]) -> LoadResult:
+    """Send requests at their recorded offsets divided by speed (None = as fast as possible)."""
+    result = LoadResult()
+    tasks = []
+
+    async def send(path: str, body: bytes, headers: Dict[str, str], scheduled_at: float) -> None:
+        status: Optional[int] = None
+        error: Optional[str] = None
+        try:
+            response = await client.post(path, content=body, headers=headers)
+            status = response.status_code
+        except Exception as e:
+            error = type(e).__name__
+        topic = headers.get("x-shopify-topic", path)
+        result.record(topic, (time.perf_counter() - scheduled_at) * 1000, status, error)
+
+    started = time.perf_counter()
+    for offset, path, body, headers in requests:
+        scheduled_at = started + (offset / speed if speed else 0.0)
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        result.scheduled += 1
+        tasks.append(asyncio.create_task(send(path, body, headers, max(scheduled_at, started))))
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    requests = load_corpus(args.corpus, args.secret, args.keep_ids)
+    if not requests:
+        raise SystemExit("Corpus is empty")
+    speed = None if args.speed == "max" else float(args.speed)
+    span = requests[-1][0]
+    rate_label = "max speed" if speed is None else f"{speed:g}x"
+    print(f"Replaying {len(requests)} webhooks spanning {span:.1f}s at {rate_label}")
+
+    timeout = httpx.Timeout(args.timeout)
+    if args.target == "asgi":
+        os.environ["SHOPIFY_WEBHOOK_SECRET"] = args.secret
+        from app.main import app
+
+        logging.getLogger().setLevel(args.app_log_level)
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=timeout) as client:
+                result = await replay(client, requests, speed)
+    else:
+        limits = httpx.Limits(max_connections=args.max_connections)
+        async with httpx.AsyncClient(base_url=args.target, timeout=timeout, limits=limits) as client:
+            result = await replay(client, requests, speed)
+    return summarize(result)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay a captured webhook corpus")
+    parser.add_argument("corpus", nargs="+", help="Capture files (.jsonl.gz)")
+    parser.add_argument("--target", default="asgi", help="'asgi' for in-process, or a base URL")
+    parser.add_argument("--speed", default="1", help="Time compression factor (1, 10, ...) or 'max'")
+    parser.add_argument("--secret", default=os.getenv("SHOPIFY_WEBHOOK_SECRET") or DEFAULT_SECRET, help="Secret used to re-sign bodies")
+    parser.add_argument("--keep-ids", action="store_true", help="Reuse captured X-Shopify-Webhook-Id values instead of fresh ones (the server drops repeats as duplicates)")
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--app-log-level", default="WARNING", help="Root log level for the in-process app")
+    parser.add_argument("--json", dest="json_path", help="Also write the summary as JSON to this path")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(main_async(args))
+    print_report(summary)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold-start import-time report.
+
+Imports app.main in a fresh interpreter with `-X importtime`, then reports
+the total, the app.* modules and the most expensive third-party modules.
+Exits non-zero when the total exceeds --budget-ms, so a heavy new import
+shows up in CI rather than as slower scale-out.
+
+Usage:
+    python -m bench.startup
+    python -m bench.startup --budget-ms 800 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Measured at ~520ms on a cold interpreter; leaves headroom for slower runners
+DEFAULT_BUDGET_MS = 1000.0
+
+
+def measure_imports(module: str) -> Tuple[float, Dict[str, Tuple[float, float]]]:
+    """
+    Import a module in a subprocess and parse the -X importtime output.
+
+    Returns (total_ms, {module: (self_ms, cumulative_ms)}).
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.getcwd(),
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    modules: Dict[str, Tuple[float, float]] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+        except ValueError:
+            continue
+
+    total_ms = modules.get(module, (0.0, sum(self_ms for self_ms, _ in modules.values())))[1]
+    return total_ms, modules
+
+
+def top_level_packages(modules: Dict[str, Tuple[float, float]]) -> List[Tuple[str, float]]:
+    """Sum self time per top-level package, most expensive first."""
+    totals: Dict[str, float] = {}
+    for name, (self_ms, _) in modules.items():
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + self_ms
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Report import time of the app at cold start")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Fail when total import time exceeds this")
+    parser.add_argument("--top", type=int, default=10, help="Number of top-level packages to list")
+    args = parser.parse_args(argv)
+
+    total_ms, modules = measure_imports(args.module)
+
+    print(f"{'app module':<40} {'self ms':>10} {'cumulative ms':>14}")
+    for name, (self_ms, cumulative_ms) in sorted(modules.items(), key=lambda item: item[1][1], reverse=True):
+        if name == "app" or name.startswith("app."):
+            print(f"{name:<40} {self_ms:>10.1f} {cumulative_ms:>14.1f}")
+
+    print()
+    print(f"{'package (self time)':<40} {'ms':>10}")
+    for package, self_ms in top_level_packages(modules)[:args.top]:
+        print(f"{package:<40} {self_ms:>10.1f}")
+
+    print()
+    print(f"Total import time for {args.module}: {total_ms:.1f}ms (budget {args.budget_ms:.0f}ms)")
+    if total_ms > args.budget_ms:
+        print("Over budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
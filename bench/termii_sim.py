@@ -0,0 +1,242 @@
+"""
+Local Termii API simulator for benchmarking and chaos testing.
+
+Implements POST /api/sms/send and GET /api/sender-id with the request and
+response shapes from termii-api.llm.txt, plus injectable latency, 5xx
+bursts, "Insufficient balance", daily-limit errors and a per-second rate
+limit. Point the app at it with TERMII_BASE_URL.
+
+Usage:
+    python -m bench.termii_sim --port 9000 --latency lognormal:80,0.6 --error-rate 0.01
+    TERMII_BASE_URL=http://127.0.0.1:9000 python -m app.main
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+VALID_CHANNELS = {"dnd", "generic", "whatsapp", "voice"}
+VALID_TYPES = {"plain", "unicode", "encrypted", "voice"}
+MAX_RECIPIENTS = 100
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec into a sampler returning seconds.
+
+    Specs (milliseconds):
+        fixed:50
+        uniform:20,200
+        lognormal:80,0.6   (median, sigma)
+        exponential:100    (mean)
+    """
+    kind, _, raw = spec.partition(":")
+    values = [float(v) for v in raw.split(",") if v] if raw else []
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+@dataclass
+class SimulatorConfig:
+    api_key: Optional[str] = None
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    burst_length: int = 5
+    balance: Optional[float] = None
+    cost_per_sms: float = 4.0
+    daily_limit: Optional[int] = None
+    rate_limit: Optional[float] = None
+    # Registered sender IDs; empty accepts any sender ID
+    sender_ids: List[str] = field(default_factory=list)
+    seed: Optional[int] = None
+
+
+class SimulatorState:
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.sample_latency = parse_latency(config.latency)
+        self.balance = config.balance
+        self.burst_remaining = 0
+        self.sent_today = 0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats: Dict[str, int] = {}
+
+    def count(self, outcome: str) -> None:
+        self.stats[outcome] = self.stats.get(outcome, 0) + 1
+
+    def rate_limited(self) -> bool:
+        if not self.config.rate_limit:
+            return False
+        now = time.monotonic()
+        if now - self.window_start >= 1.0:
+            self.window_start = now
+            self.window_count = 0
+        self.window_count += 1
+        return self.window_count > self.config.rate_limit
+
+    def in_error_burst(self) -> bool:
+        if self.burst_remaining > 0:
+            self.burst_remaining -= 1
+            return True
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            self.burst_remaining = max(0, self.config.burst_length - 1)
+            return True
+        return False
+
+
+def _error(status_code: int, message: str, code: str = "error") -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"status": "error", "code": code, "message": message})
+
+
+def create_app(config: Optional[SimulatorConfig] = None) -> FastAPI:
+    config = config or SimulatorConfig()
+    app = FastAPI(title="Termii Simulator")
+    app.state.sim = SimulatorState(config)
+
+    @app.post("/api/sms/send")
+    async def send_sms(request: Request):
+        state: SimulatorState = app.state.sim
+        await asyncio.sleep(state.sample_latency(state.random))
+
+        if state.rate_limited():
+            state.count("rate_limited")
+            return _error(429, "Too Many Requests")
+        if state.in_error_burst():
+            state.count("server_error")
+            return _error(503, "Service temporarily unavailable")
+
+        try:
+            payload = await request.json()
+        except Exception:
+            state.count("bad_request")
+            return _error(400, "Invalid JSON payload")
+
+        if state.config.api_key and payload.get("api_key") != state.config.api_key:
+            state.count("unauthorized")
+            return _error(401, "Unauthorized")
+        for required in ("to", "from", "sms", "channel", "type"):
+            if not payload.get(required):
+                state.count("bad_request")
+                return _error(400, f"The {required} field is required")
+        if payload["channel"] not in VALID_CHANNELS:
+            state.count("bad_request")
+            return _error(400, "You are not set up on this route")
+        if payload["type"] not in VALID_TYPES:
+            state.count("bad_request")
+            return _error(400, f"Invalid message type: {payload['type']}")
+        if state.config.sender_ids and payload["from"] not in state.config.sender_ids and payload["channel"] != "whatsapp":
+            state.count("bad_request")
+            return _error(400, "Invalid Sender Id")
+
+        recipients = payload["to"] if isinstance(payload["to"], list) else [payload["to"]]
+        if len(recipients) > MAX_RECIPIENTS:
+            state.count("bad_request")
+            return _error(400, f"Maximum {MAX_RECIPIENTS} phone numbers per request")
+
+        if state.config.daily_limit is not None and state.sent_today + len(recipients) > state.config.daily_limit:
+            state.count("daily_limit")
+            return _error(400, "Your device has reached the daily limit")
+
+        pages = max(1, math.ceil(len(payload["sms"]) / 160))
+        cost = state.config.cost_per_sms * pages * len(recipients)
+        if state.balance is not None:
+            if state.balance < cost:
+                state.count("insufficient_balance")
+                return _error(400, "Insufficient balance")
+            state.balance -= cost
+
+        state.sent_today += len(recipients)
+        state.count("sent")
+        message_id = str(uuid.uuid4().int)[:25]
+        return {
+            "code": "ok",
+            "balance": round(state.balance, 2) if state.balance is not None else 10000.0,
+            "message_id": message_id,
+            "message": "Successfully Sent",
+            "user": "Termii Simulator",
+            "message_id_str": message_id,
+        }
+
+    @app.get("/api/sender-id")
+    async def sender_ids(api_key: Optional[str] = None, sender_id: Optional[str] = None, status: Optional[str] = None):
+        state: SimulatorState = app.state.sim
+        await asyncio.sleep(state.sample_latency(state.random))
+        if state.config.api_key and api_key != state.config.api_key:
+            return _error(401, "Unauthorized")
+        created_at = datetime.now(timezone.utc).isoformat()
+        content = [
+            {"sender_id": sid, "status": "active", "company": "Simulator", "usecase": "Order notifications", "country": "Nigeria", "created_at": created_at}
+            for sid in (state.config.sender_ids or ["ShopAlert"])
+            if (not sender_id or sid == sender_id) and (not status or status == "active")
+        ]
+        return {"content": content, "totalElements": len(content), "totalPages": 1, "size": len(content), "empty": not content}
+
+    @app.get("/sim/stats")
+    async def stats():
+        state: SimulatorState = app.state.sim
+        return {"outcomes": state.stats, "sent_today": state.sent_today, "balance": state.balance}
+
+    @app.post("/sim/reset")
+    async def reset():
+        app.state.sim = SimulatorState(config)
+        return {"message": "Simulator state reset"}
+
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local Termii API simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--api-key", help="Reject requests with a different api_key (401)")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:MS | uniform:MIN,MAX | lognormal:MEDIAN,SIGMA | exponential:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability that a request starts a 5xx burst")
+    parser.add_argument("--burst-length", type=int, default=5, help="Consecutive 503s per burst")
+    parser.add_argument("--balance", type=float, help="Starting wallet balance; 'Insufficient balance' once spent")
+    parser.add_argument("--cost-per-sms", type=float, default=4.0, help="Charge per recipient per 160-char page")
+    parser.add_argument("--daily-limit", type=int, help="Recipients per day before 'daily limit' errors")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before 429s")
+    parser.add_argument("--sender-ids", default="", help="Comma-separated registered sender IDs (default: accept any)")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    args = parse_args(argv)
+    config = SimulatorConfig(
+        api_key=args.api_key,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        burst_length=args.burst_length,
+        balance=args.balance,
+        cost_per_sms=args.cost_per_sms,
+        daily_limit=args.daily_limit,
+        rate_limit=args.rate_limit,
+        sender_ids=[s.strip() for s in args.sender_ids.split(",") if s.strip()],
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,5 +6,6 @@ source venv/bin/activate
 echo ""
 echo "Starting FastAPI server..."
 echo ""
-python -m app.main
+# Preforking server: one worker per CPU by default, SIGHUP for a rolling restart
+exec python -m app.server "$@"
 
@@ -0,0 +1,35 @@
+"""
+Shared test setup: an in-memory state store and queue, the global Termii
+account from the environment (which takes precedence over any .env) and a
+scratch templates file, so tests never touch Redis, SQLite state or the network.
+"""
+import os
+
+os.environ.update(
+    STATE_BACKEND="memory",
+    DISPATCH_BACKEND="memory",
+    DISPATCH_MODE="external",
+    TERMII_API_KEY="test-key",
+    TERMII_SENDER_ID="TestShop",
+    DISPATCH_FALLBACK_CHANNELS="",
+    DISPATCH_PROMOTIONAL_RATE="0",
+)
+
+import pytest
+
+from app import config
+from app.models import templates
+from app.services import channel_fallback, termii
+from app.services.state_store import MemoryStateStore, set_state_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(templates, "TEMPLATES_FILE", tmp_path / "templates.json")
+    config.reload_config()
+    set_state_store(MemoryStateStore())
+    channel_fallback._policy_cache.clear()
+    termii._credentials_cache.clear()
+    yield
+    set_state_store(None)
+    termii._pool.clear()
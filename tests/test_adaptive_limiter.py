@@ -0,0 +1,92 @@
+import asyncio
+
+from app.services.adaptive_limiter import AdaptiveLimiter
+
+
+def test_fast_calls_grow_the_limit_while_it_is_used():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-grow", initial=4, maximum=8)
+
+        async def call():
+            async with limiter.slot():
+                await asyncio.sleep(0)
+
+        for _ in range(20):
+            await asyncio.gather(*(call() for _ in range(int(limiter.limit))))
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.limit > 4
+    assert limiter.limit <= 8
+
+
+def test_idle_limit_does_not_grow():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-idle", initial=8, maximum=64)
+        for _ in range(50):
+            async with limiter.slot():
+                pass
+        return limiter
+
+    # One call at a time never uses half of 8, so there is nothing to learn
+    assert asyncio.run(scenario()).limit == 8
+
+
+def test_overload_cuts_the_limit_down_to_the_minimum():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-cut", initial=8, minimum=3, backoff=0.5)
+        async with limiter.slot() as slot:
+            slot.overloaded("rate_limited")
+        assert limiter.limit == 4
+
+        limiter._last_backoff = 0.0
+        async with limiter.slot() as slot:
+            slot.overloaded("rate_limited")
+        assert limiter.limit == 3
+
+    asyncio.run(scenario())
+
+
+def test_overloads_in_one_burst_cut_once():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-burst", initial=16, backoff=0.5)
+        limiter.baseline = 60.0
+
+        async def overloaded_call():
+            async with limiter.slot() as slot:
+                await asyncio.sleep(0)
+                slot.overloaded("timeout")
+
+        await asyncio.gather(*(overloaded_call() for _ in range(8)))
+        return limiter
+
+    assert asyncio.run(scenario()).limit == 8
+
+
+def test_waiters_are_admitted_by_priority():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-priority", initial=1, maximum=1)
+        order = []
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                await release.wait()
+
+        async def call(name, priority):
+            async with limiter.slot(priority=priority):
+                order.append(name)
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(call("bulk", 0)),
+            asyncio.create_task(call("urgent", 1)),
+            asyncio.create_task(call("bulk-2", 0)),
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["urgent", "bulk", "bulk-2"]
@@ -0,0 +1,83 @@
+import pytest
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure("overloaded")
+    breaker.record_failure("overloaded")
+    breaker.record_success()
+    breaker.record_failure("overloaded")
+    breaker.record_failure("overloaded")
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+    breaker.record_failure("overloaded")
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == pytest.approx(30)
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure("balance")
+    clock.now += 30
+    assert breaker.state == "half_open"
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure("balance")
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure("balance")
+    assert breaker.state == "open"
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_neutral_trial_frees_the_slot_without_deciding(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure("balance")
+    clock.now += 30
+    breaker.before_call()
+    # An invalid number says nothing about the account: stay half-open, allow another trial
+    breaker.record_neutral()
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_zero_threshold_disables(clock):
+    breaker = CircuitBreaker("test", failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure("overloaded")
+    assert breaker.state == "closed"
+    breaker.before_call()
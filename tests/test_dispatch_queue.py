@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.dispatch_queue import (
+    PROMOTIONAL,
+    TRANSACTIONAL,
+    MemoryDispatchQueue,
+    NotificationJob,
+    SQLiteDispatchQueue,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_queue(request, tmp_path):
+    def make():
+        if request.param == "memory":
+            return MemoryDispatchQueue()
+        return SQLiteDispatchQueue(tmp_path / "dispatch.db")
+    return make
+
+
+def job(kind="order_confirmation", shop="a.myshopify.com", order_id="1", lane=TRANSACTIONAL, **fields) -> NotificationJob:
+    return NotificationJob(kind, shop, order_id, "08031234567", {"order_number": order_id}, lane=lane, **fields)
+
+
+def test_claim_ack(make_queue):
+    async def scenario():
+        queue = make_queue()
+        queued = job()
+        await queue.put(queued)
+        assert await queue.depth() == 1
+        claimed = await queue.get(timeout=0)
+        assert claimed.id == queued.id and claimed.context == queued.context
+        assert await queue.get(timeout=0) is None
+        await queue.ack(claimed)
+        assert await queue.depth() == 0
+        assert await queue.requeue_stale(0) == 0
+        await queue.close()
+    asyncio.run(scenario())
+
+
+def test_nack_keeps_attempts_and_delay(make_queue):
+    async def scenario():
+        queue = make_queue()
+        await queue.put(job())
+        claimed = await queue.get(timeout=0)
+        claimed.attempts = 2
+        await queue.nack(claimed, delay=0.2)
+        assert await queue.get(timeout=0) is None
+        retried = await queue.get(timeout=2)
+        assert retried.id == claimed.id and retried.attempts == 2
+        await queue.close()
+    asyncio.run(scenario())
+
+
+def test_requeue_stale_redelivers_unacknowledged_jobs(make_queue):
+    async def scenario():
+        queue = make_queue()
+        await queue.put(job())
+        claimed = await queue.get(timeout=0)
+        assert await queue.requeue_stale(60) == 0
+        await asyncio.sleep(0.01)
+        assert await queue.requeue_stale(0) == 1
+        redelivered = await queue.get(timeout=0)
+        assert redelivered.id == claimed.id
+        await queue.close()
+    asyncio.run(scenario())
+
+
+def test_get_filters_by_shop_and_lane(make_queue):
+    async def scenario():
+        queue = make_queue()
+        await queue.put(job(shop="a.myshopify.com", order_id="1"))
+        await queue.put(job(shop="b.myshopify.com", order_id="2"))
+        await queue.put(job(shop="b.myshopify.com", order_id="3", lane=PROMOTIONAL))
+        assert await queue.pending_by_shop() == {"a.myshopify.com": 1, "b.myshopify.com": 2}
+        assert await queue.pending_by_shop(lane=PROMOTIONAL) == {"b.myshopify.com": 1}
+
+        promotional = await queue.get(timeout=0, lane=PROMOTIONAL)
+        assert promotional.order_id == "3"
+        assert await queue.get(timeout=0, lane=PROMOTIONAL) is None
+        assert (await queue.get(timeout=0, shop="b.myshopify.com", lane=TRANSACTIONAL)).order_id == "2"
+        assert (await queue.get(timeout=0)).order_id == "1"
+        await queue.close()
+    asyncio.run(scenario())
+
+
+def test_order_sequencing(make_queue):
+    async def scenario():
+        queue = make_queue()
+        created = time.time()
+        confirmation = job("order_confirmation", created_at=created)
+        fulfillment = job("fulfillment", created_at=created - 1)
+        other_order = job("order_confirmation", order_id="2")
+        for queued in (fulfillment, confirmation, other_order):
+            await queue.put(queued)
+
+        # The fulfillment waits on the confirmation even though it was created first
+        assert await queue.has_predecessor(fulfillment)
+        assert not await queue.has_predecessor(confirmation)
+        assert not await queue.has_predecessor(other_order)
+
+        # Still a predecessor while claimed (in flight), no longer once acknowledged
+        claimed = await queue.get(timeout=0, shop=confirmation.shop_domain)
+        while claimed.id != confirmation.id:
+            await queue.nack(claimed, delay=60)
+            claimed = await queue.get(timeout=0)
+        assert await queue.has_predecessor(fulfillment)
+        await queue.ack(claimed)
+        assert not await queue.has_predecessor(fulfillment)
+
+        # Receipt checks belong to no order and wait on nothing
+        assert not await queue.has_predecessor(job("fulfillment", receipt_id="m-1"))
+        await queue.close()
+    asyncio.run(scenario())
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+
+from app.models.fallback_policy import FallbackPolicy, save_fallback_policy
+from app.services import dispatcher as dispatcher_module
+from app.services import termii
+from app.services.channel_fallback import get_tracked_receipt, record_receipt
+from app.services.dispatch_queue import PROMOTIONAL, TRANSACTIONAL, MemoryDispatchQueue, NotificationJob
+from app.services.dispatcher import Dispatcher
+from app.utils.metrics import registry
+
+SHOP = "a.myshopify.com"
+
+
+class FakeTermii:
+    """Records sends; `reject` lists the channels Termii refuses messages on."""
+
+    def __init__(self, delay: float = 0.0, reject=()):
+        self.delay = delay
+        self.reject = set(reject)
+        self.sent = []
+
+    async def send_sms(self, to, message, sender_id, channel="generic", message_type="plain", priority=0):
+        self.sent.append((to, channel, message_type))
+        await asyncio.sleep(self.delay)
+        if channel in self.reject:
+            raise termii.MessageRejectedError("Termii API Error: route not active")
+        return {"code": "ok", "message_id": f"m-{to}-{channel}-{len(self.sent)}"}
+
+
+@pytest.fixture(autouse=True)
+def quick_stop(monkeypatch):
+    # Idle consumers notice stop() sooner
+    monkeypatch.setattr(dispatcher_module, "GET_TIMEOUT", 0.05)
+
+
+@pytest.fixture
+def fake_termii(monkeypatch):
+    def install(**options) -> FakeTermii:
+        fake = FakeTermii(**options)
+        monkeypatch.setattr(termii.TermiiService, "send_sms", lambda self, *args, **kwargs: fake.send_sms(*args, **kwargs))
+        return fake
+    return install
+
+
+def job(order_id: str, lane: str = TRANSACTIONAL, phone: str = "08031234567") -> NotificationJob:
+    return NotificationJob("order_confirmation", SHOP, order_id, phone, {"order_number": order_id}, lane=lane)
+
+
+def outcome_count(outcome: str) -> float:
+    return registry.counter(dispatcher_module.JOBS_METRIC, {"kind": "order_confirmation", "outcome": outcome}).value
+
+
+async def run_until(dispatcher: Dispatcher, done, timeout: float = 5.0) -> None:
+    await dispatcher.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while not done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+    finally:
+        await dispatcher.stop(drain_timeout=1.0)
+    assert done()
+
+
+def test_transactional_lane_preempts_promotional(fake_termii):
+    fake = fake_termii(delay=0.01)
+
+    async def scenario():
+        queue = MemoryDispatchQueue()
+        for index in range(5):
+            await queue.put(job(f"p{index}", lane=PROMOTIONAL, phone=f"0803000000{index}"))
+        for index in range(5):
+            await queue.put(job(f"t{index}", phone=f"0803111111{index}"))
+        dispatcher = Dispatcher(queue=queue, concurrency=1, promotional_concurrency=1)
+        await run_until(dispatcher, lambda: len(fake.sent) == 10)
+
+    asyncio.run(scenario())
+    channels = [channel for _, channel, _ in fake.sent]
+    # Transactional SMS go out on DND; promotional ones only once no transactional job is waiting
+    assert channels.index("generic") >= 4
+    assert channels.count("dnd") == 5 and channels.count("generic") == 5
+
+
+def test_rejection_moves_to_the_next_channel(fake_termii):
+    fake = fake_termii(reject={"dnd"})
+
+    async def scenario():
+        await save_fallback_policy(SHOP, FallbackPolicy(channels=["whatsapp", "voice"], receipt_timeout=0))
+        queue = MemoryDispatchQueue()
+        await queue.put(job("1"))
+        await run_until(Dispatcher(queue=queue, concurrency=1), lambda: len(fake.sent) == 2)
+        assert await queue.depth() == 0
+
+    asyncio.run(scenario())
+    assert [channel for _, channel, _ in fake.sent] == ["dnd", "whatsapp"]
+
+
+def test_missing_delivery_reports_walk_the_chain(fake_termii, monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "RECEIPT_POLL_INTERVAL", 0.05)
+    fake = fake_termii()
+
+    async def scenario():
+        await save_fallback_policy(SHOP, FallbackPolicy(channels=["whatsapp", "voice"], receipt_timeout=0.2))
+        queue = MemoryDispatchQueue()
+        await queue.put(job("1"))
+        # Voice is the last channel, so nothing waits for its report
+        await run_until(Dispatcher(queue=queue, concurrency=1), lambda: len(fake.sent) == 3)
+
+    asyncio.run(scenario())
+    assert [(channel, message_type) for _, channel, message_type in fake.sent] == [
+        ("dnd", "plain"), ("whatsapp", "plain"), ("voice", "voice")
+    ]
+
+
+def test_failed_report_falls_back_and_delivered_report_stops(fake_termii, monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "RECEIPT_POLL_INTERVAL", 0.05)
+    fake = fake_termii()
+
+    async def scenario():
+        await save_fallback_policy(SHOP, FallbackPolicy(channels=["whatsapp", "voice"], receipt_timeout=30))
+        queue = MemoryDispatchQueue()
+        await queue.put(job("1"))
+        dispatcher = Dispatcher(queue=queue, concurrency=1)
+        await dispatcher.start()
+        try:
+            for channel, report in (("dnd", "Message Failed"), ("whatsapp", "DELIVERED")):
+                while len(fake.sent) < 1 or fake.sent[-1][1] != channel:
+                    await asyncio.sleep(0.01)
+                message_id = f"m-08031234567-{channel}-{len(fake.sent)}"
+                while await get_tracked_receipt(message_id) is None:
+                    await asyncio.sleep(0.01)
+                await record_receipt(message_id, await get_tracked_receipt(message_id), report)
+            while await queue.depth():
+                await asyncio.sleep(0.01)
+        finally:
+            await dispatcher.stop(drain_timeout=1.0)
+
+    asyncio.run(scenario())
+    assert [channel for _, channel, _ in fake.sent] == ["dnd", "whatsapp"]
+
+
+def test_rejection_without_fallback_is_not_retried(fake_termii):
+    fake = fake_termii(reject={"dnd"})
+    failed_before = outcome_count("failed")
+
+    async def scenario():
+        queue = MemoryDispatchQueue()
+        await queue.put(job("1"))
+        await run_until(Dispatcher(queue=queue, concurrency=1), lambda: outcome_count("failed") > failed_before)
+        assert await queue.depth() == 0
+
+    asyncio.run(scenario())
+    assert [channel for _, channel, _ in fake.sent] == ["dnd"]
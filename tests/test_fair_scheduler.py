@@ -0,0 +1,44 @@
+from collections import Counter
+
+from app.services.fair_scheduler import DeficitRoundRobin
+
+
+def serve(scheduler: DeficitRoundRobin, count: int) -> list:
+    return [scheduler.next() for _ in range(count)]
+
+
+def test_equal_weights_take_turns():
+    scheduler = DeficitRoundRobin()
+    scheduler.update_backlog({"big": 1000, "a": 3, "b": 3})
+    picks = serve(scheduler, 9)
+    assert Counter(picks) == {"big": 3, "a": 3, "b": 3}
+    # The bulk shop never gets two sends in a row while others wait
+    assert all(first != second for first, second in zip(picks, picks[1:]))
+
+
+def test_weights_set_the_share():
+    scheduler = DeficitRoundRobin({"vip": 2.0, "slow": 0.5})
+    scheduler.update_backlog({"vip": 1000, "regular": 1000, "slow": 1000})
+    counts = Counter(serve(scheduler, 350))
+    assert counts["vip"] == 2 * counts["regular"]
+    assert counts["slow"] * 2 == counts["regular"]
+
+
+def test_shops_leave_when_drained_and_lose_their_credit():
+    scheduler = DeficitRoundRobin({"vip": 5.0})
+    scheduler.update_backlog({"vip": 1, "other": 10})
+    picks = serve(scheduler, 3)
+    assert picks.count("vip") == 1
+    assert scheduler.next() == "other"
+
+    # Returning after its queue emptied, the shop starts from zero credit
+    scheduler.update_backlog({"vip": 10, "other": 10})
+    assert scheduler._deficit["vip"] == 0.0
+
+
+def test_empty_backlog_and_discard():
+    scheduler = DeficitRoundRobin()
+    assert scheduler.next() is None
+    scheduler.update_backlog({"a": 2, "b": 0})
+    scheduler.discard("a")
+    assert scheduler.next() is None